@@ -1,8 +1,21 @@
+from datetime import date
+from typing import Tuple
+
 from sqladmin import ModelView
+from sqlalchemy import Select, select
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
 
 from app.bookings.models import Bookings
+from app.bookings.schemas import SBooking
+from app.bookings.service import BookingService
+from app.exceptions import RoomCannotBeBookedException
 from app.hotels.models import Hotels
 from app.hotels.rooms.models import Rooms
+from app.hotels.rooms.service import RoomService
+from app.hotels.suggest import location_index
+from app.pricing.models import RateRules
+from app.pricing.service import PricingService
 from app.users.models import Users
 
 
@@ -21,6 +34,14 @@ class HotelsAdmin(ModelView, model=Hotels):
     name_plural = "Отели"
     icon = "fa-solid fa-hotel"
 
+    async def after_model_change(
+        self, data: dict, model: Hotels, is_created: bool, request: Request
+    ) -> None:
+        await location_index.changed()
+
+    async def after_model_delete(self, model: Hotels, request: Request) -> None:
+        await location_index.changed()
+
 
 class RoomsAdmin(ModelView, model=Rooms):
     column_list = [c.name for c in Rooms.__table__.c] + [Rooms.hotel, Rooms.booking]
@@ -28,9 +49,83 @@ class RoomsAdmin(ModelView, model=Rooms):
     name_plural = "Номера"
     icon = "fa-solid fa-bed"
 
+    async def after_model_change(
+        self, data: dict, model: Rooms, is_created: bool, request: Request
+    ) -> None:
+        if not is_created:
+            await RoomService.forget_hotel_ids([model.id])
+
+    async def after_model_delete(self, model: Rooms, request: Request) -> None:
+        await RoomService.forget_hotel_ids([model.id])
+
 
 class BookingsAdmin(ModelView, model=Bookings):
     column_list = [c.name for c in Bookings.__table__.c] + [Bookings.user, Bookings.room]
+    # Цену и стоимость считает book_room, как у брони через API
+    form_columns = [Bookings.user, Bookings.room, Bookings.date_from, Bookings.date_to]
     name = "Бронь"
     name_plural = "Брони"
     icon = "fa-solid fa-book"
+    # Даты брони меняются только пересозданием, иначе журнал room_nights
+    # разойдется с bookings
+    can_edit = False
+
+    @staticmethod
+    def primary_key(pk: str) -> Tuple[int, date]:
+        # Идентификатор строки в URL админки — составной первичный ключ "id;date_to"
+        try:
+            booking_id, date_to = pk.split(";")
+            return int(booking_id), date.fromisoformat(date_to)
+        except ValueError:
+            raise HTTPException(status_code=404)
+
+    def _stmt_by_identifier(self, identifier: str) -> Select:
+        # sqladmin приводит части составного ключа конструктором типа столбца,
+        # а date("2024-05-01") не работает; страницы просмотра и удаления ищут
+        # строку здесь
+        booking_id, date_to = self.primary_key(identifier)
+        return select(Bookings).where(
+            Bookings.id == booking_id, Bookings.date_to == date_to
+        )
+
+    async def insert_model(self, request: Request, data: dict) -> SBooking:
+        """
+        Бронь из админки проходит тот же путь, что и через API: остаток и журнал
+        room_nights меняются в одной транзакции с вставкой брони, после нее
+        оповещаются движок доступности и кэш поиска.
+        """
+        booking = await BookingService.add(
+            int(data["user"]), int(data["room"]), data["date_from"], data["date_to"]
+        )
+        if not booking:
+            raise RoomCannotBeBookedException
+        return booking
+
+    async def delete_model(self, request: Request, pk: str) -> None:
+        booking_id, _ = self.primary_key(pk)
+        await BookingService.delete(booking_id)
+
+
+class RateRulesAdmin(ModelView, model=RateRules):
+    column_list = [c.name for c in RateRules.__table__.c]
+    name = "Правило цены"
+    name_plural = "Правила цен"
+    icon = "fa-solid fa-tags"
+
+    async def on_model_change(
+        self, data: dict, model: RateRules, is_created: bool, request: Request
+    ) -> None:
+        # Прежние отель и номер: измененное правило могло перестать их касаться
+        request.state.rate_rules = [model]
+        if not is_created:
+            request.state.rate_rules.append(
+                RateRules(hotel_id=model.hotel_id, room_id=model.room_id)
+            )
+
+    async def after_model_change(
+        self, data: dict, model: RateRules, is_created: bool, request: Request
+    ) -> None:
+        await PricingService.rules_changed(request.state.rate_rules)
+
+    async def after_model_delete(self, model: RateRules, request: Request) -> None:
+        await PricingService.rules_changed([model])
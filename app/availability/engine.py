@@ -0,0 +1,212 @@
+import asyncio
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from app.bookings.models import Bookings
+from app.broadcast import broadcaster
+from app.config import settings
+from app.database import async_session_maker
+from app.logger import logger
+
+EPOCH = date(2000, 1, 1).toordinal()
+# 2^16 ночей от EPOCH — до 2179 года
+SIZE = 1 << 16
+
+# Отрезок запроса не пересекает узел: такой узел не должен влиять на максимум,
+# даже если в соседнем узле отрицательная поправка от снятых броней
+NO_NIGHTS = float("-inf")
+
+CHANNEL = "availability"
+
+
+class NightsTree:
+    """
+    Разреженное дерево отрезков по ночам одного номера.
+
+    add(l, r, v) прибавляет v к занятости ночей [l, r), max(l, r) возвращает
+    максимальную занятость на отрезке — столько номеров уже занято на весь
+    период проживания. Обе операции O(log SIZE), память растет только там,
+    где есть брони.
+    """
+
+    __slots__ = ("_max", "_add")
+
+    def __init__(self) -> None:
+        self._max: Dict[int, int] = {}
+        self._add: Dict[int, int] = {}
+
+    def add(self, left: int, right: int, value: int) -> None:
+        self._update(1, 0, SIZE, max(left, 0), min(right, SIZE), value)
+
+    def max(self, left: int, right: int) -> int:
+        return max(self._query(1, 0, SIZE, max(left, 0), min(right, SIZE)), 0)
+
+    def _update(
+        self, node: int, lo: int, hi: int, left: int, right: int, value: int
+    ) -> None:
+        if right <= lo or hi <= left:
+            return
+        if left <= lo and hi <= right:
+            self._add[node] = self._add.get(node, 0) + value
+            self._max[node] = self._max.get(node, 0) + value
+            return
+        mid = (lo + hi) // 2
+        self._update(2 * node, lo, mid, left, right, value)
+        self._update(2 * node + 1, mid, hi, left, right, value)
+        children = max(self._max.get(2 * node, 0), self._max.get(2 * node + 1, 0))
+        self._max[node] = self._add.get(node, 0) + children
+
+    def _query(self, node: int, lo: int, hi: int, left: int, right: int) -> int:
+        if right <= lo or hi <= left:
+            return NO_NIGHTS
+        if node not in self._max:
+            return 0
+        if left <= lo and hi <= right:
+            return self._max[node]
+        mid = (lo + hi) // 2
+        children = max(
+            self._query(2 * node, lo, mid, left, right),
+            self._query(2 * node + 1, mid, hi, left, right),
+        )
+        return self._add.get(node, 0) + children
+
+
+def night(day: date) -> int:
+    return day.toordinal() - EPOCH
+
+
+class AvailabilityEngine:
+    """
+    Занятость номеров в памяти воркера для поиска отелей и номеров.
+
+    При старте строится по таблице bookings, дальше обновляется дельтами,
+    которые BookingService публикует в Redis pub/sub после каждой вставки
+    и удаления брони. Периодическая пересборка из БД устраняет расхождения
+    (например, брони из админки или пропущенные сообщения).
+    """
+
+    def __init__(self) -> None:
+        self._trees: Dict[int, NightsTree] = defaultdict(NightsTree)
+        # Брони, уже учтенные в деревьях, и удаленные: дельта применяется,
+        # только если меняет одно из этих множеств
+        self._booking_ids: Set[int] = set()
+        self._deleted: Set[int] = set()
+        self._pending: Optional[List[Dict[str, Any]]] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    def booked(self, room_id: int, date_from: date, date_to: date) -> int:
+        tree = self._trees.get(room_id)
+        if tree is None:
+            return 0
+        return tree.max(night(date_from), night(date_to))
+
+    def apply(self, room_id: int, date_from: date, date_to: date, delta: int) -> None:
+        self._trees[room_id].add(night(date_from), night(date_to), delta)
+
+    @staticmethod
+    def _count(
+        trees: Dict[int, NightsTree],
+        booking_ids: Set[int],
+        deleted: Set[int],
+        message: Dict[str, Any],
+    ) -> None:
+        """
+        Дельта может прийти, когда снимок ее уже учел: сообщение публикуется
+        после фиксации брони и доходит позже, чем снимок ее прочитал. Новая
+        бронь применяется, только если ее id еще не учтен, удаление — только
+        если удаляемая бронь учтена. Удаленные id запоминаются до следующей
+        загрузки: вставка, дошедшая позже своего удаления, не применяется.
+        """
+        booking_id = message["booking_id"]
+        if message["delta"] > 0:
+            if booking_id in booking_ids or booking_id in deleted:
+                return
+            booking_ids.add(booking_id)
+        else:
+            deleted.add(booking_id)
+            if booking_id not in booking_ids:
+                return
+            booking_ids.discard(booking_id)
+        trees[message["room_id"]].add(
+            night(date.fromisoformat(message["date_from"])),
+            night(date.fromisoformat(message["date_to"])),
+            message["delta"],
+        )
+
+    async def load(self) -> None:
+        # Дельты, пришедшие во время загрузки, применяются к прежним деревьям
+        # и копятся, а после загрузки повторяются на снимке: _count пропустит те,
+        # что снимок уже учел
+        self._pending = []
+        try:
+            trees: Dict[int, NightsTree] = defaultdict(NightsTree)
+            booking_ids: Set[int] = set()
+            async with async_session_maker() as session:
+                # Прошедшие брони поиску не нужны, и секции с ними не читаются
+                query = select(
+                    Bookings.id, Bookings.room_id, Bookings.date_from, Bookings.date_to
+                ).where(Bookings.date_to > date.today())
+                result = await session.stream(query)
+                async for booking in result:
+                    booking_ids.add(booking.id)
+                    trees[booking.room_id].add(
+                        night(booking.date_from), night(booking.date_to), 1
+                    )
+            deleted: Set[int] = set()
+            for message in self._pending:
+                self._count(trees, booking_ids, deleted, message)
+            self._trees, self._booking_ids, self._deleted = trees, booking_ids, deleted
+            self.ready = True
+            logger.info(
+                "Availability engine loaded",
+                extra={"bookings": len(booking_ids), "rooms": len(trees)},
+            )
+        finally:
+            self._pending = None
+
+    async def on_message(self, message: Dict[str, Any]) -> None:
+        if self._pending is not None:
+            self._pending.append(message)
+        self._count(self._trees, self._booking_ids, self._deleted, message)
+
+    async def publish(
+        self, booking_id: int, room_id: int, date_from: date, date_to: date, delta: int
+    ) -> None:
+        if not settings.AVAILABILITY_ENGINE_ENABLED:
+            return
+        message = {
+            "booking_id": booking_id,
+            "room_id": room_id,
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "delta": delta,
+        }
+        await broadcaster.publish(CHANNEL, message)
+
+    def subscribe(self) -> None:
+        broadcaster.subscribe(CHANNEL, self.on_message)
+
+    async def start(self, resync_seconds: int) -> None:
+        await self.load()
+        self._resync_task = asyncio.create_task(self._resync(resync_seconds))
+
+    async def stop(self) -> None:
+        if self._resync_task:
+            self._resync_task.cancel()
+        self._resync_task = None
+        self.ready = False
+
+    async def _resync(self, resync_seconds: int) -> None:
+        while True:
+            await asyncio.sleep(resync_seconds)
+            try:
+                await self.load()
+            except Exception:
+                logger.error("Availability engine resync failed", exc_info=True)
+
+
+availability_engine = AvailabilityEngine()
@@ -0,0 +1,107 @@
+from sqlalchemy import DDL
+
+# Текущая версия book_room; create_all (тесты) создает ее. Миграции хранят
+# свои копии текста и после выхода не меняются: изменение функции — правка
+# здесь и новая миграция с тем же текстом (test_functions сверяет их).
+
+# Под блокировкой строки номера проверяет остаток за вычетом удержаний из
+# Redis — p_held[i + 1] удержано на ночь p_date_from + i
+# (HoldStore.held_nights) — и считает стоимость по правилам цен из p_rules
+# (PricingService.rules_param) и загрузке ночей до этой брони — так же, как
+# pricing.engine.nightly_rates: множители подошедших правил перемножаются
+# в порядке p_rules, цена ночи округляется до рубля.
+BOOK_ROOM = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date,
+    p_rules jsonb,
+    p_held integer[]
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_hotel_id integer;
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+    v_total_cost bigint := 0;
+    v_multiplier double precision;
+    v_night record;
+    v_rule record;
+BEGIN
+    SELECT hotel_id, quantity, price INTO v_hotel_id, v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(
+        COALESCE(room_nights.booked_count, 0) + COALESCE(p_held[i + 1], 0)
+    ), 0) INTO v_booked
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    LEFT JOIN room_nights
+        ON room_nights.room_id = p_room_id AND room_nights.night = p_date_from + i;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    FOR v_night IN
+        SELECT
+            p_date_from + i AS night,
+            COALESCE(room_nights.booked_count, 0) AS booked_count
+        FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+        LEFT JOIN room_nights
+            ON room_nights.room_id = p_room_id AND room_nights.night = p_date_from + i
+        ORDER BY i
+    LOOP
+        v_multiplier := 1;
+        FOR v_rule IN
+            SELECT * FROM jsonb_to_recordset(p_rules) AS rule(
+                hotel_id integer,
+                room_id integer,
+                date_from date,
+                date_to date,
+                weekdays integer,
+                min_occupancy double precision,
+                multiplier double precision
+            )
+        LOOP
+            IF (v_rule.hotel_id IS NULL OR v_rule.hotel_id = v_hotel_id)
+                AND (v_rule.room_id IS NULL OR v_rule.room_id = p_room_id)
+                AND (v_rule.date_from IS NULL OR v_night.night >= v_rule.date_from)
+                AND (v_rule.date_to IS NULL OR v_night.night < v_rule.date_to)
+                AND (v_rule.weekdays IS NULL
+                    OR v_rule.weekdays
+                        & (1 << (extract(isodow FROM v_night.night)::integer - 1)) <> 0)
+                AND (v_rule.min_occupancy IS NULL
+                    OR v_night.booked_count::double precision / GREATEST(v_quantity, 1)
+                        >= v_rule.min_occupancy)
+            THEN
+                v_multiplier := v_multiplier * v_rule.multiplier;
+            END IF;
+        END LOOP;
+        -- round для double precision округляет до четного, как numpy.rint
+        v_total_cost := v_total_cost + round(v_price * v_multiplier)::bigint;
+    END LOOP;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price, v_total_cost)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM = (
+    "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date, jsonb, integer[])"
+)
+
+create_book_room = DDL(BOOK_ROOM)
+drop_book_room = DDL(DROP_BOOK_ROOM)
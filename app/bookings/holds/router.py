@@ -0,0 +1,56 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, status
+from fastapi_versioning import version
+
+from app.bookings.holds.schemas import SHold
+from app.bookings.holds.service import HoldService
+from app.bookings.schemas import SBooking
+from app.exceptions import InvalidDateException, RoomCannotBeBookedException
+from app.tasks.tasks import send_booking_confirmation_email
+from app.users.dependencies import get_current_user
+from app.users.models import Users
+
+router = APIRouter(
+    prefix="/bookings/holds",
+    tags=["Бронирование"],
+)
+
+
+@router.post("")
+@version(1)
+async def add_hold(
+    room_id: int,
+    date_from: date,
+    date_to: date,
+    user: Users = Depends(get_current_user),
+) -> SHold:
+    """
+    Удержать номер на время оформления; удержание истекает само,
+    если его не подтвердить.
+    """
+    if (date_to - date_from).days <= 0:
+        raise InvalidDateException
+    hold = await HoldService.hold(user.id, room_id, date_from, date_to)
+    if not hold:
+        raise RoomCannotBeBookedException
+    return hold
+
+
+@router.post("/{hold_id}/confirm")
+@version(1)
+async def confirm_hold(
+    hold_id: str, user: Users = Depends(get_current_user)
+) -> SBooking:
+    booking = await HoldService.confirm(user.id, hold_id)
+    if not booking:
+        raise RoomCannotBeBookedException
+    booking = SBooking.model_validate(booking)
+    send_booking_confirmation_email.delay(booking.model_dump(), user.email)
+    return booking
+
+
+@router.delete("/{hold_id}", status_code=status.HTTP_204_NO_CONTENT)
+@version(1)
+async def delete_hold(hold_id: str, user: Users = Depends(get_current_user)):
+    await HoldService.cancel(user.id, hold_id)
@@ -0,0 +1,13 @@
+from datetime import date, datetime
+
+from pydantic import BaseModel
+
+
+class SHold(BaseModel):
+    id: str
+    user_id: int
+    room_id: int
+    hotel_id: int
+    date_from: date
+    date_to: date
+    expires_at: datetime
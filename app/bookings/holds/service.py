@@ -0,0 +1,104 @@
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+
+from app.availability.engine import availability_engine
+from app.bookings.holds.schemas import SHold
+from app.bookings.holds.store import hold_store
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.schemas import SBooking
+from app.bookings.service import BookingService
+from app.database import session_scope
+from app.exceptions import HoldNotFoundException
+from app.hotels.rooms.models import Rooms
+
+
+class HoldService:
+    """
+    Корзина: номер удерживается в Redis на BOOKING_HOLD_SECONDS, пока
+    пользователь оформляет бронь, и подтверждение превращает удержание
+    в бронь в Postgres. Окончательную проверку остатка, за вычетом чужих
+    удержаний, делает book_room.
+    """
+
+    @staticmethod
+    async def rooms_left(
+        room_id: int, date_from: date, date_to: date
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Отель номера и сколько номеров свободно по журналу броней:
+
+        SELECT rooms.hotel_id,
+            rooms.quantity - (SELECT COALESCE(MAX(booked_count), 0) ...) AS rooms_left
+        FROM rooms WHERE rooms.id = 1
+        """
+        async with session_scope(read_only=True) as session:
+            if availability_engine.ready:
+                result = await session.execute(
+                    select(Rooms.hotel_id, Rooms.quantity).where(Rooms.id == room_id)
+                )
+                room = result.one_or_none()
+                if room is None:
+                    return None
+                return room.hotel_id, room.quantity - availability_engine.booked(
+                    room_id, date_from, date_to
+                )
+            rooms_left = Rooms.quantity - RoomNightsService.booked_count(
+                date_from, date_to
+            )
+            result = await session.execute(
+                select(Rooms.hotel_id, rooms_left.label("rooms_left")).where(
+                    Rooms.id == room_id
+                )
+            )
+            return result.one_or_none()
+
+    @classmethod
+    async def hold(
+        cls, user_id: int, room_id: int, date_from: date, date_to: date
+    ) -> Optional[SHold]:
+        room = await cls.rooms_left(room_id, date_from, date_to)
+        if room is None:
+            return None
+        hotel_id, rooms_left = room
+        return await hold_store.hold(
+            user_id, room_id, hotel_id, date_from, date_to, rooms_left
+        )
+
+    @staticmethod
+    async def get(user_id: int, hold_id: str) -> SHold:
+        hold = await hold_store.get(hold_id)
+        if hold is None or hold.user_id != user_id:
+            raise HoldNotFoundException
+        return hold
+
+    @classmethod
+    async def confirm(cls, user_id: int, hold_id: str) -> Optional[SBooking]:
+        """
+        Удержание снимается только после записи брони: пока бронь пишется,
+        номер остается занятым для других. Бронь не вычитает из остатка лишь
+        собственное удержание, а из двух одновременных подтверждений одного
+        удержания проходит одно (claim). Если бронь не прошла, удержание
+        остается и его можно подтвердить снова.
+        """
+        hold = await cls.get(user_id, hold_id)
+        if not await hold_store.claim(hold):
+            raise HoldNotFoundException
+        booking = None
+        try:
+            booking = await BookingService.add(
+                user_id, hold.room_id, hold.date_from, hold.date_to, hold_id=hold.id
+            )
+        finally:
+            if booking:
+                await hold_store.release(hold)
+            else:
+                await hold_store.unclaim(hold)
+        return booking
+
+    @classmethod
+    async def cancel(cls, user_id: int, hold_id: str) -> None:
+        hold = await cls.get(user_id, hold_id)
+        if not await hold_store.release(hold):
+            raise HoldNotFoundException
@@ -0,0 +1,254 @@
+import json
+import time
+import uuid
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from redis import asyncio as aioredis
+
+from app.bookings.holds.schemas import SHold
+from app.bookings.room_nights.service import RoomNightsService
+from app.config import settings
+
+# Удержание номера на все ночи разом. Счетчик ночи — sorted set удержаний
+# с временем истечения в score: истекшие удержания вычищаются сами, без
+# фоновой задачи, а ключ ночи живет до истечения последнего из них.
+# KEYS: ключ удержания, ночи номера, ночи отеля
+# ARGV: id удержания, сейчас (мс), истекает (мс), ttl (мс), свободно номеров,
+# число ночей, удержание (JSON)
+HOLD_SCRIPT = """
+local nights = tonumber(ARGV[6])
+for i = 2, nights + 1 do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', ARGV[2])
+    if redis.call('ZCARD', KEYS[i]) >= tonumber(ARGV[5]) then
+        return 0
+    end
+end
+for i = 2, #KEYS do
+    redis.call('ZADD', KEYS[i], ARGV[3], ARGV[1])
+    if redis.call('PTTL', KEYS[i]) < tonumber(ARGV[4]) then
+        redis.call('PEXPIRE', KEYS[i], ARGV[4])
+    end
+end
+redis.call('SET', KEYS[1], ARGV[7], 'PX', ARGV[4])
+return 1
+"""
+
+# Снять удержание может только один вызов: подтверждение или отмена
+# KEYS: ключ удержания, ночи номера и отеля; ARGV: id удержания
+RELEASE_SCRIPT = """
+if redis.call('DEL', KEYS[1]) == 0 then
+    return 0
+end
+for i = 2, #KEYS do
+    redis.call('ZREM', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+# Наибольшее по ночам число действующих удержаний для каждой группы из ARGV[2] ночей
+# KEYS: ночи первого номера (отеля), ночи второго, ...; ARGV: сейчас (мс), число ночей
+HELD_SCRIPT = """
+local nights = tonumber(ARGV[2])
+local result = {}
+for first = 1, #KEYS, nights do
+    local held = 0
+    for i = first, first + nights - 1 do
+        local count = redis.call('ZCOUNT', KEYS[i], '(' .. ARGV[1], '+inf')
+        if count > held then
+            held = count
+        end
+    end
+    result[#result + 1] = held
+end
+return result
+"""
+
+# Действующие удержания на каждую ночь, без удержания ARGV[2] (подтверждаемого)
+# KEYS: ночи номеров; ARGV: сейчас (мс), id исключаемого удержания или ''
+HELD_NIGHTS_SCRIPT = """
+local result = {}
+for i = 1, #KEYS do
+    local count = redis.call('ZCOUNT', KEYS[i], '(' .. ARGV[1], '+inf')
+    local own = redis.call('ZSCORE', KEYS[i], ARGV[2])
+    if own and tonumber(own) > tonumber(ARGV[1]) then
+        count = count - 1
+    end
+    result[i] = count
+end
+return result
+"""
+
+
+class HoldStore:
+    """
+    Короткие удержания номеров в Redis на время оформления брони.
+
+    Удержание занимает по одному номеру на каждую ночь проживания. Проверка
+    остатка и занятие ночей — один Lua-скрипт, поэтому всплеск запросов
+    на один номер разбирается в Redis, а в Postgres с блокировкой строки
+    номера приходят только подтверждения удержаний.
+
+    Каждое удержание учитывается и в ночах отеля: так поиск отелей вычитает
+    удержания, не зная номеров отеля.
+
+    Брони тоже вычитают удержания (held_nights), иначе бронь без удержания
+    заняла бы номер, уже обещанный подтверждению.
+    """
+
+    def __init__(
+        self, prefix: str = "holds", ttl: int = settings.BOOKING_HOLD_SECONDS
+    ) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+        self._redis: Optional[aioredis.Redis] = None
+        self._hold = None
+        self._release = None
+        self._count_held = None
+        self._count_held_nights = None
+
+    def init(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        self._hold = redis.register_script(HOLD_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+        self._count_held = redis.register_script(HELD_SCRIPT)
+        self._count_held_nights = redis.register_script(HELD_NIGHTS_SCRIPT)
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    def _hold_key(self, hold_id: str) -> str:
+        return f"{self.prefix}:{hold_id}"
+
+    def _confirm_key(self, hold_id: str) -> str:
+        return f"{self.prefix}:{hold_id}:confirm"
+
+    def _night_key(self, kind: str, object_id: int, night: date) -> str:
+        return f"{self.prefix}:{kind}:{object_id}:{night}"
+
+    def _night_keys(
+        self, kind: str, object_id: int, date_from: date, date_to: date
+    ) -> List[str]:
+        return [
+            self._night_key(kind, object_id, night)
+            for night in RoomNightsService.nights(date_from, date_to)
+        ]
+
+    def _keys(self, hold: SHold) -> List[str]:
+        return [
+            self._hold_key(hold.id),
+            *self._night_keys("room", hold.room_id, hold.date_from, hold.date_to),
+            *self._night_keys("hotel", hold.hotel_id, hold.date_from, hold.date_to),
+        ]
+
+    async def hold(
+        self,
+        user_id: int,
+        room_id: int,
+        hotel_id: int,
+        date_from: date,
+        date_to: date,
+        rooms_left: int,
+    ) -> Optional[SHold]:
+        """Удержать номер, если на каждую ночь удержаний меньше, чем rooms_left."""
+        if self._redis is None or rooms_left <= 0:
+            return None
+        now = time.time()
+        hold = SHold(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            room_id=room_id,
+            hotel_id=hotel_id,
+            date_from=date_from,
+            date_to=date_to,
+            expires_at=datetime.fromtimestamp(now + self.ttl, timezone.utc),
+        )
+        args = [
+            hold.id,
+            int(now * 1000),
+            int((now + self.ttl) * 1000),
+            self.ttl * 1000,
+            rooms_left,
+            (date_to - date_from).days,
+            hold.model_dump_json(),
+        ]
+        held = await self._hold(keys=self._keys(hold), args=args)  # type: ignore
+        return hold if held else None
+
+    async def get(self, hold_id: str) -> Optional[SHold]:
+        if self._redis is None:
+            return None
+        raw = await self._redis.get(self._hold_key(hold_id))
+        return SHold(**json.loads(raw)) if raw else None
+
+    async def release(self, hold: SHold) -> bool:
+        if self._redis is None:
+            return False
+        released = await self._release(  # type: ignore
+            keys=self._keys(hold), args=[hold.id]
+        )
+        return bool(released)
+
+    async def claim(self, hold: SHold) -> bool:
+        """
+        Начать подтверждение: из одновременных подтверждений одного удержания
+        проходит одно. Удержание при этом остается в силе до release.
+        """
+        if self._redis is None:
+            return False
+        return bool(
+            await self._redis.set(
+                self._confirm_key(hold.id), 1, nx=True, px=self.ttl * 1000
+            )
+        )
+
+    async def unclaim(self, hold: SHold) -> None:
+        """Подтверждение не удалось: удержание можно подтвердить снова."""
+        if self._redis is not None:
+            await self._redis.delete(self._confirm_key(hold.id))
+
+    async def _held(
+        self, kind: str, ids: Sequence[int], date_from: date, date_to: date
+    ) -> Dict[int, int]:
+        if self._redis is None or not ids:
+            return {object_id: 0 for object_id in ids}
+        keys = [
+            key
+            for object_id in ids
+            for key in self._night_keys(kind, object_id, date_from, date_to)
+        ]
+        args = [int(time.time() * 1000), (date_to - date_from).days]
+        held = await self._count_held(keys=keys, args=args)  # type: ignore
+        return dict(zip(ids, held))
+
+    async def held_rooms(
+        self, room_ids: Sequence[int], date_from: date, date_to: date
+    ) -> Dict[int, int]:
+        """Удержано номеров каждого типа: наибольшее по ночам проживания."""
+        return await self._held("room", room_ids, date_from, date_to)
+
+    async def held_hotels(
+        self, hotel_ids: Sequence[int], date_from: date, date_to: date
+    ) -> Dict[int, int]:
+        """Удержано номеров в каждом отеле: наибольшее по ночам проживания."""
+        return await self._held("hotel", hotel_ids, date_from, date_to)
+
+    async def held_nights(
+        self, nights: Iterable[Tuple[int, date]], exclude: Optional[str] = None
+    ) -> Dict[Tuple[int, date], int]:
+        """
+        Удержано номеров на каждую ночь (room_id, night), не считая
+        удержания exclude.
+        """
+        nights = list(nights)
+        if self._redis is None or not nights:
+            return {night: 0 for night in nights}
+        keys = [self._night_key("room", room_id, night) for room_id, night in nights]
+        held = await self._count_held_nights(  # type: ignore
+            keys=keys, args=[int(time.time() * 1000), exclude or ""]
+        )
+        return dict(zip(nights, held))
+
+
+hold_store = HoldStore()
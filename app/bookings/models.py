@@ -1,19 +1,29 @@
-from sqlalchemy import Column, Computed, Date, ForeignKey, Integer
+from sqlalchemy import DDL, Column, Computed, Date, ForeignKey, Index, Integer, event
 from sqlalchemy.orm import relationship
 
+from app.bookings.functions import create_book_room, drop_book_room
 from app.database import Base
 
 
 class Bookings(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_room_id_dates", "room_id", "date_from", "date_to"),
+        Index("ix_bookings_user_id_date_from", "user_id", "date_from", "id"),
+        # Помесячные секции по дате выезда: прошедшие брони не мешают поиску и
+        # уходят в архив целыми секциями (BookingPartitionsService)
+        {"postgresql_partition_by": "RANGE (date_to)"},
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     room_id = Column(ForeignKey("rooms.id"))
     user_id = Column(ForeignKey("users.id"))
     date_from = Column(Date, nullable=False)
-    date_to = Column(Date, nullable=False)
+    # Ключ секционирования обязан входить в первичный ключ
+    date_to = Column(Date, primary_key=True)
     price = Column(Integer, nullable=False)
-    total_cost = Column(Integer, Computed("(date_to - date_from) * price"))
+    # Сумма по ночным ценам PricingService на момент брони
+    total_cost = Column(Integer, nullable=False)
     total_days = Column(Integer, Computed("date_to - date_from"))
 
     user = relationship("Users", back_populates="booking")
@@ -21,3 +31,13 @@ class Bookings(Base):
 
     def __str__(self):
         return f"Booking #{self.id}"
+
+
+# Для create_all/drop_all (тесты); в рабочей БД секции и функцию создает миграция
+event.listen(
+    Bookings.__table__,
+    "after_create",
+    DDL("CREATE TABLE bookings_default PARTITION OF bookings DEFAULT"),
+)
+event.listen(Base.metadata, "after_create", create_book_room)
+event.listen(Base.metadata, "before_drop", drop_book_room)
@@ -0,0 +1,171 @@
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, Integer, column, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.bookings.room_nights.service import RoomNightsService
+from app.config import settings
+from app.database import async_session_maker
+from app.logger import logger
+
+ARCHIVE_SCHEMA = "archive"
+
+PARTITION_NAME = re.compile(r"^bookings_y(\d{4})m(\d{2})$")
+
+# Столбцы, которые переносятся между секциями; total_days вычисляемый
+COLUMNS = "id, room_id, user_id, date_from, date_to, price, total_cost"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"bookings_y{month:%Y}m{month:%m}"
+
+
+class BookingPartitionsService:
+    """
+    Помесячные секции bookings по date_to: секция bookings_y2024m05 хранит
+    брони с выездом в мае 2024 года.
+
+    Брони с date_to вне готовых секций попадают в bookings_default, поэтому
+    секции создаются заранее на BOOKINGS_PARTITIONS_AHEAD месяцев вперед.
+    Секции старше BOOKINGS_RETENTION_MONTHS отсоединяются и переносятся в
+    схему archive целиком, без построчного DELETE.
+    """
+
+    @staticmethod
+    async def partitions(session: AsyncSession) -> Dict[date, str]:
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'bookings'::regclass
+        """
+        result = await session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'bookings'::regclass"
+            )
+        )
+        months = {}
+        for name in result.scalars().all():
+            match = PARTITION_NAME.match(name)
+            if match:
+                months[date(int(match[1]), int(match[2]), 1)] = name
+        return months
+
+    @classmethod
+    async def ensure_partitions(
+        cls,
+        today: Optional[date] = None,
+        months_ahead: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Создает недостающие секции с текущего месяца на months_ahead
+        месяцев вперед.
+        """
+        today = today or date.today()
+        months_ahead = (
+            settings.BOOKINGS_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+        )
+        created = []
+        async with async_session_maker() as session:
+            existing = await cls.partitions(session)
+            for offset in range(months_ahead + 1):
+                month = add_months(month_start(today), offset)
+                if month not in existing:
+                    await cls.create_partition(session, month)
+                    created.append(partition_name(month))
+            await session.commit()
+        return created
+
+    @staticmethod
+    async def create_partition(session: AsyncSession, month: date) -> None:
+        """
+        CREATE TABLE bookings_y2024m05 (LIKE bookings INCLUDING GENERATED);
+        WITH moved AS (
+            DELETE FROM bookings_default
+            WHERE date_to >= '2024-05-01' AND date_to < '2024-06-01'
+            RETURNING ...
+        ) INSERT INTO bookings_y2024m05 (...) SELECT ... FROM moved;
+        ALTER TABLE bookings ATTACH PARTITION bookings_y2024m05
+            FOR VALUES FROM ('2024-05-01') TO ('2024-06-01');
+
+        CREATE TABLE ... PARTITION OF падает, если в bookings_default уже есть
+        брони этого месяца, поэтому они сначала переносятся в новую таблицу.
+        Индексы и первичный ключ секция получает при ATTACH.
+        """
+        name = partition_name(month)
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+        await session.execute(
+            text(f"CREATE TABLE {name} (LIKE bookings INCLUDING GENERATED)")
+        )
+        await session.execute(
+            text(
+                f"WITH moved AS ("
+                f"DELETE FROM bookings_default "
+                f"WHERE date_to >= '{start}' AND date_to < '{end}' "
+                f"RETURNING {COLUMNS}"
+                f") INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved"
+            )
+        )
+        await session.execute(
+            text(
+                f"ALTER TABLE bookings ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+        )
+
+    @classmethod
+    async def archive(cls, before: date) -> List[str]:
+        """
+        Переносит в схему archive секции, все брони которых выехали раньше before.
+
+        Перед отсоединением брони секции снимаются с журнала room_nights, чтобы
+        журнал оставался согласован с таблицей bookings.
+        """
+        archived = []
+        async with async_session_maker() as session:
+            await session.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+            for month, name in sorted((await cls.partitions(session)).items()):
+                end = add_months(month, 1)
+                if end > before:
+                    continue
+                source = table(
+                    name,
+                    column("room_id", Integer),
+                    column("date_from", Date),
+                    column("date_to", Date),
+                )
+                await RoomNightsService.release_all(session, source, end)
+                await session.execute(
+                    text(f"ALTER TABLE bookings DETACH PARTITION {name}")
+                )
+                await session.execute(
+                    text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+                )
+                archived.append(name)
+            await session.commit()
+        return archived
+
+    @classmethod
+    async def maintain(cls, today: Optional[date] = None) -> Dict[str, List[str]]:
+        today = today or date.today()
+        created = await cls.ensure_partitions(today)
+        archived = await cls.archive(
+            add_months(month_start(today), -settings.BOOKINGS_RETENTION_MONTHS)
+        )
+        logger.info(
+            "Booking partitions maintained",
+            extra={"created": created, "archived": archived},
+        )
+        return {"created": created, "archived": archived}
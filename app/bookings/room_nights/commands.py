@@ -0,0 +1,41 @@
+"""
+Обслуживание журнала занятости room_nights.
+
+    python -m app.bookings.room_nights.commands rebuild  # пересобрать из bookings
+    python -m app.bookings.room_nights.commands check    # сверить журнал с bookings
+"""
+
+import argparse
+import asyncio
+import sys
+
+from app.bookings.room_nights.service import RoomNightsService
+from app.logger import logger
+
+
+async def rebuild() -> int:
+    rows = await RoomNightsService.rebuild()
+    logger.info("room_nights rebuilt", extra={"rows": rows})
+    return 0
+
+
+async def check() -> int:
+    mismatches = await RoomNightsService.check()
+    if not mismatches:
+        logger.info("room_nights is consistent with bookings")
+        return 0
+    for mismatch in mismatches:
+        logger.error("room_nights mismatch", extra=mismatch)
+    return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Журнал занятости номеров room_nights")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+    commands = {"rebuild": rebuild, "check": check}
+    return asyncio.run(commands[args.command]())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Date, ForeignKey, Integer
+
+from app.database import Base
+
+
+class RoomNights(Base):
+    __tablename__ = "room_nights"
+
+    room_id = Column(ForeignKey("rooms.id"), primary_key=True)
+    night = Column(Date, primary_key=True)
+    booked_count = Column(Integer, nullable=False, default=0)
+
+    def __str__(self):
+        return f"Номер #{self.room_id} на {self.night}: {self.booked_count}"
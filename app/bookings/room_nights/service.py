@@ -0,0 +1,348 @@
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import (
+    Date,
+    FromClause,
+    Integer,
+    Select,
+    and_,
+    cast,
+    delete,
+    func,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights
+from app.database import async_session_maker
+from app.hotels.rooms.models import Rooms
+from app.service.base import BaseService
+
+
+class RoomNightsService(BaseService):
+    """
+    Журнал занятости: сколько номеров каждого типа забронировано на каждую ночь.
+
+    Бронь с date_from по date_to занимает ночи date_from ... date_to - 1.
+    Журнал обновляется в той же транзакции, что и вставка/удаление брони,
+    поэтому вопрос "сколько номеров свободно" решается поиском по первичному
+    ключу (room_id, night), а не сканированием всей таблицы bookings.
+    """
+
+    model = RoomNights
+
+    BULK_WRITES = False
+
+    @staticmethod
+    def nights(date_from: date, date_to: date) -> List[date]:
+        return [
+            date_from + timedelta(days=i) for i in range((date_to - date_from).days)
+        ]
+
+    @staticmethod
+    def booked_count(date_from: date, date_to: date):
+        """
+        SELECT COALESCE(MAX(room_nights.booked_count), 0) FROM room_nights
+        WHERE room_nights.room_id = rooms.id AND
+        room_nights.night >= '2023-05-15' AND room_nights.night < '2023-06-20'
+        """
+        return (
+            select(func.coalesce(func.max(RoomNights.booked_count), 0))
+            .where(
+                RoomNights.room_id == Rooms.id,
+                RoomNights.night >= date_from,
+                RoomNights.night < date_to,
+            )
+            .correlate(Rooms)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def booked_counts(date_from: date, date_to: date, *where):
+        """
+        Занятость сразу многих номеров одним агрегатом, для JOIN к rooms:
+
+        SELECT room_nights.room_id, MAX(room_nights.booked_count) AS booked_count
+        FROM room_nights
+        WHERE room_nights.room_id IN (
+            SELECT rooms.id FROM rooms WHERE rooms.hotel_id IN (1, 2, 3)
+        ) AND
+        room_nights.night >= '2023-05-15' AND room_nights.night < '2023-06-20'
+        GROUP BY room_nights.room_id
+        """
+        return (
+            select(
+                RoomNights.room_id,
+                func.max(RoomNights.booked_count).label("booked_count"),
+            )
+            .where(
+                RoomNights.room_id.in_(select(Rooms.id).where(*where)),
+                RoomNights.night >= date_from,
+                RoomNights.night < date_to,
+            )
+            .group_by(RoomNights.room_id)
+            .subquery("booked")
+        )
+
+    @staticmethod
+    def available_stays(date_from: date, date_to: date, nights: int, *where) -> Select:
+        """
+        Все свободные заезды на nights ночей внутри [date_from, date_to).
+        Один проход окном по ночам каждого номера — без запроса на каждую дату заезда:
+
+        SELECT room_id, hotel_id, date_from, rooms_left FROM (
+            SELECT room_id, hotel_id, night AS date_from,
+                min(rooms_left) OVER w AS rooms_left, count(*) OVER w AS nights
+            FROM (
+                SELECT rooms.id AS room_id, rooms.hotel_id,
+                    '2023-05-01'::date + n AS night,
+                    rooms.quantity - COALESCE(room_nights.booked_count, 0) AS rooms_left
+                FROM rooms CROSS JOIN generate_series(0, 29) AS offsets(n)
+                LEFT JOIN room_nights ON room_nights.room_id = rooms.id AND
+                    room_nights.night = '2023-05-01'::date + n
+                WHERE rooms.hotel_id = 1
+            ) AS per_night
+            WINDOW w AS (
+                PARTITION BY room_id ORDER BY night
+                ROWS BETWEEN CURRENT ROW AND 2 FOLLOWING
+            )
+        ) AS windows
+        WHERE nights = 3 AND rooms_left > 0
+        """
+        offsets = (
+            func.generate_series(0, (date_to - date_from).days - 1)
+            .table_valued("n")
+            .render_derived(name="offsets")
+        )
+        night = cast(date_from, Date) + offsets.c.n
+        per_night = (
+            select(
+                Rooms.id.label("room_id"),
+                Rooms.hotel_id,
+                night.label("night"),
+                (Rooms.quantity - func.coalesce(RoomNights.booked_count, 0)).label(
+                    "rooms_left"
+                ),
+            )
+            .join(offsets, true())
+            .join(
+                RoomNights,
+                and_(RoomNights.room_id == Rooms.id, RoomNights.night == night),
+                isouter=True,
+            )
+            .where(*where)
+            .subquery("per_night")
+        )
+        window = {
+            "partition_by": per_night.c.room_id,
+            "order_by": per_night.c.night,
+            "rows": (0, nights - 1),
+        }
+        windows = select(
+            per_night.c.room_id,
+            per_night.c.hotel_id,
+            per_night.c.night.label("date_from"),
+            func.min(per_night.c.rooms_left).over(**window).label("rooms_left"),
+            func.count().over(**window).label("nights"),
+        ).subquery("windows")
+        # Окна у конца диапазона короче nights ночей — такие заезды не помещаются
+        return select(
+            windows.c.room_id,
+            windows.c.hotel_id,
+            windows.c.date_from,
+            windows.c.rooms_left,
+        ).where(windows.c.nights == nights, windows.c.rooms_left > 0)
+
+    @classmethod
+    async def book(
+        cls, session: AsyncSession, room_id: int, date_from: date, date_to: date
+    ) -> None:
+        nights = [
+            {"room_id": room_id, "night": night, "booked_count": 1}
+            for night in cls.nights(date_from, date_to)
+        ]
+        if not nights:
+            return
+        query = insert(RoomNights).values(nights)
+        query = query.on_conflict_do_update(
+            index_elements=[RoomNights.room_id, RoomNights.night],
+            set_={"booked_count": RoomNights.booked_count + 1},
+        )
+        await session.execute(query)
+
+    @classmethod
+    def demand(
+        cls, stays: Sequence[Tuple[int, date, date]]
+    ) -> Dict[Tuple[int, date], int]:
+        """
+        Сколько номеров каждого типа на каждую ночь занимает группа броней
+        (room_id, date_from, date_to).
+        """
+        counts: Counter = Counter()
+        for room_id, date_from, date_to in stays:
+            counts.update((room_id, night) for night in cls.nights(date_from, date_to))
+        return dict(counts)
+
+    @staticmethod
+    async def booked_nights(
+        session: AsyncSession, demand: Dict[Tuple[int, date], int]
+    ) -> Dict[Tuple[int, date], int]:
+        """
+        Текущая занятость ночей группы одним запросом:
+
+        SELECT room_id, night, booked_count FROM room_nights
+        WHERE room_id IN (1, 2) AND night >= '2023-05-15' AND night < '2023-06-20'
+        """
+        nights = [night for _, night in demand]
+        query = select(
+            RoomNights.room_id, RoomNights.night, RoomNights.booked_count
+        ).where(
+            RoomNights.room_id.in_({room_id for room_id, _ in demand}),
+            RoomNights.night >= min(nights),
+            RoomNights.night <= max(nights),
+        )
+        result = await session.execute(query)
+        return {
+            (room_id, night): booked_count
+            for room_id, night, booked_count in result.all()
+        }
+
+    @staticmethod
+    async def book_nights(
+        session: AsyncSession, demand: Dict[Tuple[int, date], int]
+    ) -> None:
+        """Занятость всей группы одним INSERT ... ON CONFLICT DO UPDATE."""
+        query = insert(RoomNights).values(
+            [
+                {"room_id": room_id, "night": night, "booked_count": count}
+                for (room_id, night), count in demand.items()
+            ]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[RoomNights.room_id, RoomNights.night],
+            set_={
+                "booked_count": RoomNights.booked_count + query.excluded.booked_count
+            },
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def release(
+        cls, session: AsyncSession, room_id: int, date_from: date, date_to: date
+    ) -> None:
+        in_range = (
+            RoomNights.room_id == room_id,
+            RoomNights.night >= date_from,
+            RoomNights.night < date_to,
+        )
+        await session.execute(
+            update(RoomNights)
+            .where(*in_range)
+            .values(booked_count=RoomNights.booked_count - 1)
+        )
+        await session.execute(
+            delete(RoomNights).where(*in_range, RoomNights.booked_count <= 0)
+        )
+
+    @staticmethod
+    def expected_nights(source: FromClause = Bookings.__table__):
+        """
+        SELECT nights.room_id, nights.night, COUNT(*) AS booked_count FROM (
+            SELECT room_id,
+                date_from + generate_series(0, date_to - date_from - 1) AS night
+            FROM bookings
+        ) AS nights
+        GROUP BY nights.room_id, nights.night
+        """
+        offsets = func.generate_series(
+            0, source.c.date_to - source.c.date_from - 1, type_=Integer
+        )
+        nights = select(
+            source.c.room_id, (source.c.date_from + offsets).label("night")
+        ).subquery("nights")
+        return select(
+            nights.c.room_id,
+            nights.c.night,
+            func.count().label("booked_count"),
+        ).group_by(nights.c.room_id, nights.c.night)
+
+    @classmethod
+    async def release_all(
+        cls, session: AsyncSession, source: FromClause, until: date
+    ) -> None:
+        """
+        Снимает с журнала все брони source (например, секции bookings перед
+        отправкой в архив); все их ночи раньше until.
+
+        UPDATE room_nights
+        SET booked_count = room_nights.booked_count - released.booked_count
+        FROM (SELECT nights.room_id, nights.night, COUNT(*) AS booked_count ...
+              FROM bookings_y2024m01 ...) AS released
+        WHERE room_nights.room_id = released.room_id
+            AND room_nights.night = released.night
+        """
+        released = cls.expected_nights(source).subquery("released")
+        await session.execute(
+            update(RoomNights)
+            .where(
+                RoomNights.room_id == released.c.room_id,
+                RoomNights.night == released.c.night,
+            )
+            .values(booked_count=RoomNights.booked_count - released.c.booked_count)
+        )
+        await session.execute(
+            delete(RoomNights).where(
+                RoomNights.night < until, RoomNights.booked_count <= 0
+            )
+        )
+
+    @classmethod
+    async def rebuild(cls) -> int:
+        async with async_session_maker() as session:
+            await session.execute(delete(RoomNights))
+            query = insert(RoomNights).from_select(
+                ["room_id", "night", "booked_count"],
+                cls.expected_nights(),
+            )
+            result = await session.execute(query)
+            await session.commit()
+            return result.rowcount
+
+    @classmethod
+    async def check(cls) -> List[Dict[str, Any]]:
+        """
+        Расхождения журнала с таблицей bookings; пустой список — журнал
+        согласован.
+        """
+        async with async_session_maker() as session:
+            expected = cls.expected_nights().subquery("expected")
+            expected_count = func.coalesce(expected.c.booked_count, 0)
+            actual_count = func.coalesce(RoomNights.booked_count, 0)
+            query = (
+                select(
+                    func.coalesce(expected.c.room_id, RoomNights.room_id).label(
+                        "room_id"
+                    ),
+                    func.coalesce(expected.c.night, RoomNights.night).label("night"),
+                    expected_count.label("expected"),
+                    actual_count.label("actual"),
+                )
+                .select_from(
+                    expected.join(
+                        RoomNights,
+                        (RoomNights.room_id == expected.c.room_id)
+                        & (RoomNights.night == expected.c.night),
+                        full=True,
+                    )
+                )
+                .where(expected_count != actual_count)
+                .order_by("room_id", "night")
+            )
+            result = await session.execute(query)
+            return [dict(row) for row in result.mappings().all()]
@@ -1,19 +1,38 @@
 from datetime import date
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import version
 
-from app.bookings.models import Bookings
-from app.bookings.schemas import SBooking
+from app.bookings.schemas import SBooking, SBookingInfo, SBookingStay
 from app.bookings.service import BookingService
-from app.database import async_session_maker
-from app.exceptions import BookingNotFoundException, RoomCannotBeBookedException
-from app.hotels.rooms.models import Rooms
-from app.tasks.tasks import send_booking_confirmation_email
-from app.users.dependencies import get_current_user
+from app.database import session_scope, stick_to_primary
+from app.exceptions import (
+    BookingNotFoundException,
+    InvalidDateException,
+    RoomCannotBeBookedException,
+    TooManyStaysException,
+    UserIsNotPresentException,
+)
+from app.idempotency import idempotency
+from app.service.pagination import SortOrder, SPage
+from app.tasks.tasks import (
+    send_booking_confirmation_email,
+    send_group_booking_confirmation_email,
+)
+from app.users.dependencies import get_current_user, get_current_user_id
 from app.users.models import Users
+from app.users.service import UsersService
 
 router = APIRouter(
     prefix="/bookings",
@@ -29,26 +48,41 @@ router = APIRouter(
 @router.get("")
 @version(1)
 async def get_bookings(user: Users = Depends(get_current_user)) -> List[Dict[str, Any]]:
-    async with async_session_maker() as session:
-        query = (
-            select(Bookings, Rooms.image_id, Rooms.name, Rooms.description, Rooms.services)
-            .join(Rooms, Rooms.id == Bookings.room_id)
-            .where(Bookings.user_id == user.id)
-        )
+    async with session_scope(read_only=True) as session:
+        query = BookingService.user_bookings_query(user.id)
         result = await session.execute(query)
-        bookings = result.all()
         return [
-            {
-                **SBooking.model_validate(booking.Bookings).model_dump(),
-                "image_id": booking.image_id,
-                "name": booking.name,
-                "description": booking.description,
-                "services": booking.services,
-            }
-            for booking in bookings
+            BookingService.booking_info(booking).model_dump()
+            for booking in result.all()
         ]
 
 
+@router.get("")
+@version(2)
+async def get_bookings_page(
+    order: SortOrder = Query("desc", description="По дате заезда"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(20, ge=1, le=100),
+    user: Users = Depends(get_current_user),
+) -> SPage[SBookingInfo]:
+    bookings, next_cursor = await BookingService.user_bookings_page(
+        user.id, order, cursor, limit
+    )
+    return SPage(items=bookings, next_cursor=next_cursor)
+
+
+@router.get("/stream")
+@version(1)
+async def stream_bookings(user: Users = Depends(get_current_user)) -> StreamingResponse:
+    """Вся история броней в NDJSON: по строке на бронь, по мере чтения из БД."""
+
+    async def lines() -> AsyncIterator[str]:
+        async for booking in BookingService.stream_user_bookings(user.id):
+            yield booking.model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.post("")
 @version(1)
 async def add_booking(
@@ -56,18 +90,65 @@ async def add_booking(
     room_id: int,
     date_from: date,
     date_to: date,
-    user: Users = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Повтор с тем же ключом вернет первый ответ",
+    ),
+    user_id: int = Depends(get_current_user_id),
 ):
-    booking = await BookingService.add(user.id, room_id, date_from, date_to)
-    if not booking:
+    async def create() -> Dict[str, Any]:
+        user = await UsersService.find_by_id(user_id)
+        if not user:
+            raise UserIsNotPresentException
+        booking = await BookingService.add(user.id, room_id, date_from, date_to)
+        if not booking:
+            raise RoomCannotBeBookedException
+        booking_model = SBooking(**booking.__dict__)  # Преобразование в модель Pydantic
+        booking_dict = booking_model.model_dump()  # Используем model_dump вместо dict
+        # вариант с celery
+        send_booking_confirmation_email.delay(booking_dict, user.email)
+        # вариант встроенный background tasks
+        # background_tasks.add_task(send_booking_confirmation_email, booking_dict, user.email)
+        return booking_dict
+
+    if idempotency_key is None:
+        return await create()
+    # Повтор с сохраненным ответом не обращается ни к Postgres, ни к celery
+    params = {"room_id": room_id, "date_from": date_from, "date_to": date_to}
+    booking = await idempotency.run(
+        f"bookings:{user_id}:{idempotency_key}", params, create
+    )
+    # Бронь создана вне контекста запроса, закрепляем клиента за основной БД здесь
+    stick_to_primary()
+    return booking
+
+
+@router.post("/group")
+@version(1)
+async def add_group_booking(
+    stays: List[SBookingStay] = Body(..., min_length=1),
+    user: Users = Depends(get_current_user),
+) -> List[SBooking]:
+    """
+    Несколько номеров одной бронью: все сразу или ни одного, одно письмо
+    на всю группу.
+    """
+    if len(stays) > BookingService.GROUP_MAX_STAYS:
+        raise TooManyStaysException(BookingService.GROUP_MAX_STAYS)
+    if any((stay.date_to - stay.date_from).days <= 0 for stay in stays):
+        raise InvalidDateException
+
+    bookings = await BookingService.add_group(
+        user.id, [(stay.room_id, stay.date_from, stay.date_to) for stay in stays]
+    )
+    if not bookings:
         raise RoomCannotBeBookedException
-    booking_model = SBooking(**booking.__dict__)  # Преобразование в модель Pydantic
-    booking_dict = booking_model.model_dump()  # Используем model_dump вместо dict
-    # вариант с celery
-    send_booking_confirmation_email.delay(booking_dict, user.email)
-    # вариант встроенный background tasks
-    # background_tasks.add_task(send_booking_confirmation_email, booking_dict, user.email)
-    return booking_dict
+    send_group_booking_confirmation_email.delay(
+        [booking.model_dump(mode="json") for booking in bookings], user.email
+    )
+    return bookings
 
 
 @router.delete("/{booking_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -17,3 +17,16 @@ class SBooking(BaseModel):
     class Config:
         # orm_mode = True
         from_attributes = True
+
+
+class SBookingInfo(SBooking):
+    image_id: int
+    name: str
+    description: str
+    services: List[str]
+
+
+class SBookingStay(BaseModel):
+    room_id: int
+    date_from: date
+    date_to: date
@@ -1,147 +1,552 @@
+import asyncio
+import random
+from collections import Counter
 from datetime import date
-from typing import List, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
-from sqlalchemy import and_, delete, func, insert, or_, select
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import (
+    Date,
+    Integer,
+    Row,
+    Select,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.availability.engine import availability_engine
+from app.bookings.holds.store import hold_store
 from app.bookings.models import Bookings
-from app.bookings.schemas import SBooking
-from app.database import async_session_maker
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.schemas import SBooking, SBookingInfo
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.config import settings
+from app.database import session_scope, stick_to_primary
 from app.hotels.rooms.models import Rooms
+from app.hotels.rooms.service import RoomService
 from app.service.base import BaseService
+from app.service.coalescer import Coalescer
+from app.service.pagination import SortOrder, decode_cursor, keyset, page
 from app.logger import logger
+from app.pricing.service import PricingService
+
+T = TypeVar("T")
+
+# user_id, room_id, date_from, date_to
+BookingRequest = Tuple[int, int, date, date]
+
+# SELECT * FROM book_room($1, $2, $3, $4, $5, $6): строится один раз,
+# значения — параметры
+BOOK_ROOM = select(Bookings).from_statement(
+    select(text("*")).select_from(
+        func.book_room(
+            bindparam("user_id", type_=Integer),
+            bindparam("room_id", type_=Integer),
+            bindparam("date_from", type_=Date),
+            bindparam("date_to", type_=Date),
+            bindparam("rules", type_=JSONB),
+            bindparam("held", type_=ARRAY(Integer)),
+        )
+    )
+)
 
 
 class BookingService(BaseService):
     model = Bookings
 
+    # Брони пишутся только через book_room и _insert_bookings вместе с журналом
+    BULK_WRITES = False
+
+    # Повторы при конфликте транзакций: serialization_failure, deadlock_detected
+    RETRYABLE_PGCODES = {"40001", "40P01"}
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.05
+
+    STREAM_BATCH = 500
+
+    GROUP_MAX_STAYS = 20
+
+    _coalescer: Optional[Coalescer] = None
+
     @classmethod
     async def add(
         cls,
-        session: AsyncSession,
         user_id: int,
         room_id: int,
         date_from: date,
         date_to: date,
+        hold_id: Optional[str] = None,
     ) -> Optional[SBooking]:
         """
-        WITH booked_rooms AS (
-            SELECT * FROM bookings
-            WHERE room_id = 1 AND
-            (date_from >= '2023-05-15' AND date_from <= '2023-06-20') OR
-            (date_from <= '2023-05-15' AND date_to > '2023-05-15')
-        )
-        SELECT rooms.quantity - COUNT (booked_rooms.room_id) FROM rooms
-        LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
-        WHERE rooms.id = 1
-        GROUP BY rooms.quantity, booked_rooms.room_id
-        """
-
-        try:
-            async with async_session_maker() as session:
-                booked_rooms = (
-                    select(Bookings)
-                    .where(
-                        and_(
-                            Bookings.room_id == room_id,
-                            or_(
-                                and_(
-                                    Bookings.date_from >= date_from,
-                                    Bookings.date_from <= date_to,
-                                ),
-                                and_(
-                                    Bookings.date_from <= date_from,
-                                    Bookings.date_to > date_from,
-                                ),
-                            ),
-                        )
-                    )
-                    .cte("booked_rooms")
+        hold_id — подтверждаемое удержание: его ночи не вычитаются из остатка.
+        Такая бронь не копится в пачку, пачки вычитают все удержания.
+        """
+        if settings.BOOKING_COALESCE and hold_id is None:
+            new_booking = await cls.coalescer().submit(
+                (user_id, room_id, date_from, date_to)
+            )
+            # Пачка пишется вне контекста запроса, закрепляем его здесь
+            if new_booking:
+                stick_to_primary()
+            return new_booking
+
+        async def add_once() -> Optional[SBooking]:
+            new_booking = await cls._add(user_id, room_id, date_from, date_to, hold_id)
+            if new_booking:
+                await cls._booking_changed(
+                    new_booking.id, room_id, date_from, date_to, 1
                 )
+            return new_booking
 
-                """
-                SELECT rooms.quantity - COUNT (booked_rooms.room_id) FROM rooms
-                LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
-                WHERE rooms.id = 1
-                GROUP BY rooms.quantity, booked_rooms.room_id
-                """
-
-                get_rooms_left = (
-                    select((Rooms.quantity - func.count(booked_rooms.c.room_id)).label("rooms_left"))
-                    .select_from(Rooms)
-                    .join(booked_rooms, booked_rooms.c.room_id == Rooms.id, isouter=True)
-                    .where(Rooms.id == room_id)
-                    .group_by(Rooms.quantity, booked_rooms.c.room_id)
+        extra = {
+            "user_id": user_id,
+            "room_id": room_id,
+            "date_from": date_from,
+            "date_to": date_to,
+        }
+        return await cls._retrying(add_once, extra)
+
+    @classmethod
+    async def add_group(
+        cls, user_id: int, stays: Sequence[Tuple[int, date, date]]
+    ) -> Optional[List[SBooking]]:
+        """
+        Несколько броней (room_id, date_from, date_to) одной транзакцией:
+        либо все, либо ни одной.
+        """
+
+        async def add_once() -> Optional[List[SBooking]]:
+            new_bookings = await cls._add_group(user_id, stays)
+            for booking in new_bookings or []:
+                await cls._booking_changed(
+                    booking.id, booking.room_id, booking.date_from, booking.date_to, 1
                 )
+            return new_bookings
 
-                # print(get_rooms_left.compile(engine, compile_kwargs={"literal_binds": True}))
-
-                rooms_left = await session.execute(get_rooms_left)  # type: ignore
-                rooms_left: int = rooms_left.scalar()  # type: ignore
-
-                if rooms_left > 0:
-                    get_price = select(Rooms.price).filter_by(id=room_id)
-                    price = await session.execute(get_price)  # type: ignore
-                    price: int = price.scalar()  # type: ignore
-                    add_booking = (
-                        insert(Bookings)
-                        .values(
-                            room_id=room_id,
-                            user_id=user_id,
-                            date_from=date_from,
-                            date_to=date_to,
-                            price=price,
-                        )
-                        .returning(Bookings)
+        return await cls._retrying(add_once, {"user_id": user_id, "stays": len(stays)})
+
+    @classmethod
+    def coalescer(cls) -> Coalescer[BookingRequest, Optional[SBooking]]:
+        if cls._coalescer is None:
+            cls._coalescer = Coalescer(
+                "bookings",
+                cls.add_batch,
+                settings.BOOKING_BATCH_SIZE,
+                settings.BOOKING_BATCH_DELAY_MS / 1000,
+            )
+        return cls._coalescer
+
+    @classmethod
+    async def add_batch(
+        cls, requests: Sequence[BookingRequest]
+    ) -> List[Optional[SBooking]]:
+        """
+        Независимые брони (user_id, room_id, date_from, date_to) разных
+        пользователей одной транзакцией; каждая проходит или нет сама по себе.
+        """
+
+        async def add_once() -> List[Optional[SBooking]]:
+            new_bookings = await cls._add_batch(requests)
+            await asyncio.gather(
+                *(
+                    cls._booking_changed(
+                        booking.id,
+                        booking.room_id,
+                        booking.date_from,
+                        booking.date_to,
+                        1,
                     )
+                    for booking in new_bookings
+                    if booking
+                )
+            )
+            return new_bookings
 
-                    new_booking = await session.execute(add_booking)
-                    await session.commit()
-                    return new_booking.scalar()  # type: ignore
-                else:
-                    return None
-        except (SQLAlchemyError, Exception) as e:
-            msg = ""
-            if isinstance(e, SQLAlchemyError):
-                msg = "Database Exc"
-            elif isinstance(e, Exception):
-                msg = "Unknown Exc"
-            msg += ": Cannot add booking"
-            extra = {
+        return await cls._retrying(add_once, {"batch": len(requests)}) or [None] * len(
+            requests
+        )
+
+    @classmethod
+    async def _retrying(
+        cls, add_once: Callable[[], Awaitable[Optional[T]]], extra: Dict[str, Any]
+    ) -> Optional[T]:
+        for attempt in range(cls.MAX_RETRIES + 1):
+            try:
+                return await add_once()
+            except (SQLAlchemyError, Exception) as e:
+                retryable = (
+                    isinstance(e, DBAPIError)
+                    and getattr(e.orig, "pgcode", None) in cls.RETRYABLE_PGCODES
+                )
+                extra = {**extra, "attempt": attempt}
+                if retryable and attempt < cls.MAX_RETRIES:
+                    logger.warning(
+                        "Booking transaction conflict, retrying", extra=extra
+                    )
+                    await asyncio.sleep(
+                        cls.RETRY_BACKOFF * 2**attempt * (1 + random.random())
+                    )
+                    continue
+                msg = ""
+                if isinstance(e, SQLAlchemyError):
+                    msg = "Database Exc"
+                elif isinstance(e, Exception):
+                    msg = "Unknown Exc"
+                msg += ": Cannot add booking"
+                logger.error(msg, extra=extra, exc_info=True)
+                return None
+        return None
+
+    @classmethod
+    async def _add(
+        cls,
+        user_id: int,
+        room_id: int,
+        date_from: date,
+        date_to: date,
+        hold_id: Optional[str] = None,
+    ) -> Optional[SBooking]:
+        """
+        SELECT * FROM book_room(
+            1, 1, '2023-05-15', '2023-06-20', '[{"weekdays": 96, ...}]', '{0, 1, ...}'
+        )
+
+        Функция book_room (app/bookings/functions.py) под блокировкой строки номера
+        проверяет остаток за вычетом удержаний ночей, считает стоимость по правилам
+        цен (передаются параметром из кэша PricingService) и загрузке ночей и
+        вставляет бронь вместе с журналом room_nights — цена и остаток читаются
+        под одной блокировкой, за один запрос к БД. Фиксируется бронь сразу,
+        вместе со всем, что запрос уже изменил в своей сессии (см. unit_of_work).
+        """
+        rules = await PricingService.rules_param()
+        held = await hold_store.held_nights(
+            RoomNightsService.demand([(room_id, date_from, date_to)]), hold_id
+        )
+
+        async with session_scope() as session:
+            params = {
                 "user_id": user_id,
                 "room_id": room_id,
                 "date_from": date_from,
                 "date_to": date_to,
+                "rules": rules,
+                "held": list(held.values()),
             }
-            logger.error(msg, extra=extra, exc_info=True)
+            new_booking = (
+                await session.execute(BOOK_ROOM, params)
+            ).scalar_one_or_none()
+            await session.commit()
+            return new_booking  # type: ignore
+
+    @classmethod
+    async def _add_group(
+        cls, user_id: int, stays: Sequence[Tuple[int, date, date]]
+    ) -> Optional[List[SBooking]]:
+        """
+        SELECT * FROM rooms WHERE id IN (1, 2) ORDER BY id FOR UPDATE;
+        SELECT room_id, night, booked_count FROM room_nights WHERE ...;
+        INSERT INTO room_nights ... ON CONFLICT (room_id, night) DO UPDATE ...;
+        INSERT INTO bookings (...) VALUES (...), (...) RETURNING *
+
+        Остаток проверяется сразу по всем ночам группы, за вычетом удержаний,
+        с учетом того, что несколько броней группы могут занимать один и тот же номер.
+        Стоимость, как и в book_room, считается под блокировкой номеров по загрузке
+        ночей до брони: каждая бронь группы видит предыдущие.
+        """
+        demand = RoomNightsService.demand(stays)
+        held = await hold_store.held_nights(demand)
+        rules = await PricingService.rules()
+
+        async with session_scope() as session:
+            rooms = await cls._lock_rooms(session, {room_id for room_id, _, _ in stays})
+            booked = Counter(await RoomNightsService.booked_nights(session, demand))
+            for (room_id, night), count in demand.items():
+                taken = booked[(room_id, night)] + held[(room_id, night)]
+                if room_id not in rooms or rooms[room_id].quantity - taken < count:
+                    # Снимаем блокировки номеров сразу, не дожидаясь конца запроса
+                    await session.rollback()
+                    return None
+
+            totals = []
+            for room_id, date_from, date_to in stays:
+                totals.append(
+                    PricingService.stay_total(
+                        rooms[room_id], date_from, date_to, rules, booked
+                    )
+                )
+                booked.update(
+                    (room_id, night)
+                    for night in RoomNightsService.nights(date_from, date_to)
+                )
+
+            await RoomNightsService.book_nights(session, demand)
+            new_bookings = await cls._insert_bookings(
+                session, [(user_id, *stay) for stay in stays], rooms, totals
+            )
+            await session.commit()
+        return new_bookings
+
+    @classmethod
+    async def _add_batch(
+        cls, requests: Sequence[BookingRequest]
+    ) -> List[Optional[SBooking]]:
+        """
+        То же, что _add_group, но брони независимы: проходят в порядке
+        поступления, пока в номере остаются свободные ночи, и каждая стоит
+        столько же, сколько стоила бы, пройдя одна через book_room.
+        """
+        stays = [
+            (room_id, date_from, date_to) for _, room_id, date_from, date_to in requests
+        ]
+        demand = RoomNightsService.demand(stays)
+        held = await hold_store.held_nights(demand)
+        rules = await PricingService.rules()
+
+        async with session_scope() as session:
+            rooms = await cls._lock_rooms(session, {room_id for room_id, _, _ in stays})
+            booked = Counter(await RoomNightsService.booked_nights(session, demand))
+            taken = booked + Counter(held)
+            admitted, totals = [], []
+            for i, (room_id, date_from, date_to) in enumerate(stays):
+                if room_id not in rooms:
+                    continue
+                nights = [
+                    (room_id, night)
+                    for night in RoomNightsService.nights(date_from, date_to)
+                ]
+                if all(rooms[room_id].quantity - taken[night] > 0 for night in nights):
+                    totals.append(
+                        PricingService.stay_total(
+                            rooms[room_id], date_from, date_to, rules, booked
+                        )
+                    )
+                    taken.update(nights)
+                    booked.update(nights)
+                    admitted.append(i)
+            if not admitted:
+                await session.rollback()
+                return [None] * len(requests)
+
+            await RoomNightsService.book_nights(
+                session, RoomNightsService.demand([stays[i] for i in admitted])
+            )
+            new_bookings = await cls._insert_bookings(
+                session, [requests[i] for i in admitted], rooms, totals
+            )
+            await session.commit()
+
+        result: List[Optional[SBooking]] = [None] * len(requests)
+        for i, booking in zip(admitted, new_bookings):
+            result[i] = booking
+        return result
+
+    @staticmethod
+    async def _lock_rooms(
+        session: AsyncSession, room_ids: Iterable[int]
+    ) -> Dict[int, Row]:
+        """
+        Строки номеров блокируются в порядке id, как и в book_room, поэтому
+        одиночные брони и пачки броней одного номера идут друг за другом.
+        """
+        query = select(Rooms.id, Rooms.hotel_id, Rooms.quantity, Rooms.price).where(
+            Rooms.id.in_(set(room_ids))
+        )
+        result = await session.execute(query.order_by(Rooms.id).with_for_update())
+        return {room.id: room for room in result.all()}
+
+    @staticmethod
+    async def _insert_bookings(
+        session: AsyncSession,
+        requests: Sequence[BookingRequest],
+        rooms: Dict[int, Row],
+        totals: Sequence[int],
+    ) -> List[SBooking]:
+        """
+        Один многострочный INSERT ... RETURNING; брони возвращаются в порядке
+        requests.
+        """
+        add_bookings = insert(Bookings).values(
+            [
+                {
+                    "user_id": user_id,
+                    "room_id": room_id,
+                    "date_from": date_from,
+                    "date_to": date_to,
+                    "price": rooms[room_id].price,
+                    "total_cost": total_cost,
+                }
+                for (user_id, room_id, date_from, date_to), total_cost in zip(
+                    requests, totals
+                )
+            ]
+        )
+        result = await session.execute(add_bookings.returning(Bookings))
+        return [SBooking.model_validate(booking) for booking in result.scalars().all()]
+
+    @staticmethod
+    def user_bookings_query(user_id: int) -> Select:
+        return (
+            select(
+                Bookings, Rooms.image_id, Rooms.name, Rooms.description, Rooms.services
+            )
+            .join(Rooms, Rooms.id == Bookings.room_id)
+            .where(Bookings.user_id == user_id)
+        )
+
+    @staticmethod
+    def booking_info(row: Row) -> SBookingInfo:
+        return SBookingInfo(
+            **SBooking.model_validate(row.Bookings).model_dump(),
+            image_id=row.image_id,
+            name=row.name,
+            description=row.description,
+            services=row.services,
+        )
+
+    @classmethod
+    async def user_bookings_page(
+        cls,
+        user_id: int,
+        order: SortOrder = "desc",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> Tuple[List[SBookingInfo], Optional[str]]:
+        """
+        Страница истории броней по ключу (date_from, id), по индексу
+        ix_bookings_user_id_date_from:
+
+        ... WHERE bookings.user_id = 3
+        AND (bookings.date_from, bookings.id) < ('2030-05-01', 120)
+        ORDER BY bookings.date_from DESC, bookings.id DESC LIMIT 21
+        """
+        after = decode_cursor(cursor, "date_from", order, (date, int))
+        query = keyset(
+            cls.user_bookings_query(user_id),
+            [Bookings.date_from, Bookings.id],
+            after,
+            order,
+            limit,
+        )
+        async with session_scope(read_only=True) as session:
+            result = await session.execute(query)
+            bookings = [cls.booking_info(row) for row in result.all()]
+        return page(
+            bookings,
+            lambda booking: (booking.date_from, booking.id),
+            "date_from",
+            order,
+            limit,
+        )
+
+    @classmethod
+    async def stream_user_bookings(cls, user_id: int) -> AsyncIterator[SBookingInfo]:
+        """
+        Вся история броней через серверный курсор: строки приходят из БД
+        пачками по STREAM_BATCH и сразу отдаются, в памяти — одна пачка.
+        """
+        query = cls.user_bookings_query(user_id).order_by(
+            Bookings.date_from.desc(), Bookings.id.desc()
+        )
+        # Ответ дочитывается уже после того, как сессия запроса закрыта,
+        # поэтому session_scope откроет свою сессию, на реплике, если она есть
+        async with session_scope(read_only=True) as session:
+            result = await session.stream(
+                query.execution_options(yield_per=cls.STREAM_BATCH)
+            )
+            async for row in result:
+                yield cls.booking_info(row)
+
+    @classmethod
+    def find_all_query(
+        cls,
+        user_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> Select:
+        query = select(cls.model)
+        if user_id:
+            query = query.filter(cls.model.user_id == user_id)
+        if room_id:
+            query = query.filter(cls.model.room_id == room_id)
+        if date_from:
+            # Следует из date_from >= :date_from, но только условие на date_to
+            # отсекает секции с более ранними выездами
+            query = query.filter(
+                cls.model.date_from >= date_from, cls.model.date_to > date_from
+            )
+        if date_to:
+            query = query.filter(cls.model.date_to <= date_to)
+        return query
 
     @classmethod
     async def find_all(
         cls,
-        session: AsyncSession,
         user_id: Optional[int] = None,
         room_id: Optional[int] = None,
         date_from: Optional[date] = None,
         date_to: Optional[date] = None,
     ) -> List[SBooking]:
-        async with async_session_maker() as session:
-            query = select(cls.model)
-            if user_id:
-                query = query.filter(cls.model.user_id == user_id)
-            if room_id:
-                query = query.filter(cls.model.room_id == room_id)
-            if date_from:
-                query = query.filter(cls.model.date_from >= date_from)
-            if date_to:
-                query = query.filter(cls.model.date_to <= date_to)
-            result = await session.execute(query)
+        async with session_scope(read_only=True) as session:
+            result = await session.execute(
+                cls.find_all_query(user_id, room_id, date_from, date_to)
+            )
             return [SBooking.model_validate(booking) for booking in result.scalars().all()]
 
     @classmethod
     async def delete(cls, booking_id: int) -> bool:
-        async with async_session_maker() as session:
-            query = delete(cls.model).where(cls.model.id == booking_id)
+        async with session_scope() as session:
+            query = (
+                delete(cls.model)
+                .where(cls.model.id == booking_id)
+                .returning(cls.model.room_id, cls.model.date_from, cls.model.date_to)
+            )
             result = await session.execute(query)
+            deleted = result.one_or_none()
+            if not deleted:
+                return False
+            await RoomNightsService.release(
+                session, deleted.room_id, deleted.date_from, deleted.date_to
+            )
             await session.commit()
-            return result.rowcount > 0
+        await cls._booking_changed(
+            booking_id, deleted.room_id, deleted.date_from, deleted.date_to, -1
+        )
+        return True
+
+    @classmethod
+    async def _booking_changed(
+        cls, booking_id: int, room_id: int, date_from: date, date_to: date, delta: int
+    ) -> None:
+        """
+        Оповещение после фиксации брони или ее удаления: движок доступности
+        и кэш поиска.
+        """
+        stick_to_primary()
+        await availability_engine.publish(
+            booking_id, room_id, date_from, date_to, delta
+        )
+        hotel_id = await RoomService.hotel_id_of(room_id)
+        if hotel_id is not None:
+            await search_cache.invalidate(
+                *tags.hotel_dates(hotel_id, date_from, date_to)
+            )
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from redis import asyncio as aioredis
+
+from app.logger import logger
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Broadcaster:
+    """
+    Рассылка событий между воркерами gunicorn через Redis pub/sub.
+
+    Каждый воркер подписывается на нужные каналы при старте приложения;
+    publish доставляет сообщение всем воркерам, включая отправителя.
+    До start (celery, скрипты, тесты без lifespan) publish ничего не делает.
+    """
+
+    # Пауза перед переподпиской, секунды: удваивается до MAX_RECONNECT_DELAY
+    RECONNECT_DELAY = 1
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self) -> None:
+        self._redis: Optional[aioredis.Redis] = None
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        if handler not in self._handlers[channel]:
+            self._handlers[channel].append(handler)
+
+    async def start(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        if not self._handlers:
+            return
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(*self._handlers)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._redis = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(channel, json.dumps(message, default=str))
+        except Exception:
+            logger.error(
+                "Cannot publish broadcast message",
+                extra={"channel": channel},
+                exc_info=True,
+            )
+
+    async def _listen(self, pubsub) -> None:
+        """
+        Слушает каналы, пока задачу не отменит stop. Потеряв соединение с Redis,
+        переподписывается с растущей паузой; сообщения, опубликованные без
+        подписки, до воркера не доходят.
+        """
+        delay = self.RECONNECT_DELAY
+        while True:
+            try:
+                async with pubsub:
+                    if not pubsub.subscribed:
+                        await pubsub.subscribe(*self._handlers)
+                        logger.warning("Broadcast listener resubscribed")
+                    delay = self.RECONNECT_DELAY
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            await self._dispatch(message)
+            except Exception:
+                logger.error(
+                    "Broadcast listener lost connection",
+                    extra={"retry_in": delay},
+                    exc_info=True,
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+            pubsub = self._redis.pubsub()
+
+    async def _dispatch(self, message: Dict[str, Any]) -> None:
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        payload = json.loads(message["data"])
+        for handler in self._handlers[channel]:
+            try:
+                await handler(payload)
+            except Exception:
+                logger.error(
+                    "Broadcast handler failed",
+                    extra={"channel": channel},
+                    exc_info=True,
+                )
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,332 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from prometheus_client import Counter
+from redis import asyncio as aioredis
+
+from app.broadcast import broadcaster
+from app.logger import logger
+
+CACHE_HITS = Counter("cache_hits_total", "Попадания в кэш", ["cache", "tier"])
+CACHE_MISSES = Counter("cache_misses_total", "Промахи кэша", ["cache"])
+CACHE_STALE = Counter(
+    "cache_stale_total", "Отдано устаревших записей на время обновления", ["cache"]
+)
+CACHE_COALESCED = Counter(
+    "cache_coalesced_total", "Промахи, дождавшиеся чужого вычисления", ["cache"]
+)
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total", "Сброшенные теги кэша", ["cache"]
+)
+
+# Одним вызовом: следующее значение логических часов кэша и отметка им всех тегов
+INVALIDATE_SCRIPT = """
+local stamp = redis.call('INCR', KEYS[1])
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], stamp)
+end
+return stamp
+"""
+
+# Снимаем блокировку, только если она все еще наша
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_tags: ContextVar[Optional[Set[str]]] = ContextVar("cache_tags", default=None)
+
+
+def tag(*tags: str) -> None:
+    """Пометить тегами результат, который сейчас вычисляет функция под @cached."""
+    collected = _tags.get()
+    if collected is not None:
+        collected.update(tags)
+
+
+@dataclass
+class Entry:
+    value: Any
+    tags: List[str]
+    stamp: int
+    fresh_until: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+
+class TaggedCache:
+    """
+    Двухуровневый кэш с инвалидацией по тегам: LRU в памяти воркера перед Redis.
+
+    В Redis хранятся логические часы кэша (счетчик). Перед вычислением
+    записи берется отметка часов; invalidate отмечает теги следующим значением
+    часов. Запись действительна, только если все ее теги сброшены раньше,
+    чем началось ее вычисление, поэтому запись, посчитанная параллельно
+    с изменением данных, сразу считается устаревшей.
+
+    Сброс тегов рассылается воркерам через Redis pub/sub, и каждый сверяет
+    с этими отметками свой LRU без обращений к Redis.
+
+    Одновременные промахи по одному ключу вычисляются один раз: в воркере —
+    общей задачей, между воркерами — блокировкой в Redis, остальные ждут
+    появления записи. Запись с истекшим сроком, но не сброшенная тегами,
+    еще stale секунд отдается сразу, а обновляется в фоне.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_local: int = 1024,
+        local_ttl: int = 60,
+        stale: int = 30,
+        lock_timeout: float = 10,
+    ) -> None:
+        self.name = name
+        self.max_local = max_local
+        self.local_ttl = local_ttl
+        self.stale = stale
+        self.lock_timeout = lock_timeout
+        self._redis: Optional[aioredis.Redis] = None
+        self._invalidate = None
+        self._unlock = None
+        self._local: "OrderedDict[str, Entry]" = OrderedDict()
+        self._local_stamps: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    def init(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        self._invalidate = redis.register_script(INVALIDATE_SCRIPT)
+        self._unlock = redis.register_script(UNLOCK_SCRIPT)
+        self._local.clear()
+        self._local_stamps.clear()
+        broadcaster.subscribe(self._channel, self._on_invalidate)
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    @property
+    def _channel(self) -> str:
+        return f"cache:{self.name}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.name}:tag:{tag}"
+
+    async def stamp(self) -> int:
+        return await self._redis.incr(f"{self.name}:clock")  # type: ignore
+
+    def _get_local(self, key: str) -> Optional[Entry]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if not all(self._local_stamps.get(tag, 0) < entry.stamp for tag in entry.tags):
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, entry: Entry) -> None:
+        local = Entry(
+            entry.value,
+            entry.tags,
+            entry.stamp,
+            min(entry.fresh_until, time.time() + self.local_ttl),
+        )
+        self._local[key] = local
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+    async def _get_remote(self, key: str) -> Optional[Entry]:
+        raw = await self._redis.get(f"{self.name}:{key}")  # type: ignore
+        if raw is None:
+            return None
+        entry = Entry(**json.loads(raw))
+        if entry.tags:
+            stamps = await self._redis.mget(  # type: ignore
+                [self._tag_key(tag) for tag in entry.tags]
+            )
+            if not all(int(stamp or 0) < entry.stamp for stamp in stamps):
+                return None
+        return entry
+
+    async def get(self, key: str) -> Optional[Entry]:
+        if self._redis is None:
+            return None
+        entry = self._get_local(key)
+        if entry is not None and entry.fresh:
+            CACHE_HITS.labels(self.name, "local").inc()
+            return entry
+        entry = await self._get_remote(key)
+        if entry is None:
+            CACHE_MISSES.labels(self.name).inc()
+            return None
+        self._set_local(key, entry)
+        CACHE_HITS.labels(self.name, "redis").inc()
+        return entry
+
+    async def set(
+        self, key: str, value: Any, expire: int, tags: Iterable[str], stamp: int
+    ) -> None:
+        if self._redis is None:
+            return
+        entry = Entry(value, sorted(tags), stamp, time.time() + expire)
+        raw = json.dumps(entry.__dict__, default=str)
+        await self._redis.set(f"{self.name}:{key}", raw, ex=expire + self.stale)
+        if all(self._local_stamps.get(tag, 0) < stamp for tag in entry.tags):
+            self._set_local(key, entry)
+
+    async def invalidate(self, *tags: str) -> None:
+        if self._redis is None or not tags:
+            return
+        try:
+            keys = [f"{self.name}:clock", *(self._tag_key(tag) for tag in tags)]
+            stamp = await self._invalidate(keys=keys)  # type: ignore
+            CACHE_INVALIDATIONS.labels(self.name).inc(len(tags))
+            await self._on_invalidate({"tags": list(tags), "stamp": stamp})
+            await broadcaster.publish(
+                self._channel, {"tags": list(tags), "stamp": stamp}
+            )
+        except Exception:
+            logger.error(
+                "Cannot invalidate cache tags",
+                extra={"cache": self.name, "tags": tags},
+                exc_info=True,
+            )
+
+    async def _on_invalidate(self, message: Dict[str, Any]) -> None:
+        stamp = int(message["stamp"])
+        for tag in message["tags"]:
+            if self._local_stamps.get(tag, 0) < stamp:
+                self._local_stamps[tag] = stamp
+
+    def key(self, func: Callable, kwargs: dict) -> str:
+        params = {
+            name: value
+            for name, value in kwargs.items()
+            if isinstance(value, (str, int, float, bool, date))
+        }
+        digest = hashlib.md5(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return f"{func.__module__}.{func.__name__}:{digest}"
+
+    async def single_flight(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            # Вычисление общее для нескольких запросов и переживает первый из них,
+            # поэтому идет в пустом контексте: со своей сессией БД, а не сессией
+            # запроса, которую unit_of_work закроет после ответа
+            future = asyncio.get_running_loop().create_task(
+                self._compute_locked(key, compute), context=contextvars.Context()
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            CACHE_COALESCED.labels(self.name).inc()
+        return await asyncio.shield(future)
+
+    async def _compute_locked(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        lock_key = f"{self.name}:lock:{key}"
+        token = uuid.uuid4().hex
+        locked = await self._redis.set(  # type: ignore
+            lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+        )
+        if not locked:
+            # Значение уже считает другой воркер — ждем его записи
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                entry = await self._get_remote(key)
+                if entry is not None and entry.fresh:
+                    CACHE_COALESCED.labels(self.name).inc()
+                    self._set_local(key, entry)
+                    return entry.value
+        try:
+            return await compute()
+        finally:
+            if locked:
+                await self._unlock(keys=[lock_key], args=[token])  # type: ignore
+
+    def revalidate(self, key: str, compute: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._inflight:
+            return
+        CACHE_STALE.labels(self.name).inc()
+
+        async def refresh():
+            try:
+                await self.single_flight(key, compute)
+            except Exception:
+                logger.error(
+                    "Cache revalidation failed",
+                    extra={"cache": self.name, "key": key},
+                    exc_info=True,
+                )
+
+        # Обновление завершается уже после ответа: контекст запроса ему не передается
+        task = asyncio.get_running_loop().create_task(
+            refresh(), context=contextvars.Context()
+        )
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+
+def cached(cache: TaggedCache, expire: int):
+    """
+    Кэширует результат эндпоинта в TaggedCache.
+
+    Функция помечает результат тегами через tag(...); ключ строится из
+    простых аргументов вызова (str, int, date, ...).
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not cache.enabled:
+                return await func(*args, **kwargs)
+
+            key = cache.key(func, kwargs)
+
+            async def compute():
+                stamp = await cache.stamp()
+                token = _tags.set(set())
+                try:
+                    value = await func(*args, **kwargs)
+                    tags = _tags.get() or set()
+                finally:
+                    _tags.reset(token)
+                await cache.set(key, value, expire, tags, stamp)
+                return value
+
+            entry = await cache.get(key)
+            if entry is not None:
+                if not entry.fresh:
+                    cache.revalidate(key, compute)
+                return entry.value
+            return await cache.single_flight(key, compute)
+
+        return wrapper
+
+    return decorator
+
+
+search_cache = TaggedCache("search")
@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+from typing import List
+
+# Состав каталога: появился новый отель или поменялся адрес существующего
+HOTELS = "hotels"
+
+# Цены номеров по правилам rate_rules: правило без отеля и номера меняет их везде
+PRICES = "prices"
+
+
+def hotel(hotel_id: int) -> str:
+    """Отель и его номера целиком: описание, цены, количество номеров."""
+    return f"hotel:{hotel_id}"
+
+
+def hotel_dates(hotel_id: int, date_from: date, date_to: date) -> List[str]:
+    """
+    Занятость номеров отеля по месяцам, которые задевают ночи
+    date_from ... date_to - 1.
+    """
+    last_night = date_to - timedelta(days=1)
+    month = date_from.replace(day=1)
+    tags = []
+    while month <= last_night:
+        tags.append(f"hotel:{hotel_id}:{month:%Y-%m}")
+        month = (month + timedelta(days=32)).replace(day=1)
+    return tags
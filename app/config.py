@@ -27,12 +27,70 @@ class Settings(BaseSettings):
     def TEST_DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.TEST_DB_USER}:{self.TEST_DB_PASS}@{self.TEST_DB_HOST}:{self.TEST_DB_PORT}/{self.TEST_DB_NAME}"
 
+    REPLICA_DB_HOST: Optional[str] = None
+    REPLICA_DB_PORT: Optional[str] = None
+    REPLICA_DB_NAME: Optional[str] = None
+
+    @property
+    def REPLICA_DATABASE_URL(self) -> Optional[str]:
+        if not self.REPLICA_DB_HOST:
+            return None
+        port, name = (
+            self.REPLICA_DB_PORT or self.DB_PORT,
+            self.REPLICA_DB_NAME or self.DB_NAME,
+        )
+        return (
+            f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}"
+            f"@{self.REPLICA_DB_HOST}:{port}/{name}"
+        )
+
+    TEST_REPLICA_DB_HOST: Optional[str] = None
+    TEST_REPLICA_DB_PORT: Optional[str] = None
+    TEST_REPLICA_DB_NAME: Optional[str] = None
+
+    @property
+    def TEST_REPLICA_DATABASE_URL(self) -> Optional[str]:
+        if not self.TEST_REPLICA_DB_HOST:
+            return None
+        port, name = (
+            self.TEST_REPLICA_DB_PORT or self.TEST_DB_PORT,
+            self.TEST_REPLICA_DB_NAME or self.TEST_DB_NAME,
+        )
+        return (
+            f"postgresql+asyncpg://{self.TEST_DB_USER}:{self.TEST_DB_PASS}"
+            f"@{self.TEST_REPLICA_DB_HOST}:{port}/{name}"
+        )
+
+    REPLICA_STICKY_SECONDS: int = 5
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
     SECRET_KEY: str
     ALGORITHM: str
 
     REDIS_HOST: str
     REDIS_PORT: int
 
+    AVAILABILITY_ENGINE_ENABLED: bool = False
+    AVAILABILITY_RESYNC_SECONDS: int = 300
+
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.5
+
+    PRICING_RULES_TTL: int = 60
+
+    BOOKING_HOLD_SECONDS: int = 600
+    BOOKING_COALESCE: bool = False
+    BOOKING_BATCH_SIZE: int = 100
+    BOOKING_BATCH_DELAY_MS: float = 5
+
+    BOOKINGS_PARTITIONS_AHEAD: int = 12
+    BOOKINGS_RETENTION_MONTHS: int = 24
+
     SMTP_HOST: str
     SMTP_PORT: int
     SMTP_USER: str
@@ -1,21 +1,245 @@
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge, Histogram
 from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.config import settings
 
+POOL_SIZE = Gauge("db_pool_size", "Постоянные соединения пула (DB_POOL_SIZE)", ["db"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Соединения, выданные из пула", ["db"])
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Открытые соединения сверх DB_POOL_SIZE", ["db"]
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Ожидание соединения из пула, включая открытие нового и pre-ping",
+    ["db"],
+    buckets=(
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+    ),
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Соединение не выдано за DB_POOL_TIMEOUT", ["db"]
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул, который отдает время ожидания соединения в Prometheus;
+    метка db — pool_logging_name.
+    """
+
+    def connect(self):
+        db = self.logging_name or "primary"
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.labels(db).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(db).observe(time.perf_counter() - start)
+
+
+# Пул свой у каждого воркера (docker/app.sh), поэтому с запасом должно выполняться
+# воркеры * (DB_POOL_SIZE + DB_MAX_OVERFLOW) < max_connections Postgres
 if settings.MODE == "TEST":
     DATABASE_URL = settings.TEST_DATABASE_URL
+    REPLICA_DATABASE_URL = settings.TEST_REPLICA_DATABASE_URL
     DATABASE_PARAMS = {"poolclass": NullPool}
 else:
     DATABASE_URL = settings.DATABASE_URL
-    DATABASE_PARAMS = {}
+    REPLICA_DATABASE_URL = settings.REPLICA_DATABASE_URL
+    DATABASE_PARAMS = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
 
+def make_engine(url: str, db: str) -> AsyncEngine:
+    db_engine = create_async_engine(
+        url,
+        pool_logging_name=db,
+        # Кэш подготовленных запросов на соединение: свой у диалекта SQLAlchemy
+        # и у asyncpg.
+        # За pgbouncer в режиме transaction нужен 0
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+        **DATABASE_PARAMS,
+    )
+    # Значения снимаются при каждом запросе /metrics; engine.dispose() заменяет пул,
+    # поэтому он берется заново каждый раз
+    if isinstance(db_engine.pool, QueuePool):
+        POOL_SIZE.labels(db).set_function(lambda: db_engine.pool.size())
+        POOL_CHECKED_OUT.labels(db).set_function(lambda: db_engine.pool.checkedout())
+        POOL_OVERFLOW.labels(db).set_function(lambda: max(db_engine.pool.overflow(), 0))
+    return db_engine
 
-engine = create_async_engine(DATABASE_URL, **DATABASE_PARAMS)
 
+engine = make_engine(DATABASE_URL, "primary")
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Реплика только для чтения; без нее все идет в основную БД
+replica_engine: Optional[AsyncEngine] = None
+replica_session_maker: Optional[async_sessionmaker] = None
+if REPLICA_DATABASE_URL:
+    replica_engine = make_engine(REPLICA_DATABASE_URL, "replica")
+    replica_session_maker = async_sessionmaker(
+        replica_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+# Клиент недавно писал: его чтения идут в основную БД, пока реплика догоняет
+READ_PRIMARY_COOKIE = "read_primary"
+
+
+class RequestSessions:
+    """
+    Сессии одного запроса: основная и, если настроена, реплика.
+    Каждая берет соединение из пула при первом запросе к своей БД и держит
+    его до конца запроса: фиксации отдельных вызовов сервисов не возвращают
+    соединение в пул.
+    """
+
+    def __init__(self, response: Response, read_primary: bool) -> None:
+        self.response = response
+        self.read_primary = read_primary or replica_session_maker is None
+        self.primary: Optional[AsyncSession] = None
+        self.replica: Optional[AsyncSession] = None
+
+    async def session(self, read_only: bool) -> AsyncSession:
+        if not read_only or self.read_primary:
+            if self.primary is None:
+                self.primary = async_session_maker(bind=await engine.connect())
+            return self.primary
+        if self.replica is None:
+            self.replica = replica_session_maker(bind=await replica_engine.connect())
+        return self.replica
+
+    async def close(self) -> None:
+        for session in (self.primary, self.replica):
+            if session is not None:
+                await session.close()
+                await session.bind.close()
+
+
+# Сессии запроса, открытые unit_of_work; вне запроса — None
+request_sessions: ContextVar[Optional[RequestSessions]] = ContextVar(
+    "request_sessions", default=None
+)
+
+
+async def unit_of_work(
+    request: Request, response: Response
+) -> AsyncIterator[RequestSessions]:
+    """
+    Зависимость приложения: сервисы всего запроса работают в одной сессии
+    на одном соединении из пула, которое держится до конца запроса.
+
+    Фиксирует каждый пишущий вызов сервиса сам, до своих оповещений (движок
+    доступности, кэш поиска): они должны видеть уже зафиксированную запись.
+    Так фиксируется и все, что запрос изменил в сессии до этого вызова.
+    Фиксация завершает транзакцию, но не отдает соединение: следующий вызов
+    начинает новую транзакцию на нем же.
+    После обработчика unit_of_work фиксирует только оставшееся (обычно
+    транзакцию чтений); ошибка обработчика откатывает его при закрытии сессии.
+
+    Соединение берется при первом запросе к БД, поэтому ответы из кэша
+    его не занимают.
+
+    Чтения (session_scope(read_only=True)) уходят на реплику только в GET и
+    HEAD: остальные методы читают то, что собираются менять.
+    """
+    read_primary = (
+        request.method not in ("GET", "HEAD") or READ_PRIMARY_COOKIE in request.cookies
+    )
+    sessions = RequestSessions(response, read_primary)
+    token = request_sessions.set(sessions)
+    try:
+        yield sessions
+        if sessions.primary is not None and sessions.primary.in_transaction():
+            await sessions.primary.commit()
+    finally:
+        request_sessions.reset(token)
+        await sessions.close()
+
+
+def stick_to_primary() -> None:
+    """
+    Вызывается после записи: еще REPLICA_STICKY_SECONDS чтения этого клиента
+    идут в основную БД, и он видит свою запись, даже если реплика отстает.
+    """
+    sessions = request_sessions.get()
+    if sessions is None or replica_session_maker is None:
+        return
+    sessions.read_primary = True
+    sessions.response.set_cookie(
+        READ_PRIMARY_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True
+    )
+
+
+@asynccontextmanager
+async def session_scope(read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия текущего запроса, а вне запроса (celery, фоновые задачи,
+    админка, вычисления кэша поиска) — отдельная сессия. read_only=True
+    разрешает читать с реплики: в запросе — если он ее допускает
+    (unit_of_work), вне запроса — если реплика настроена.
+
+    В сессии запроса блок ведет себя как отдельная сессия: после него
+    объекты отсоединяются, а ошибка откатывает транзакцию, чтобы следующий
+    блок (например, повтор брони) начал новую. Пишущие блоки фиксируются
+    до выхода, поэтому откат не задевает записи предыдущих вызовов.
+    """
+    sessions = request_sessions.get()
+    if sessions is None:
+        session_maker = async_session_maker
+        if read_only and replica_session_maker is not None:
+            session_maker = replica_session_maker
+        async with session_maker() as session:
+            yield session
+        return
+    session = await sessions.session(read_only)
+    try:
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        session.expunge_all()
+
 
 class Base(DeclarativeBase):
     pass
@@ -43,11 +43,38 @@ class RoomCannotBeBookedException(BookingException):
     detail = "Не осталось свободных номеров"
 
 
+class HoldNotFoundException(BookingException):
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = "Удержание не найдено или истекло"
+
+
 class InvalidDateException(BookingException):
     status_code = status.HTTP_400_BAD_REQUEST
     detail = "Дата выезда должна быть позже даты заезда"
 
 
+class LimitExceededException(BookingException):
+    """detail — шаблон: предел подставляет тот, кто его проверяет"""
+
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, limit: int):
+        self.detail = self.detail.format(limit=limit)
+        super().__init__()
+
+
+class DateRangeTooLongException(LimitExceededException):
+    detail = "Диапазон дат не может быть длиннее {limit} дней"
+
+
+class TooManyHotelsException(LimitExceededException):
+    detail = "Не больше {limit} отелей за запрос"
+
+
+class TooManyStaysException(LimitExceededException):
+    detail = "Не больше {limit} номеров в одной брони"
+
+
 class HotelNotFoundException(BookingException):
     status_code = status.HTTP_404_NOT_FOUND
     detail = "Отель не найден"
@@ -56,3 +83,18 @@ class HotelNotFoundException(BookingException):
 class BookingNotFoundException(BookingException):
     status_code = status.HTTP_404_NOT_FOUND
     detail = "Бронирование не найдено"
+
+
+class InvalidCursorException(BookingException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Неверный курсор страницы"
+
+
+class IdempotencyKeyReusedException(BookingException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = "Idempotency-Key уже использован с другими параметрами"
+
+
+class IdempotencyKeyInProgressException(BookingException):
+    status_code = status.HTTP_409_CONFLICT
+    detail = "Запрос с этим Idempotency-Key еще выполняется"
@@ -1,4 +1,4 @@
-from sqlalchemy import JSON, Column, Integer, String
+from sqlalchemy import DDL, JSON, Column, Index, Integer, String, event
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -6,6 +6,21 @@ from app.database import Base
 
 class Hotels(Base):
     __tablename__ = "hotels"
+    __table_args__ = (
+        Index(
+            "ix_hotels_location_trgm",
+            "location",
+            postgresql_using="gin",
+            postgresql_ops={"location": "gin_trgm_ops"},
+        ),
+        Index("ix_hotels_name_id", "name", "id"),
+        Index(
+            "ix_hotels_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -18,3 +33,9 @@ class Hotels(Base):
 
     def __str__(self):
         return f"Отель: {self.name} {self.location[:30]}"
+
+
+# Для create_all (тесты): триграммные индексы требуют расширения pg_trgm
+event.listen(
+    Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import JSON, Column, ForeignKey, Integer, String
+from sqlalchemy import JSON, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -6,6 +6,10 @@ from app.database import Base
 
 class Rooms(Base):
     __tablename__ = "rooms"
+    __table_args__ = (
+        Index("ix_rooms_hotel_id_price", "hotel_id", "price", "id"),
+        Index("ix_rooms_hotel_id_name", "hotel_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     hotel_id = Column(ForeignKey("hotels.id"), nullable=False)
@@ -1,14 +1,27 @@
 from datetime import date
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Query
-from sqlalchemy import func, select
+from fastapi_versioning import version
 
-from app.bookings.models import Bookings
-from app.database import async_session_maker
-from app.exceptions import InvalidDateException
-from app.hotels.rooms.models import Rooms
-from app.hotels.rooms.schemas import SRoom
+from app.bookings.holds.store import hold_store
+from app.cache import tags
+from app.cache.tagged import cached, search_cache, tag
+from app.exceptions import (
+    DateRangeTooLongException,
+    InvalidDateException,
+    TooManyHotelsException,
+)
+from app.hotels.rooms.schemas import (
+    SCalendar,
+    SFlexibleStay,
+    SHotelRooms,
+    SRoom,
+    SRoomSearch,
+)
+from app.hotels.rooms.service import RoomService, RoomSort
+from app.pricing.service import PricingService
+from app.service.pagination import SortOrder, SPage
 
 router = APIRouter(
     prefix="/hotels",
@@ -16,6 +29,46 @@ router = APIRouter(
 )
 
 
+@router.get("/rooms/batch")
+async def get_rooms_batch(
+    hotel_ids: List[int] = Query(
+        ..., alias="hotel_id", description="ID отелей, параметр повторяется"
+    ),
+    date_from: date = Query(..., description="Дата заезда (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Дата выезда (YYYY-MM-DD)"),
+) -> List[SHotelRooms]:
+    """
+    Номера сразу для страницы результатов поиска: один запрос вместо
+    запроса на каждый отель.
+    """
+    if (date_to - date_from).days <= 0:
+        raise InvalidDateException
+    hotel_ids = list(dict.fromkeys(hotel_ids))
+    if len(hotel_ids) > RoomService.MAX_BATCH_HOTELS:
+        raise TooManyHotelsException(RoomService.MAX_BATCH_HOTELS)
+
+    hotels = await RoomService.find_available_batch(hotel_ids, date_from, date_to)
+    all_rooms = [room for rooms in hotels.values() for room, _ in rooms]
+    totals = await PricingService.quote(all_rooms, date_from, date_to)
+    held = await hold_store.held_rooms(
+        [room.id for room in all_rooms], date_from, date_to
+    )
+    return [
+        SHotelRooms(
+            hotel_id=hotel_id,
+            rooms=[
+                SRoomSearch(
+                    **SRoom.model_validate(room).model_dump(),
+                    rooms_left=max(rooms_left - held[room.id], 0),
+                    total_cost=totals[room.id],
+                )
+                for room, rooms_left in rooms
+            ],
+        )
+        for hotel_id, rooms in hotels.items()
+    ]
+
+
 @router.get("/{hotel_id}/rooms")
 async def get_rooms(
     hotel_id: int,
@@ -25,28 +78,108 @@ async def get_rooms(
     if (date_to - date_from).days <= 0:
         raise InvalidDateException
 
-    async with async_session_maker() as session:
-        booked_rooms = (
-            select(Bookings.room_id, func.count(Bookings.id).label("booked_count"))
-            .where(Bookings.date_from <= date_to, Bookings.date_to > date_from)
-            .group_by(Bookings.room_id)
-            .cte("booked_rooms")
-        )
+    rooms = await RoomService.find_available(hotel_id, date_from, date_to)
+    totals = await PricingService.quote([room for room, _ in rooms], date_from, date_to)
+    held = await hold_store.held_rooms(
+        [room.id for room, _ in rooms], date_from, date_to
+    )
+    return [
+        {
+            **SRoom.model_validate(room).model_dump(),
+            "rooms_left": max(rooms_left - held[room.id], 0),
+            "total_cost": totals[room.id],
+        }
+        for room, rooms_left in rooms
+    ]
 
-        query = (
-            select(Rooms, (Rooms.quantity - func.coalesce(booked_rooms.c.booked_count, 0)).label("rooms_left"))
-            .join(booked_rooms, booked_rooms.c.room_id == Rooms.id, isouter=True)
-            .where(Rooms.hotel_id == hotel_id)
-        )
 
-        result = await session.execute(query)
-        rooms = result.all()
-        total_days = (date_to - date_from).days
-        return [
+@router.get("/{hotel_id}/rooms")
+@version(2)
+async def get_rooms_page(
+    hotel_id: int,
+    date_from: date = Query(..., description="Дата заезда (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Дата выезда (YYYY-MM-DD)"),
+    sort: RoomSort = Query(
+        "price", description="Сортировка: цена, остаток или название"
+    ),
+    order: SortOrder = Query("asc"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(20, ge=1, le=100),
+) -> SPage[SRoomSearch]:
+    if (date_to - date_from).days <= 0:
+        raise InvalidDateException
+
+    rooms, next_cursor = await RoomService.find_available_page(
+        hotel_id, date_from, date_to, sort, order, cursor, limit
+    )
+    totals = await PricingService.quote([room for room, _ in rooms], date_from, date_to)
+    held = await hold_store.held_rooms(
+        [room.id for room, _ in rooms], date_from, date_to
+    )
+    return SPage(
+        items=[
+            SRoomSearch(
+                **SRoom.model_validate(room).model_dump(),
+                rooms_left=max(rooms_left - held[room.id], 0),
+                total_cost=totals[room.id],
+            )
+            for room, rooms_left in rooms
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{hotel_id}/calendar")
+@cached(search_cache, expire=3600)
+async def get_calendar(
+    hotel_id: int,
+    date_from: date = Query(..., alias="from", description="Первая ночь (YYYY-MM-DD)"),
+    date_to: date = Query(
+        ..., alias="to", description="Дата выезда после последней ночи (YYYY-MM-DD)"
+    ),
+) -> SCalendar:
+    days = (date_to - date_from).days
+    if days <= 0:
+        raise InvalidDateException
+    if days > RoomService.MAX_RANGE_DAYS:
+        raise DateRangeTooLongException(RoomService.MAX_RANGE_DAYS)
+
+    rooms = await RoomService.calendar(hotel_id, date_from, date_to)
+    tag(tags.hotel(hotel_id), *tags.hotel_dates(hotel_id, date_from, date_to))
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "rooms": [
             {
-                **SRoom.model_validate(room.Rooms).model_dump(),
-                "rooms_left": room.rooms_left,
-                "total_cost": room.Rooms.price * total_days,
+                "id": room.id,
+                "name": room.name,
+                "price": room.price,
+                "rooms_left": rooms_left,
             }
-            for room in rooms
-        ]
+            for room, rooms_left in rooms
+        ],
+    }
+
+
+@router.get("/{hotel_id}/rooms/flexible")
+@cached(search_cache, expire=3600)
+async def get_flexible_rooms(
+    hotel_id: int,
+    date_from: date = Query(..., description="Заезд не раньше (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Выезд не позже (YYYY-MM-DD)"),
+    nights: int = Query(..., ge=1, le=30, description="Сколько ночей"),
+    limit: int = Query(3, ge=1, le=10, description="Сколько вариантов заезда на номер"),
+) -> List[SFlexibleStay]:
+    days = (date_to - date_from).days
+    if days <= 0:
+        raise InvalidDateException
+    if days > RoomService.MAX_RANGE_DAYS:
+        raise DateRangeTooLongException(RoomService.MAX_RANGE_DAYS)
+
+    stays = await RoomService.find_flexible(hotel_id, date_from, date_to, nights, limit)
+    tag(
+        tags.PRICES,
+        tags.hotel(hotel_id),
+        *tags.hotel_dates(hotel_id, date_from, date_to),
+    )
+    return [stay.model_dump() for stay in stays]
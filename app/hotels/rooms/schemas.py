@@ -1,3 +1,4 @@
+from datetime import date
 from typing import List
 
 from pydantic import BaseModel
@@ -16,3 +17,37 @@ class SRoom(BaseModel):
     class Config:
         from_attributes = True
         arbitrary_types_allowed = True  # Для поддержки JSON
+
+
+class SRoomSearch(SRoom):
+    rooms_left: int
+    total_cost: int
+
+
+class SHotelRooms(BaseModel):
+    hotel_id: int
+    rooms: List[SRoomSearch]
+
+
+class SCalendarRoom(BaseModel):
+    id: int
+    name: str
+    price: int
+    # Остаток номеров по ночам начиная с date_from
+    rooms_left: List[int]
+
+
+class SCalendar(BaseModel):
+    date_from: date
+    date_to: date
+    rooms: List[SCalendarRoom]
+
+
+class SFlexibleStay(BaseModel):
+    hotel_id: int
+    room_id: int
+    date_from: date
+    date_to: date
+    total_cost: int
+    # Меньший из остатков по ночам заезда
+    rooms_left: int
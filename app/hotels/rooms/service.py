@@ -1,19 +1,414 @@
-from typing import List, Optional
+from datetime import date, timedelta
+from functools import cache
+from itertools import groupby, islice
+from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import (
+    Date,
+    Integer,
+    Row,
+    Select,
+    and_,
+    bindparam,
+    cast,
+    delete,
+    func,
+    insert,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session_maker
+from app.availability.engine import availability_engine
+from app.bookings.room_nights.models import RoomNights
+from app.bookings.room_nights.service import RoomNightsService
+from app.broadcast import broadcaster
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.database import session_scope, stick_to_primary
 from app.hotels.rooms.models import Rooms
-from app.hotels.rooms.schemas import SRoom
+from app.hotels.rooms.schemas import SFlexibleStay, SRoom
+from app.pricing.engine import window_totals
+from app.pricing.service import PricingService
 from app.service.base import BaseService
+from app.service.pagination import SortOrder, decode_cursor, keyset, keyset_rows, page
+
+RoomSort = Literal["name", "price", "rooms_left"]
+
+CHANNEL = "rooms"
+
+# Горячие запросы строятся один раз, значения передаются параметрами
+HOTEL_ROOMS = select(Rooms).where(
+    Rooms.hotel_id == bindparam("hotel_id", type_=Integer)
+)
 
 
 class RoomService(BaseService):
     model = Rooms
 
+    MAX_RANGE_DAYS = 90
+    MAX_BATCH_HOTELS = 50
+
+    # Отель номера для сброса кэша поиска после брони; копия своя у каждого
+    # воркера. Номер может перейти в другой отель или быть удален, поэтому
+    # изменение рассылается всем воркерам (forget_hotel_ids)
+    _hotel_ids: Dict[int, int] = {}
+
+    @classmethod
+    async def hotel_id_of(cls, room_id: int) -> Optional[int]:
+        if room_id not in cls._hotel_ids:
+            async with session_scope() as session:
+                result = await session.execute(
+                    select(Rooms.hotel_id).where(Rooms.id == room_id)
+                )
+                hotel_id = result.scalar_one_or_none()
+            if hotel_id is None:
+                return None
+            cls._hotel_ids[room_id] = hotel_id
+        return cls._hotel_ids[room_id]
+
+    @classmethod
+    async def forget_hotel_ids(cls, room_ids: Iterable[int]) -> None:
+        room_ids = list(room_ids)
+        if not room_ids:
+            return
+        for room_id in room_ids:
+            cls._hotel_ids.pop(room_id, None)
+        await broadcaster.publish(CHANNEL, {"room_ids": room_ids})
+
+    @classmethod
+    async def on_message(cls, message: Dict[str, Any]) -> None:
+        for room_id in message["room_ids"]:
+            cls._hotel_ids.pop(room_id, None)
+
+    @classmethod
+    def subscribe(cls) -> None:
+        broadcaster.subscribe(CHANNEL, cls.on_message)
+
+    @staticmethod
+    def available_query(hotel_id: int, date_from: date, date_to: date) -> Select:
+        """
+        SELECT rooms.*, rooms.quantity - (
+            SELECT COALESCE(MAX(room_nights.booked_count), 0) FROM room_nights
+            WHERE room_nights.room_id = rooms.id AND
+            room_nights.night >= '2023-05-15' AND room_nights.night < '2023-06-20'
+        ) AS rooms_left FROM rooms
+        WHERE rooms.hotel_id = 1
+        """
+        rooms_left = Rooms.quantity - RoomNightsService.booked_count(date_from, date_to)
+        return select(Rooms, rooms_left.label("rooms_left")).where(
+            Rooms.hotel_id == hotel_id
+        )
+
+    @classmethod
+    @cache
+    def available_template(cls) -> Select:
+        """
+        available_query, построенный один раз; hotel_id, date_from и date_to —
+        параметры.
+        """
+        return cls.available_query(
+            bindparam("hotel_id", type_=Integer),
+            bindparam("date_from", type_=Date),
+            bindparam("date_to", type_=Date),
+        )
+
+    @classmethod
+    async def find_available(
+        cls, hotel_id: int, date_from: date, date_to: date
+    ) -> List[Tuple[Rooms, int]]:
+        async with session_scope(read_only=True) as session:
+            if availability_engine.ready:
+                # Занятость считает движок в памяти, из БД нужны только сами номера
+                result = await session.execute(HOTEL_ROOMS, {"hotel_id": hotel_id})
+                return [
+                    (
+                        room,
+                        room.quantity
+                        - availability_engine.booked(room.id, date_from, date_to),
+                    )
+                    for room in result.scalars().all()
+                ]
+            params = {"hotel_id": hotel_id, "date_from": date_from, "date_to": date_to}
+            result = await session.execute(cls.available_template(), params)
+            return [(room.Rooms, room.rooms_left) for room in result.all()]
+
+    @staticmethod
+    def available_batch_query(
+        hotel_ids: Sequence[int], date_from: date, date_to: date
+    ) -> Select:
+        """
+        Номера нескольких отелей одним запросом, занятость агрегируется
+        один раз на все номера:
+
+        SELECT rooms.*, rooms.quantity - COALESCE(booked.booked_count, 0) AS rooms_left
+        FROM rooms
+        LEFT JOIN (
+            SELECT room_id, MAX(booked_count) AS booked_count FROM room_nights ...
+        ) AS booked
+        ON booked.room_id = rooms.id
+        WHERE rooms.hotel_id IN (1, 2, 3) ORDER BY rooms.hotel_id, rooms.id
+        """
+        in_hotels = Rooms.hotel_id.in_(hotel_ids)
+        booked = RoomNightsService.booked_counts(date_from, date_to, in_hotels)
+        rooms_left = Rooms.quantity - func.coalesce(booked.c.booked_count, 0)
+        return (
+            select(Rooms, rooms_left.label("rooms_left"))
+            .join(booked, booked.c.room_id == Rooms.id, isouter=True)
+            .where(in_hotels)
+            .order_by(Rooms.hotel_id, Rooms.id)
+        )
+
+    @classmethod
+    async def find_available_batch(
+        cls, hotel_ids: Sequence[int], date_from: date, date_to: date
+    ) -> Dict[int, List[Tuple[Rooms, int]]]:
+        """
+        Свободные номера по каждому из отелей в порядке hotel_ids, за один
+        запрос к БД.
+        """
+        hotels: Dict[int, List[Tuple[Rooms, int]]] = {
+            hotel_id: [] for hotel_id in hotel_ids
+        }
+        async with session_scope(read_only=True) as session:
+            if availability_engine.ready:
+                query = (
+                    select(Rooms)
+                    .where(Rooms.hotel_id.in_(hotels))
+                    .order_by(Rooms.hotel_id, Rooms.id)
+                )
+                result = await session.execute(query)
+                for room in result.scalars().all():
+                    rooms_left = room.quantity - availability_engine.booked(
+                        room.id, date_from, date_to
+                    )
+                    hotels[room.hotel_id].append((room, rooms_left))
+                return hotels
+            result = await session.execute(
+                cls.available_batch_query(list(hotels), date_from, date_to)
+            )
+            for row in result.all():
+                hotels[row.Rooms.hotel_id].append((row.Rooms, row.rooms_left))
+        return hotels
+
+    @classmethod
+    def available_page_query(
+        cls,
+        hotel_id: int,
+        date_from: date,
+        date_to: date,
+        sort: RoomSort,
+        order: SortOrder,
+        after: Optional[List],
+        limit: int,
+    ) -> Select:
+        """
+        Страница available_query с сортировкой по ключу (sort, rooms.id):
+
+        ... WHERE rooms.hotel_id = 1 AND (rooms.price, rooms.id) > (5000, 17)
+        ORDER BY rooms.price, rooms.id LIMIT 21
+
+        По цене и названию страницы идут по индексам ix_rooms_hotel_id_price
+        и ix_rooms_hotel_id_name. Остаток считается за даты запроса, индекса
+        по нему нет: для условия и сортировки он считается по всем номерам
+        отеля, O(номеров отеля) на страницу.
+        """
+        query = cls.available_query(hotel_id, date_from, date_to)
+        columns = query.selected_columns
+        sort_column = {
+            "name": Rooms.name,
+            "price": Rooms.price,
+            "rooms_left": columns.rooms_left,
+        }[sort]
+        return keyset(query, [sort_column, Rooms.id], after, order, limit)
+
+    @classmethod
+    async def find_available_page(
+        cls,
+        hotel_id: int,
+        date_from: date,
+        date_to: date,
+        sort: RoomSort = "price",
+        order: SortOrder = "asc",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> Tuple[List[Tuple[Rooms, int]], Optional[str]]:
+        after = decode_cursor(
+            cursor, sort, order, (str if sort == "name" else int, int)
+        )
+
+        def key(row: Tuple[Rooms, int]) -> Tuple:
+            room, rooms_left = row
+            return {"name": room.name, "price": room.price, "rooms_left": rooms_left}[
+                sort
+            ], room.id
+
+        if availability_engine.ready:
+            rooms = await cls.find_available(hotel_id, date_from, date_to)
+            rows = keyset_rows(rooms, key, after, order, limit)
+        else:
+            async with session_scope(read_only=True) as session:
+                query = cls.available_page_query(
+                    hotel_id, date_from, date_to, sort, order, after, limit
+                )
+                result = await session.execute(query)
+                rows = [(row.Rooms, row.rooms_left) for row in result.all()]
+        return page(rows, key, sort, order, limit)
+
+    @staticmethod
+    def calendar_query(hotel_id: int, date_from: date, date_to: date) -> Select:
+        """
+        SELECT rooms.*, array_agg(
+            rooms.quantity - COALESCE(room_nights.booked_count, 0) ORDER BY nights.n
+        ) AS rooms_left FROM rooms
+        CROSS JOIN generate_series(0, 29) AS nights(n)
+        LEFT JOIN room_nights ON room_nights.room_id = rooms.id AND
+            room_nights.night = '2023-05-15'::date + nights.n
+        WHERE rooms.hotel_id = 1
+        GROUP BY rooms.id ORDER BY rooms.id
+        """
+        nights = (
+            func.generate_series(0, (date_to - date_from).days - 1)
+            .table_valued("n")
+            .render_derived(name="nights")
+        )
+        rooms_left = Rooms.quantity - func.coalesce(RoomNights.booked_count, 0)
+        return (
+            select(
+                Rooms,
+                func.array_agg(aggregate_order_by(rooms_left, nights.c.n)).label(
+                    "rooms_left"
+                ),
+            )
+            .join(nights, true())
+            .join(
+                RoomNights,
+                and_(
+                    RoomNights.room_id == Rooms.id,
+                    RoomNights.night == cast(date_from, Date) + nights.c.n,
+                ),
+                isouter=True,
+            )
+            .where(Rooms.hotel_id == hotel_id)
+            .group_by(Rooms.id)
+            .order_by(Rooms.id)
+        )
+
+    @classmethod
+    async def calendar(
+        cls, hotel_id: int, date_from: date, date_to: date
+    ) -> List[Tuple[Rooms, List[int]]]:
+        """Остаток номеров каждого типа на каждую ночь с date_from по date_to - 1."""
+        async with session_scope(read_only=True) as session:
+            if availability_engine.ready:
+                result = await session.execute(
+                    select(Rooms).where(Rooms.hotel_id == hotel_id).order_by(Rooms.id)
+                )
+                nights = RoomNightsService.nights(date_from, date_to)
+                return [
+                    (
+                        room,
+                        [
+                            room.quantity
+                            - availability_engine.booked(
+                                room.id, night, night + timedelta(days=1)
+                            )
+                            for night in nights
+                        ],
+                    )
+                    for room in result.scalars().all()
+                ]
+            result = await session.execute(
+                cls.calendar_query(hotel_id, date_from, date_to)
+            )
+            return [(row.Rooms, row.rooms_left) for row in result.all()]
+
+    @classmethod
+    async def find_flexible(
+        cls,
+        hotel_id: int,
+        date_from: date,
+        date_to: date,
+        nights: int,
+        limit: int = 3,
+    ) -> List[SFlexibleStay]:
+        """Самые дешевые свободные заезды на nights ночей в каждом номере отеля."""
+        async with session_scope(read_only=True) as session:
+            return await cls.cheapest_stays(
+                session,
+                date_from,
+                date_to,
+                nights,
+                "room_id",
+                limit,
+                Rooms.hotel_id == hotel_id,
+            )
+
+    @classmethod
+    async def cheapest_stays(
+        cls,
+        session: AsyncSession,
+        date_from: date,
+        date_to: date,
+        nights: int,
+        per: str,
+        limit: int,
+        *where,
+    ) -> List[SFlexibleStay]:
+        """
+        По limit самых дешевых заездов на номер (per="room_id") или на отель
+        (per="hotel_id"). Свободные заезды находит один оконный запрос,
+        стоимость всех заездов — одна векторная оценка цен на все номера
+        и все ночи диапазона.
+        """
+        result = await session.execute(
+            RoomNightsService.available_stays(date_from, date_to, nights, *where)
+        )
+        stays = result.all()
+        if not stays:
+            return []
+        result = await session.execute(
+            select(Rooms).where(Rooms.id.in_({stay.room_id for stay in stays}))
+        )
+        rooms = result.scalars().all()
+
+        index = {room.id: i for i, room in enumerate(rooms)}
+        totals = window_totals(
+            await PricingService.rates(rooms, date_from, date_to), nights
+        )
+        priced = sorted(
+            (
+                (
+                    getattr(stay, per),
+                    int(totals[index[stay.room_id], (stay.date_from - date_from).days]),
+                    stay,
+                )
+                for stay in stays
+            ),
+            key=lambda item: (item[0], item[1], item[2].date_from, item[2].room_id),
+        )
+        return [
+            cls.flexible_stay(stay, nights, total)
+            for _, group in groupby(priced, key=lambda item: item[0])
+            for _, total, stay in islice(group, limit)
+        ]
+
+    @staticmethod
+    def flexible_stay(row: Row, nights: int, total_cost: int) -> SFlexibleStay:
+        return SFlexibleStay(
+            hotel_id=row.hotel_id,
+            room_id=row.room_id,
+            date_from=row.date_from,
+            date_to=row.date_from + timedelta(days=nights),
+            total_cost=total_cost,
+            rooms_left=row.rooms_left,
+        )
+
     @classmethod
     async def find_all(cls, hotel_id: Optional[int] = None, price: Optional[int] = None) -> List[SRoom]:
-        async with async_session_maker() as session:
+        async with session_scope(read_only=True) as session:
             query = select(cls.model)
             if hotel_id:
                 query = query.filter(cls.model.hotel_id == hotel_id)
@@ -33,7 +428,7 @@ class RoomService(BaseService):
         quantity: int,
         image_id: int,
     ) -> SRoom:
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             room_data = {
                 "hotel_id": hotel_id,
                 "name": name,
@@ -46,21 +441,97 @@ class RoomService(BaseService):
             query = insert(cls.model).values(**room_data).returning(cls.model)
             result = await session.execute(query)
             await session.commit()
-            return SRoom.model_validate(result.scalar_one())
+        stick_to_primary()
+        await search_cache.invalidate(tags.hotel(hotel_id))
+        return SRoom.model_validate(result.scalar_one())
 
     @classmethod
     async def update(cls, room_id: int, **data) -> Optional[SRoom]:
-        async with async_session_maker() as session:
-            query = update(cls.model).where(cls.model.id == room_id).values(**data).returning(cls.model)
+        """
+        WITH old AS (
+            SELECT rooms.id, rooms.hotel_id FROM rooms WHERE rooms.id = 1 FOR UPDATE
+        )
+        UPDATE rooms SET ... FROM old WHERE rooms.id = old.id
+        RETURNING rooms.*, old.hotel_id
+
+        Номер может перейти в другой отель: прежний отель возвращает тот же
+        запрос, и кэш поиска сбрасывается у обоих.
+        """
+        old = (
+            select(Rooms.id, Rooms.hotel_id)
+            .where(Rooms.id == room_id)
+            .with_for_update()
+            .cte("old")
+        )
+        async with session_scope() as session:
+            query = (
+                update(cls.model)
+                .where(cls.model.id == old.c.id)
+                .values(**data)
+                .returning(cls.model, old.c.hotel_id.label("old_hotel_id"))
+            )
             result = await session.execute(query)
+            updated = result.one_or_none()
             await session.commit()
-            room = result.scalar_one_or_none()
-            return SRoom.model_validate(room) if room else None
+        stick_to_primary()
+        if not updated:
+            return None
+        room, old_hotel_id = updated
+        await cls.forget_hotel_ids([room_id])
+        await search_cache.invalidate(
+            *{tags.hotel(old_hotel_id), tags.hotel(room.hotel_id)}
+        )
+        return SRoom.model_validate(room)
 
     @classmethod
     async def delete(cls, room_id: int) -> bool:
-        async with async_session_maker() as session:
-            query = delete(cls.model).where(cls.model.id == room_id)
+        async with session_scope() as session:
+            query = (
+                delete(cls.model)
+                .where(cls.model.id == room_id)
+                .returning(cls.model.hotel_id)
+            )
             result = await session.execute(query)
             await session.commit()
-            return result.rowcount > 0
+        stick_to_primary()
+        hotel_id = result.scalar_one_or_none()
+        if hotel_id is None:
+            return False
+        await cls.forget_hotel_ids([room_id])
+        await search_cache.invalidate(tags.hotel(hotel_id))
+        return True
+
+    @classmethod
+    async def bulk_update(cls, rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        SELECT rooms.hotel_id FROM rooms WHERE rooms.id IN (1, 2)
+        ORDER BY rooms.id FOR UPDATE;
+        UPDATE rooms SET ... WHERE rooms.id = $1
+
+        Как BaseService.bulk_update, но строка может перенести номер в другой
+        отель: прежние отели номеров читаются под блокировкой в той же
+        транзакции до UPDATE, и кэш поиска сбрасывается и у них.
+        """
+        cls._check_bulk_writes()
+        if not rows:
+            return
+        room_ids = {row["id"] for row in rows}
+        async with session_scope() as session:
+            query = (
+                select(Rooms.hotel_id)
+                .where(Rooms.id.in_(room_ids))
+                .order_by(Rooms.id)
+                .with_for_update()
+            )
+            hotel_ids = set((await session.execute(query)).scalars().all())
+            await session.execute(update(cls.model), rows)
+            await session.commit()
+        stick_to_primary()
+        await cls.forget_hotel_ids(room_ids)
+        hotel_ids.update(row["hotel_id"] for row in rows if "hotel_id" in row)
+        await search_cache.invalidate(*map(tags.hotel, hotel_ids))
+
+    @classmethod
+    async def _bulk_changed(cls, rows) -> None:
+        # Новые номера bulk_add и copy_add; bulk_update сбрасывает кэш сам
+        await search_cache.invalidate(*{tags.hotel(row["hotel_id"]) for row in rows})
@@ -1,18 +1,23 @@
-import asyncio
 from datetime import date
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Query
-from fastapi_cache.decorator import cache
-from sqlalchemy import func, select
+from fastapi_versioning import version
 
-from app.bookings.models import Bookings
-from app.database import async_session_maker
-from app.exceptions import HotelNotFoundException, InvalidDateException
-from app.hotels.models import Hotels
-from app.hotels.rooms.models import Rooms
-from app.hotels.schemas import SHotel
-from app.hotels.service import HotelService
+from app.bookings.holds.store import hold_store
+from app.cache import tags
+from app.cache.tagged import cached, search_cache, tag
+from app.exceptions import (
+    DateRangeTooLongException,
+    HotelNotFoundException,
+    InvalidDateException,
+)
+from app.hotels.rooms.schemas import SFlexibleStay
+from app.hotels.rooms.service import RoomService
+from app.hotels.schemas import SHotel, SHotelSearch
+from app.hotels.service import HotelService, HotelSort
+from app.hotels.suggest import location_index
+from app.service.pagination import SortOrder, SPage
 
 router = APIRouter(
     prefix="/hotels",
@@ -20,48 +25,127 @@ router = APIRouter(
 )
 
 
+# Объявлен до /{location}, иначе "suggest" попадет в параметр location
+@router.get("/suggest")
+async def suggest_locations(
+    q: str = Query(
+        ..., min_length=1, description="Начало названия региона, района или города"
+    ),
+    limit: int = Query(10, ge=1, le=50),
+) -> List[str]:
+    if not location_index.ready:
+        await location_index.load()
+    return location_index.suggest(q, limit)
+
+
 @router.get("/{location}")
-@cache(expire=30)
 async def get_hotels(
     location: str,
     date_from: date = Query(..., description="Дата заезда (YYYY-MM-DD)"),
     date_to: date = Query(..., description="Дата выезда (YYYY-MM-DD)"),
+    fuzzy: bool = Query(
+        False, description="Нечеткий поиск: находит адрес с опечаткой, похожие первыми"
+    ),
 ) -> List[SHotel]:
-    await asyncio.sleep(3)
     if (date_to - date_from).days <= 0:
         raise InvalidDateException
 
-    async with async_session_maker() as session:
-        booked_rooms = (
-            select(Bookings.room_id, func.count(Bookings.id).label("booked_count"))
-            .where(Bookings.date_from <= date_to, Bookings.date_to > date_from)
-            .group_by(Bookings.room_id)
-            .cte("booked_rooms")
-        )
-
-        query = (
-            select(
-                Hotels,
-                (func.sum(Rooms.quantity) - func.coalesce(func.sum(booked_rooms.c.booked_count), 0)).label(
-                    "rooms_left"
-                ),
+    # Удержания живут минуты и меняются чаще броней, поэтому вычитаются
+    # из закэшированной выдачи, а не сбрасывают ее
+    hotels = await search_hotels(
+        location=location, date_from=date_from, date_to=date_to, fuzzy=fuzzy
+    )
+    held = await hold_store.held_hotels(
+        [hotel["id"] for hotel in hotels], date_from, date_to
+    )
+    hotels = [
+        {**hotel, "rooms_left": hotel["rooms_left"] - held[hotel["id"]]}
+        for hotel in hotels
+    ]
+    return [hotel for hotel in hotels if hotel["rooms_left"] > 0]
+
+
+@cached(search_cache, expire=3600)
+async def search_hotels(
+    location: str, date_from: date, date_to: date, fuzzy: bool
+) -> List[Dict[str, Any]]:
+    # Берем и полностью занятые отели: их теги нужны, чтобы отмена брони
+    # вернула отель в закэшированную выдачу
+    hotels = await HotelService.find_available(
+        location, date_from, date_to, with_full=True, fuzzy=fuzzy
+    )
+    tag(tags.HOTELS)
+    for hotel, _ in hotels:
+        tag(tags.hotel(hotel.id), *tags.hotel_dates(hotel.id, date_from, date_to))
+    return [
+        {
+            **SHotel.model_validate(hotel).model_dump(),
+            "rooms_left": rooms_left,
+        }
+        for hotel, rooms_left in hotels
+        if rooms_left > 0
+    ]
+
+
+@router.get("/{location}")
+@version(2)
+async def get_hotels_page(
+    location: str,
+    date_from: date = Query(..., description="Дата заезда (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Дата выезда (YYYY-MM-DD)"),
+    fuzzy: bool = Query(False, description="Нечеткий поиск: находит адрес с опечаткой"),
+    sort: HotelSort = Query(
+        "name", description="Сортировка: название, минимальная цена номера или остаток"
+    ),
+    order: SortOrder = Query("asc"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(20, ge=1, le=100),
+) -> SPage[SHotelSearch]:
+    if (date_to - date_from).days <= 0:
+        raise InvalidDateException
+
+    hotels, next_cursor = await HotelService.find_available_page(
+        location, date_from, date_to, sort, order, cursor, limit, fuzzy
+    )
+    # Курсор построен по остатку из БД, поэтому удержания не сдвигают страницы:
+    # отель, целиком занятый удержаниями, просто пропадает со своей страницы
+    held = await hold_store.held_hotels(
+        [hotel.id for hotel, _, _ in hotels], date_from, date_to
+    )
+    return SPage(
+        items=[
+            SHotelSearch(
+                **SHotel.model_validate(hotel).model_dump(),
+                rooms_left=rooms_left - held[hotel.id],
+                min_price=min_price,
             )
-            .join(Rooms, Rooms.hotel_id == Hotels.id)
-            .join(booked_rooms, booked_rooms.c.room_id == Rooms.id, isouter=True)
-            .where(Hotels.location.ilike(f"%{location}%"))
-            .group_by(Hotels.id)
-            .having(func.sum(Rooms.quantity) - func.coalesce(func.sum(booked_rooms.c.booked_count), 0) > 0)
-        )
-
-        result = await session.execute(query)
-        hotels = result.all()
-        return [
-            {
-                **SHotel.model_validate(hotel.Hotels).model_dump(),
-                "rooms_left": hotel.rooms_left,
-            }
-            for hotel in hotels
-        ]
+            for hotel, rooms_left, min_price in hotels
+            if rooms_left - held[hotel.id] > 0
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{location}/flexible")
+async def get_flexible_hotels(
+    location: str,
+    date_from: date = Query(..., description="Заезд не раньше (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Выезд не позже (YYYY-MM-DD)"),
+    nights: int = Query(..., ge=1, le=30, description="Сколько ночей"),
+    limit: int = Query(3, ge=1, le=10, description="Сколько вариантов заезда на отель"),
+    fuzzy: bool = Query(False, description="Нечеткий поиск: находит адрес с опечаткой"),
+) -> List[SFlexibleStay]:
+    # Без кэша: новый свободный номер в любом отеле по адресу меняет выдачу,
+    # а тегов отелей, которых в выдаче нет, у записи не было бы
+    days = (date_to - date_from).days
+    if days <= 0:
+        raise InvalidDateException
+    if days > RoomService.MAX_RANGE_DAYS:
+        raise DateRangeTooLongException(RoomService.MAX_RANGE_DAYS)
+
+    return await HotelService.find_flexible(
+        location, date_from, date_to, nights, limit, fuzzy
+    )
 
 
 @router.get("/id/{hotel_id}")
@@ -13,3 +13,8 @@ class SHotel(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class SHotelSearch(SHotel):
+    rooms_left: int
+    min_price: int
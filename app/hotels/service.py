@@ -1,30 +1,340 @@
-from typing import List, Optional
+from datetime import date
+from functools import cache
+from typing import Dict, List, Literal, Optional, Tuple
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import (
+    ColumnElement,
+    Date,
+    Select,
+    String,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session_maker
+from app.availability.engine import availability_engine
+from app.bookings.room_nights.service import RoomNightsService
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.config import settings
+from app.database import session_scope, stick_to_primary
 from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.hotels.rooms.schemas import SFlexibleStay
+from app.hotels.rooms.service import RoomService
 from app.hotels.schemas import SHotel
+from app.hotels.suggest import location_index
 from app.service.base import BaseService
+from app.service.pagination import SortOrder, decode_cursor, keyset, keyset_rows, page
+
+HotelSort = Literal["name", "price", "rooms_left"]
 
 
 class HotelService(BaseService):
     model = Hotels
 
+    @staticmethod
+    def location_filter(location, fuzzy: bool = False) -> ColumnElement[bool]:
+        """
+        Обычный поиск — подстрока: hotels.location ILIKE '%Алтай%'.
+        Нечеткий — похожее слово в адресе: hotels.location %> 'Алтй',
+        т.е. word_similarity не ниже pg_trgm.word_similarity_threshold.
+        Оба условия обслуживает GIN-индекс ix_hotels_location_trgm.
+
+        location — строка или параметр шаблона; для параметра шаблон
+        собирается в SQL: ILIKE '%' || $1 || '%'.
+        """
+        if fuzzy:
+            return Hotels.location.op("%>", is_comparison=True)(location)
+        return Hotels.location.ilike("%" + location + "%")
+
+    @staticmethod
+    async def set_similarity_threshold(session: AsyncSession) -> None:
+        # Порог действует до конца транзакции сессии
+        threshold = str(settings.SEARCH_SIMILARITY_THRESHOLD)
+        await session.execute(
+            select(
+                func.set_config("pg_trgm.word_similarity_threshold", threshold, True)
+            )
+        )
+
+    @classmethod
+    def available_query(
+        cls,
+        location: str,
+        date_from: date,
+        date_to: date,
+        with_full: bool = False,
+        fuzzy: bool = False,
+    ) -> Select:
+        """
+        SELECT hotels.*, SUM(rooms.quantity - (
+            SELECT COALESCE(MAX(room_nights.booked_count), 0) FROM room_nights
+            WHERE room_nights.room_id = rooms.id AND
+            room_nights.night >= '2023-05-15' AND room_nights.night < '2023-06-20'
+        )) AS rooms_left, MIN(rooms.price) AS min_price FROM hotels
+        JOIN rooms ON rooms.hotel_id = hotels.id
+        WHERE hotels.location ILIKE '%Алтай%'
+        GROUP BY hotels.id
+        HAVING rooms_left > 0
+
+        В нечетком режиме: WHERE hotels.location %> 'Алтй'
+        ORDER BY word_similarity('Алтй', hotels.location) DESC
+        """
+        rooms_left = func.sum(
+            Rooms.quantity - RoomNightsService.booked_count(date_from, date_to)
+        )
+        query = (
+            select(
+                Hotels,
+                rooms_left.label("rooms_left"),
+                func.min(Rooms.price).label("min_price"),
+            )
+            .join(Rooms, Rooms.hotel_id == Hotels.id)
+            .where(cls.location_filter(location, fuzzy))
+            .group_by(Hotels.id)
+        )
+        if fuzzy:
+            query = query.order_by(
+                func.word_similarity(location, Hotels.location).desc(), Hotels.id
+            )
+        if not with_full:
+            query = query.having(rooms_left > 0)
+        return query
+
     @classmethod
-    async def find_all(cls, name: Optional[str] = None, location: Optional[str] = None) -> List[SHotel]:
-        async with async_session_maker() as session:
+    @cache
+    def available_template(cls, with_full: bool, fuzzy: bool) -> Select:
+        """
+        available_query, построенный один раз на воркер: location, date_from
+        и date_to подставляются параметрами при выполнении. Поиск не собирает
+        дерево выражения и не считает ключ кэша компиляции SQLAlchemy на
+        каждый запрос, а одинаковый текст SQL берет готовый подготовленный
+        запрос asyncpg соединения.
+        """
+        return cls.available_query(
+            bindparam("location", type_=String),
+            bindparam("date_from", type_=Date),
+            bindparam("date_to", type_=Date),
+            with_full,
+            fuzzy,
+        )
+
+    @classmethod
+    @cache
+    def hotel_rooms_template(cls, fuzzy: bool) -> Select:
+        """
+        SELECT hotels.*, rooms.id, rooms.quantity, rooms.price FROM hotels
+        JOIN rooms ON rooms.hotel_id = hotels.id
+        WHERE hotels.location ILIKE '%' || $1 || '%'
+        """
+        location = bindparam("location", type_=String)
+        query = (
+            select(Hotels, Rooms.id, Rooms.quantity, Rooms.price)
+            .join(Rooms, Rooms.hotel_id == Hotels.id)
+            .where(cls.location_filter(location, fuzzy))
+        )
+        if fuzzy:
+            query = query.order_by(
+                func.word_similarity(location, Hotels.location).desc(), Hotels.id
+            )
+        return query
+
+    @classmethod
+    async def _available_from_engine(
+        cls,
+        session: AsyncSession,
+        location: str,
+        date_from: date,
+        date_to: date,
+        fuzzy: bool,
+    ) -> List[Tuple[Hotels, int, int]]:
+        # Занятость считает движок в памяти, из БД нужны только отели, емкость
+        # и цены номеров
+        result = await session.execute(
+            cls.hotel_rooms_template(fuzzy), {"location": location}
+        )
+        hotels: Dict[int, List] = {}
+        for hotel, room_id, quantity, price in result.all():
+            row = hotels.setdefault(hotel.id, [hotel, 0, price])
+            row[1] += quantity - availability_engine.booked(room_id, date_from, date_to)
+            row[2] = min(row[2], price)
+        return [tuple(row) for row in hotels.values()]
+
+    @classmethod
+    async def find_available(
+        cls,
+        location: str,
+        date_from: date,
+        date_to: date,
+        with_full: bool = False,
+        fuzzy: bool = False,
+    ) -> List[Tuple[Hotels, int]]:
+        async with session_scope(read_only=True) as session:
+            if fuzzy:
+                await cls.set_similarity_threshold(session)
+            if availability_engine.ready:
+                hotels = await cls._available_from_engine(
+                    session, location, date_from, date_to, fuzzy
+                )
+                return [
+                    (hotel, rooms_left)
+                    for hotel, rooms_left, _ in hotels
+                    if with_full or rooms_left > 0
+                ]
+            params = {"location": location, "date_from": date_from, "date_to": date_to}
+            result = await session.execute(
+                cls.available_template(with_full, fuzzy), params
+            )
+            return [(hotel.Hotels, hotel.rooms_left) for hotel in result.all()]
+
+    @classmethod
+    def available_page_query(
+        cls,
+        location: str,
+        date_from: date,
+        date_to: date,
+        sort: HotelSort,
+        order: SortOrder,
+        after: Optional[List],
+        limit: int,
+        fuzzy: bool = False,
+    ) -> Select:
+        """
+        Страница available_query с сортировкой по ключу (sort, hotels.id):
+
+        ... HAVING rooms_left > 0 AND (min(rooms.price), hotels.id) > (5000, 17)
+        ORDER BY min_price, hotels.id LIMIT 21
+
+        По названию условие стоит в WHERE, и страницы идут по индексу
+        ix_hotels_name_id. Цена и остаток — агрегаты по номерам отеля за
+        даты запроса, индекса по ним нет: условие стоит в HAVING, и каждая
+        страница, включая первую, агрегирует все подошедшие по адресу отели,
+        O(совпадений). Ключ вместо OFFSET здесь только держит страницы
+        стабильными и не отдает пропущенные строки.
+        """
+        query = cls.available_query(location, date_from, date_to, fuzzy=fuzzy).order_by(
+            None
+        )
+        columns = query.selected_columns
+        sort_column = {
+            "name": Hotels.name,
+            "price": columns.min_price,
+            "rooms_left": columns.rooms_left,
+        }[sort]
+        return keyset(
+            query, [sort_column, Hotels.id], after, order, limit, having=sort != "name"
+        )
+
+    @classmethod
+    async def find_available_page(
+        cls,
+        location: str,
+        date_from: date,
+        date_to: date,
+        sort: HotelSort = "name",
+        order: SortOrder = "asc",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        fuzzy: bool = False,
+    ) -> Tuple[List[Tuple[Hotels, int, int]], Optional[str]]:
+        """
+        Страница поиска (available_page_query). С движком доступности
+        занятость считается в памяти для всех подошедших по адресу отелей при
+        любой сортировке, страница выбирается из них (keyset_rows).
+        """
+        after = decode_cursor(
+            cursor, sort, order, (str if sort == "name" else int, int)
+        )
+
+        def key(row: Tuple[Hotels, int, int]) -> Tuple:
+            hotel, rooms_left, min_price = row
+            return {"name": hotel.name, "price": min_price, "rooms_left": rooms_left}[
+                sort
+            ], hotel.id
+
+        async with session_scope(read_only=True) as session:
+            if fuzzy:
+                await cls.set_similarity_threshold(session)
+            if availability_engine.ready:
+                hotels = await cls._available_from_engine(
+                    session, location, date_from, date_to, fuzzy
+                )
+                rows = keyset_rows(
+                    [row for row in hotels if row[1] > 0], key, after, order, limit
+                )
+            else:
+                query = cls.available_page_query(
+                    location, date_from, date_to, sort, order, after, limit, fuzzy
+                )
+                result = await session.execute(query)
+                rows = [
+                    (row.Hotels, row.rooms_left, row.min_price) for row in result.all()
+                ]
+        return page(rows, key, sort, order, limit)
+
+    @classmethod
+    async def find_flexible(
+        cls,
+        location: str,
+        date_from: date,
+        date_to: date,
+        nights: int,
+        limit: int = 3,
+        fuzzy: bool = False,
+    ) -> List[SFlexibleStay]:
+        """Самые дешевые свободные заезды на nights ночей в каждом отеле по адресу."""
+        hotel_ids = select(Hotels.id).where(cls.location_filter(location, fuzzy))
+        async with session_scope(read_only=True) as session:
+            if fuzzy:
+                await cls.set_similarity_threshold(session)
+            return await RoomService.cheapest_stays(
+                session,
+                date_from,
+                date_to,
+                nights,
+                "hotel_id",
+                limit,
+                Rooms.hotel_id.in_(hotel_ids),
+            )
+
+    @classmethod
+    async def find_all(
+        cls,
+        name: Optional[str] = None,
+        location: Optional[str] = None,
+        fuzzy: bool = False,
+    ) -> List[SHotel]:
+        async with session_scope(read_only=True) as session:
             query = select(cls.model)
-            if name:
-                query = query.filter(cls.model.name.ilike(f"%{name}%"))
-            if location:
-                query = query.filter(cls.model.location.ilike(f"%{location}%"))
+            if fuzzy:
+                # Похожие по словам названия и адреса, самые похожие первыми
+                await cls.set_similarity_threshold(session)
+                for column, value in (
+                    (cls.model.name, name),
+                    (cls.model.location, location),
+                ):
+                    if value:
+                        query = query.filter(column.op("%>", is_comparison=True)(value))
+                        query = query.order_by(
+                            func.word_similarity(value, column).desc()
+                        )
+                query = query.order_by(cls.model.id)
+            else:
+                if name:
+                    query = query.filter(cls.model.name.ilike(f"%{name}%"))
+                if location:
+                    query = query.filter(cls.model.location.ilike(f"%{location}%"))
             result = await session.execute(query)
             return [SHotel.model_validate(hotel) for hotel in result.scalars().all()]
 
     @classmethod
     async def add(cls, name: str, location: str, services: str, rooms_quantity: int, image_id: int) -> SHotel:
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             hotel_data = {
                 "name": name,
                 "location": location,
@@ -35,21 +345,37 @@ class HotelService(BaseService):
             query = insert(cls.model).values(**hotel_data).returning(cls.model)
             result = await session.execute(query)
             await session.commit()
-            return SHotel.model_validate(result.scalar_one())
+        stick_to_primary()
+        await search_cache.invalidate(tags.HOTELS)
+        await location_index.changed()
+        return SHotel.model_validate(result.scalar_one())
 
     @classmethod
     async def update(cls, hotel_id: int, **data) -> Optional[SHotel]:
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = update(cls.model).where(cls.model.id == hotel_id).values(**data).returning(cls.model)
             result = await session.execute(query)
             await session.commit()
-            hotel = result.scalar_one_or_none()
-            return SHotel.model_validate(hotel) if hotel else None
+        stick_to_primary()
+        await search_cache.invalidate(tags.HOTELS, tags.hotel(hotel_id))
+        await location_index.changed()
+        hotel = result.scalar_one_or_none()
+        return SHotel.model_validate(hotel) if hotel else None
 
     @classmethod
     async def delete(cls, hotel_id: int) -> bool:
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = delete(cls.model).where(cls.model.id == hotel_id)
             result = await session.execute(query)
             await session.commit()
-            return result.rowcount > 0
+        stick_to_primary()
+        await search_cache.invalidate(tags.hotel(hotel_id))
+        await location_index.changed()
+        return result.rowcount > 0
+
+    @classmethod
+    async def _bulk_changed(cls, rows) -> None:
+        await search_cache.invalidate(
+            tags.HOTELS, *{tags.hotel(row["id"]) for row in rows if "id" in row}
+        )
+        await location_index.changed()
@@ -0,0 +1,117 @@
+import re
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import select
+
+from app.broadcast import broadcaster
+from app.database import async_session_maker
+from app.hotels.models import Hotels
+from app.logger import logger
+
+CHANNEL = "hotels_suggest"
+
+# Части адреса, которые не подсказываем: улицы и дома
+STREET_WORDS = {
+    "улица",
+    "проспект",
+    "переулок",
+    "шоссе",
+    "бульвар",
+    "набережная",
+    "площадь",
+    "проезд",
+    "тупик",
+}
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", text.lower().replace("ё", "е")).split())
+
+
+def components(location: str) -> List[str]:
+    """
+    Регион, район и населенный пункт из адреса отеля:
+    "Республика Алтай, Майминский район, село Урлу-Аспак, Лесхозная улица, 20"
+    -> ["Республика Алтай", "Майминский район", "село Урлу-Аспак"]
+    """
+    result = []
+    for part in location.split(","):
+        part = " ".join(part.split())
+        words = set(normalize(part).split())
+        if not part or any(char.isdigit() for char in part) or words & STREET_WORDS:
+            continue
+        result.append(part)
+    return result
+
+
+class LocationIndex:
+    """
+    Префиксный индекс частей адресов отелей для подсказок в поиске.
+
+    Отсортированный массив ключей: нормализованная часть адреса целиком
+    и с каждого ее слова ("республика алтай", "алтай"), рядом — исходный
+    текст для выдачи. Подсказка — bisect до первого ключа с префиксом
+    запроса и проход вперед, пока префикс совпадает.
+
+    Строится при старте приложения; после изменения отелей HotelService
+    пересобирает индекс у себя и рассылает событие остальным воркерам.
+    """
+
+    def __init__(self) -> None:
+        self._keys: List[str] = []
+        self._values: List[str] = []
+        self._origin = uuid.uuid4().hex
+        self.ready = False
+
+    def build(self, locations: Iterable[str]) -> None:
+        entries = set()
+        for location in locations:
+            for part in components(location):
+                words = normalize(part).split()
+                for i in range(len(words)):
+                    entries.add((" ".join(words[i:]), part))
+        entries = sorted(entries)
+        self._keys = [key for key, _ in entries]
+        self._values = [value for _, value in entries]
+        self.ready = True
+
+    def suggest(self, query: str, limit: int = 10) -> List[str]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        result: List[str] = []
+        i = bisect_left(self._keys, prefix)
+        while (
+            i < len(self._keys)
+            and self._keys[i].startswith(prefix)
+            and len(result) < limit
+        ):
+            if self._values[i] not in result:
+                result.append(self._values[i])
+            i += 1
+        return result
+
+    async def load(self) -> None:
+        async with async_session_maker() as session:
+            result = await session.execute(select(Hotels.location).distinct())
+            self.build(result.scalars().all())
+        logger.info("Location index loaded", extra={"keys": len(self._keys)})
+
+    async def changed(self) -> None:
+        try:
+            await self.load()
+        except Exception:
+            logger.error("Cannot reload location index", exc_info=True)
+        await broadcaster.publish(CHANNEL, {"origin": self._origin})
+
+    async def on_message(self, message: Dict[str, Any]) -> None:
+        if message["origin"] != self._origin:
+            await self.load()
+
+    def subscribe(self) -> None:
+        broadcaster.subscribe(CHANNEL, self.on_message)
+
+
+location_index = LocationIndex()
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from redis import asyncio as aioredis
+
+from app.exceptions import (
+    BookingException,
+    IdempotencyKeyInProgressException,
+    IdempotencyKeyReusedException,
+)
+
+# Снимаем блокировку, только если она все еще наша
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class Idempotency:
+    """
+    Повтор запроса с тем же Idempotency-Key получает сохраненный ответ
+    первого запроса и не выполняет его снова.
+
+    Ответ (или ошибка BookingException) хранится в Redis ttl секунд.
+    Первый запрос держит блокировку ключа; одновременные повторы в том же
+    воркере ждут его общей задачей, в других воркерах — появления ответа
+    в Redis. Непредвиденная ошибка не сохраняется: повтор выполнит запрос
+    заново. Ключ привязан к параметрам запроса: тот же ключ с другими
+    параметрами — ошибка клиента.
+
+    Общая задача заводится на ключ, а не на пользователя: кто бы ни прислал
+    ключ, пока первый запрос выполняется, он получит его результат. Поэтому
+    эндпоинты включают пользователя в ключ (bookings:{user_id}:{key}).
+    """
+
+    def __init__(
+        self,
+        prefix: str = "idempotency",
+        ttl: int = 24 * 3600,
+        lock_timeout: float = 30,
+    ) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._redis: Optional[aioredis.Redis] = None
+        self._unlock = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def init(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        self._unlock = redis.register_script(UNLOCK_SCRIPT)
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    @staticmethod
+    def fingerprint(params: Dict[str, Any]) -> str:
+        return hashlib.md5(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    async def run(
+        self, key: str, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Результат compute для key: сохраненный, общий с одновременным запросом
+        или новый.
+        """
+        if self._redis is None:
+            return await compute()
+        fingerprint = self.fingerprint(params)
+        future = self._inflight.get(key)
+        if future is None:
+            # compute доводится до конца, даже если клиент первого запроса отключился,
+            # поэтому выполняется в пустом контексте, со своей сессией БД: сессию
+            # запроса unit_of_work закроет, не дожидаясь compute
+            future = asyncio.get_running_loop().create_task(
+                self._run_locked(key, fingerprint, compute),
+                context=contextvars.Context(),
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return self._replay(await asyncio.shield(future), fingerprint)
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(f"{self.prefix}:{key}")  # type: ignore
+        return json.loads(raw) if raw else None
+
+    async def _run_locked(
+        self, key: str, fingerprint: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Dict[str, Any]:
+        stored = await self._get(key)
+        if stored is not None:
+            return stored
+        lock_key = f"{self.prefix}:lock:{key}"
+        token = uuid.uuid4().hex
+        locked = await self._redis.set(  # type: ignore
+            lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+        )
+        if not locked:
+            # Запрос с этим ключом выполняет другой воркер — ждем его ответа
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                stored = await self._get(key)
+                if stored is not None:
+                    return stored
+            raise IdempotencyKeyInProgressException
+        try:
+            try:
+                stored = {"fingerprint": fingerprint, "value": await compute()}
+            except BookingException as e:
+                stored = {
+                    "fingerprint": fingerprint,
+                    "status_code": e.status_code,
+                    "detail": e.detail,
+                }
+            raw = json.dumps(stored, default=str)
+            await self._redis.set(  # type: ignore
+                f"{self.prefix}:{key}", raw, ex=self.ttl
+            )
+            return json.loads(raw)
+        finally:
+            await self._unlock(keys=[lock_key], args=[token])  # type: ignore
+
+    @staticmethod
+    def _replay(stored: Dict[str, Any], fingerprint: str) -> Any:
+        if stored["fingerprint"] != fingerprint:
+            raise IdempotencyKeyReusedException
+        if "status_code" in stored:
+            raise HTTPException(
+                status_code=stored["status_code"], detail=stored["detail"]
+            )
+        return stored["value"]
+
+
+idempotency = Idempotency()
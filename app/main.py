@@ -3,7 +3,7 @@ import time
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
@@ -14,14 +14,29 @@ from fastapi_versioning import VersionedFastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.admin.auth import authentication_backend
-from app.admin.views import BookingsAdmin, HotelsAdmin, RoomsAdmin, UsersAdmin
+from app.admin.views import (
+    BookingsAdmin,
+    HotelsAdmin,
+    RateRulesAdmin,
+    RoomsAdmin,
+    UsersAdmin,
+)
+from app.availability.engine import availability_engine
+from app.bookings.holds.router import router as router_holds
+from app.bookings.holds.store import hold_store
 from app.bookings.router import router as router_bookings
+from app.broadcast import broadcaster
+from app.cache.tagged import search_cache
 from app.config import settings
-from app.database import engine
+from app.database import engine, unit_of_work
 from app.hotels.rooms.router import router as router_rooms
+from app.hotels.rooms.service import RoomService
 from app.hotels.router import router as router_hotels
+from app.hotels.suggest import location_index
+from app.idempotency import idempotency
 from app.images.router import router as router_images
 from app.pages.router import router as router_pages
+from app.pricing.service import PricingService
 from app.users.models import Users
 from app.users.router import router as router_users
 from app.prometheus.router import router as router_prometheus
@@ -32,15 +47,31 @@ from app.logger import logger
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     redis = aioredis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}")
     FastAPICache.init(RedisBackend(redis), prefix="cache")
+    search_cache.init(redis)
+    hold_store.init(redis)
+    idempotency.init(redis)
+    location_index.subscribe()
+    RoomService.subscribe()
+    PricingService.subscribe()
+    if settings.AVAILABILITY_ENGINE_ENABLED:
+        availability_engine.subscribe()
+    await broadcaster.start(redis)
+    await location_index.load()
+    if settings.AVAILABILITY_ENGINE_ENABLED:
+        await availability_engine.start(settings.AVAILABILITY_RESYNC_SECONDS)
     yield
+    await availability_engine.stop()
+    await broadcaster.stop()
     await redis.close()
 
 
-app = FastAPI(lifespan=lifespan)
+# Одна сессия БД на запрос: ее берут все сервисы, которые вызывает обработчик
+app = FastAPI(dependencies=[Depends(unit_of_work)])
 
 
 app.include_router(router_users)
 app.include_router(router_bookings)
+app.include_router(router_holds)
 app.include_router(router_hotels)
 app.include_router(router_rooms)
 app.include_router(router_pages)
@@ -68,8 +99,10 @@ app.add_middleware(
 
 app = VersionedFastAPI(
     app,
-    version_format='{major}',
-    prefix_format='/v{major}',
+    version_format="{major}",
+    prefix_format="/v{major}",
+    # VersionedFastAPI пересоздает приложение, lifespan передаем внешнему
+    lifespan=lifespan,
     # description='Greet users with a nice message',
     # middleware=[
     #     Middleware(SessionMiddleware, secret_key='mysecretkey')
@@ -88,6 +121,7 @@ admin.add_view(UsersAdmin)
 admin.add_view(BookingsAdmin)
 admin.add_view(HotelsAdmin)
 admin.add_view(RoomsAdmin)
+admin.add_view(RateRulesAdmin)
 
 app.mount("/static", StaticFiles(directory="app/static"), "static")
 
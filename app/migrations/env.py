@@ -8,10 +8,12 @@ from sqlalchemy import engine_from_config, pool
 sys.path.insert(0, dirname(dirname(dirname(abspath(__file__)))))
 
 from app.bookings.models import Bookings  # noqa
+from app.bookings.room_nights.models import RoomNights  # noqa
 from app.config import settings
 from app.database import Base
 from app.hotels.models import Hotels  # noqa
 from app.hotels.rooms.models import Rooms  # noqa
+from app.pricing.models import RateRules  # noqa
 from app.users.models import Users  # noqa
 
 # this is the Alembic Config object, which provides
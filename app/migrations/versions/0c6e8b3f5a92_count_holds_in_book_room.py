@@ -0,0 +1,212 @@
+"""Count holds in book_room
+
+Revision ID: 0c6e8b3f5a92
+Revises: f5c2a9d47e13
+Create Date: 2026-10-19 00:27:43.108265
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0c6e8b3f5a92"
+down_revision: Union[str, None] = "f5c2a9d47e13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тексты book_room этой ревизии: миграция не меняется вместе с app/bookings/functions.py
+BOOK_ROOM_V3 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date,
+    p_rules jsonb
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_hotel_id integer;
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+    v_total_cost bigint := 0;
+    v_multiplier double precision;
+    v_night record;
+    v_rule record;
+BEGIN
+    SELECT hotel_id, quantity, price INTO v_hotel_id, v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(booked_count), 0) INTO v_booked
+    FROM room_nights
+    WHERE room_id = p_room_id AND night >= p_date_from AND night < p_date_to;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    FOR v_night IN
+        SELECT
+            p_date_from + i AS night,
+            COALESCE(room_nights.booked_count, 0) AS booked_count
+        FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+        LEFT JOIN room_nights
+            ON room_nights.room_id = p_room_id AND room_nights.night = p_date_from + i
+        ORDER BY i
+    LOOP
+        v_multiplier := 1;
+        FOR v_rule IN
+            SELECT * FROM jsonb_to_recordset(p_rules) AS rule(
+                hotel_id integer,
+                room_id integer,
+                date_from date,
+                date_to date,
+                weekdays integer,
+                min_occupancy double precision,
+                multiplier double precision
+            )
+        LOOP
+            IF (v_rule.hotel_id IS NULL OR v_rule.hotel_id = v_hotel_id)
+                AND (v_rule.room_id IS NULL OR v_rule.room_id = p_room_id)
+                AND (v_rule.date_from IS NULL OR v_night.night >= v_rule.date_from)
+                AND (v_rule.date_to IS NULL OR v_night.night < v_rule.date_to)
+                AND (v_rule.weekdays IS NULL
+                    OR v_rule.weekdays
+                        & (1 << (extract(isodow FROM v_night.night)::integer - 1)) <> 0)
+                AND (v_rule.min_occupancy IS NULL
+                    OR v_night.booked_count::double precision / GREATEST(v_quantity, 1)
+                        >= v_rule.min_occupancy)
+            THEN
+                v_multiplier := v_multiplier * v_rule.multiplier;
+            END IF;
+        END LOOP;
+        -- round для double precision округляет до четного, как numpy.rint
+        v_total_cost := v_total_cost + round(v_price * v_multiplier)::bigint;
+    END LOOP;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price, v_total_cost)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V3 = (
+    "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date, jsonb)"
+)
+
+BOOK_ROOM_V4 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date,
+    p_rules jsonb,
+    p_held integer[]
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_hotel_id integer;
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+    v_total_cost bigint := 0;
+    v_multiplier double precision;
+    v_night record;
+    v_rule record;
+BEGIN
+    SELECT hotel_id, quantity, price INTO v_hotel_id, v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(
+        COALESCE(room_nights.booked_count, 0) + COALESCE(p_held[i + 1], 0)
+    ), 0) INTO v_booked
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    LEFT JOIN room_nights
+        ON room_nights.room_id = p_room_id AND room_nights.night = p_date_from + i;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    FOR v_night IN
+        SELECT
+            p_date_from + i AS night,
+            COALESCE(room_nights.booked_count, 0) AS booked_count
+        FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+        LEFT JOIN room_nights
+            ON room_nights.room_id = p_room_id AND room_nights.night = p_date_from + i
+        ORDER BY i
+    LOOP
+        v_multiplier := 1;
+        FOR v_rule IN
+            SELECT * FROM jsonb_to_recordset(p_rules) AS rule(
+                hotel_id integer,
+                room_id integer,
+                date_from date,
+                date_to date,
+                weekdays integer,
+                min_occupancy double precision,
+                multiplier double precision
+            )
+        LOOP
+            IF (v_rule.hotel_id IS NULL OR v_rule.hotel_id = v_hotel_id)
+                AND (v_rule.room_id IS NULL OR v_rule.room_id = p_room_id)
+                AND (v_rule.date_from IS NULL OR v_night.night >= v_rule.date_from)
+                AND (v_rule.date_to IS NULL OR v_night.night < v_rule.date_to)
+                AND (v_rule.weekdays IS NULL
+                    OR v_rule.weekdays
+                        & (1 << (extract(isodow FROM v_night.night)::integer - 1)) <> 0)
+                AND (v_rule.min_occupancy IS NULL
+                    OR v_night.booked_count::double precision / GREATEST(v_quantity, 1)
+                        >= v_rule.min_occupancy)
+            THEN
+                v_multiplier := v_multiplier * v_rule.multiplier;
+            END IF;
+        END LOOP;
+        -- round для double precision округляет до четного, как numpy.rint
+        v_total_cost := v_total_cost + round(v_price * v_multiplier)::bigint;
+    END LOOP;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price, v_total_cost)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V4 = (
+    "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date, jsonb, integer[])"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(DROP_BOOK_ROOM_V3)
+    op.execute(BOOK_ROOM_V4)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(DROP_BOOK_ROOM_V4)
+    op.execute(BOOK_ROOM_V3)
@@ -0,0 +1,49 @@
+"""Add room_nights ledger
+
+Revision ID: 3f1c9a7d2b64
+Revises: aed3b799ccdd
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a7d2b64"
+down_revision: Union[str, None] = "aed3b799ccdd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "room_nights",
+        sa.Column("room_id", sa.Integer(), nullable=False),
+        sa.Column("night", sa.Date(), nullable=False),
+        sa.Column("booked_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["room_id"],
+            ["rooms.id"],
+        ),
+        sa.PrimaryKeyConstraint("room_id", "night"),
+    )
+    # Заполняем журнал по уже существующим броням
+    op.execute(
+        """
+        INSERT INTO room_nights (room_id, night, booked_count)
+        SELECT room_id,
+            date_from + generate_series(0, date_to - date_from - 1) AS night,
+            COUNT(*)
+        FROM bookings
+        GROUP BY room_id, night
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("room_nights")
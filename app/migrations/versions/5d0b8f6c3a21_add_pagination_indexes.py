@@ -0,0 +1,56 @@
+"""Add pagination indexes
+
+Revision ID: 5d0b8f6c3a21
+Revises: e2a7c3f19b54
+Create Date: 2026-10-18 17:52:40.318214
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d0b8f6c3a21"
+down_revision: Union[str, None] = "e2a7c3f19b54"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ключи keyset-пагинации (сортировка, id); ix_rooms_hotel_id покрывается
+    # префиксом ix_rooms_hotel_id_price
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_hotels_name_id",
+            "hotels",
+            ["name", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_rooms_hotel_id_price",
+            "rooms",
+            ["hotel_id", "price", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_rooms_hotel_id_name",
+            "rooms",
+            ["hotel_id", "name", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_rooms_hotel_id", table_name="rooms", postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_rooms_hotel_id", "rooms", ["hotel_id"], unique=False)
+    op.drop_index("ix_rooms_hotel_id_name", table_name="rooms")
+    op.drop_index("ix_rooms_hotel_id_price", table_name="rooms")
+    op.drop_index("ix_hotels_name_id", table_name="hotels")
@@ -0,0 +1,70 @@
+"""Add book_room function
+
+Revision ID: 8b2e4d71c0a9
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 12:40:07.902114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2e4d71c0a9"
+down_revision: Union[str, None] = "3f1c9a7d2b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тексты book_room этой ревизии: миграция не меняется вместе с app/bookings/functions.py
+BOOK_ROOM_V1 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+BEGIN
+    SELECT quantity, price INTO v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(booked_count), 0) INTO v_booked
+    FROM room_nights
+    WHERE room_id = p_room_id AND night >= p_date_from AND night < p_date_to;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V1 = "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(BOOK_ROOM_V1)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(DROP_BOOK_ROOM_V1)
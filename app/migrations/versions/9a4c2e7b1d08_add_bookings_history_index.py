@@ -0,0 +1,39 @@
+"""Add bookings history index
+
+Revision ID: 9a4c2e7b1d08
+Revises: 5d0b8f6c3a21
+Create Date: 2026-10-18 18:31:07.641925
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a4c2e7b1d08"
+down_revision: Union[str, None] = "5d0b8f6c3a21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ключ страниц истории броней; ix_bookings_user_id покрывается его префиксом
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bookings_user_id_date_from",
+            "bookings",
+            ["user_id", "date_from", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_bookings_user_id", table_name="bookings", postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_bookings_user_id", "bookings", ["user_id"], unique=False)
+    op.drop_index("ix_bookings_user_id_date_from", table_name="bookings")
@@ -0,0 +1,151 @@
+"""Add rate rules
+
+Revision ID: b7e1d4a9c2f6
+Revises: 9a4c2e7b1d08
+Create Date: 2026-10-18 20:12:44.315702
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e1d4a9c2f6"
+down_revision: Union[str, None] = "9a4c2e7b1d08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тексты book_room этой ревизии: миграция не меняется вместе с app/bookings/functions.py
+BOOK_ROOM_V1 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+BEGIN
+    SELECT quantity, price INTO v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(booked_count), 0) INTO v_booked
+    FROM room_nights
+    WHERE room_id = p_room_id AND night >= p_date_from AND night < p_date_to;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V1 = "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date)"
+
+BOOK_ROOM_V2 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date,
+    p_total_cost integer
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+BEGIN
+    SELECT quantity, price INTO v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(booked_count), 0) INTO v_booked
+    FROM room_nights
+    WHERE room_id = p_room_id AND night >= p_date_from AND night < p_date_to;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price, p_total_cost)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V2 = (
+    "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date, integer)"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "rate_rules",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("hotel_id", sa.Integer(), nullable=True),
+        sa.Column("room_id", sa.Integer(), nullable=True),
+        sa.Column("date_from", sa.Date(), nullable=True),
+        sa.Column("date_to", sa.Date(), nullable=True),
+        sa.Column("weekdays", sa.Integer(), nullable=True),
+        sa.Column("min_occupancy", sa.Float(), nullable=True),
+        sa.Column("multiplier", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["hotel_id"], ["hotels.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["room_id"], ["rooms.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Стоимость брони теперь считает PricingService, поэтому total_cost —
+    # обычный столбец;
+    # у существующих броней остается вычисленное значение
+    op.execute("ALTER TABLE bookings ALTER COLUMN total_cost DROP EXPRESSION")
+    op.alter_column(
+        "bookings", "total_cost", existing_type=sa.Integer(), nullable=False
+    )
+    op.execute(DROP_BOOK_ROOM_V1)
+    op.execute(BOOK_ROOM_V2)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(DROP_BOOK_ROOM_V2)
+    op.drop_column("bookings", "total_cost")
+    op.add_column(
+        "bookings",
+        sa.Column(
+            "total_cost",
+            sa.Integer(),
+            sa.Computed("(date_to - date_from) * price"),
+            nullable=True,
+        ),
+    )
+    op.execute(BOOK_ROOM_V1)
+    op.drop_table("rate_rules")
@@ -0,0 +1,52 @@
+"""Add bookings and rooms indexes
+
+Revision ID: c47a9e05d1f3
+Revises: 8b2e4d71c0a9
+Create Date: 2026-10-18 14:05:52.117630
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c47a9e05d1f3"
+down_revision: Union[str, None] = "8b2e4d71c0a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в bookings на время построения индексов,
+    # но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bookings_room_id_dates",
+            "bookings",
+            ["room_id", "date_from", "date_to"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_bookings_user_id",
+            "bookings",
+            ["user_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_rooms_hotel_id",
+            "rooms",
+            ["hotel_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_rooms_hotel_id", table_name="rooms")
+    op.drop_index("ix_bookings_user_id", table_name="bookings")
+    op.drop_index("ix_bookings_room_id_dates", table_name="bookings")
@@ -0,0 +1,171 @@
+"""Partition bookings by date_to
+
+Revision ID: d3f8a61c5e27
+Revises: b7e1d4a9c2f6
+Create Date: 2026-10-18 22:05:19.482117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f8a61c5e27"
+down_revision: Union[str, None] = "b7e1d4a9c2f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тексты book_room этой ревизии: миграция не меняется вместе с app/bookings/functions.py
+BOOK_ROOM_V2 = """
+CREATE OR REPLACE FUNCTION book_room(
+    p_user_id integer,
+    p_room_id integer,
+    p_date_from date,
+    p_date_to date,
+    p_total_cost integer
+) RETURNS SETOF bookings
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_quantity integer;
+    v_price integer;
+    v_booked integer;
+BEGIN
+    SELECT quantity, price INTO v_quantity, v_price
+    FROM rooms WHERE id = p_room_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(MAX(booked_count), 0) INTO v_booked
+    FROM room_nights
+    WHERE room_id = p_room_id AND night >= p_date_from AND night < p_date_to;
+    IF v_quantity - v_booked <= 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT p_room_id, p_date_from + i, 1
+    FROM generate_series(0, p_date_to - p_date_from - 1) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1;
+
+    RETURN QUERY
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    VALUES (p_room_id, p_user_id, p_date_from, p_date_to, v_price, p_total_cost)
+    RETURNING *;
+END;
+$$
+"""
+DROP_BOOK_ROOM_V2 = (
+    "DROP FUNCTION IF EXISTS book_room(integer, integer, date, date, integer)"
+)
+
+COLUMNS = "id, room_id, user_id, date_from, date_to, price, total_cost"
+
+
+def create_bookings_indexes() -> None:
+    op.execute(
+        "CREATE INDEX ix_bookings_room_id_dates "
+        "ON bookings (room_id, date_from, date_to)"
+    )
+    op.execute(
+        "CREATE INDEX ix_bookings_user_id_date_from "
+        "ON bookings (user_id, date_from, id)"
+    )
+
+
+def rename_old_bookings() -> None:
+    """
+    Старая таблица освобождает имена: book_room возвращает ее тип строки,
+    индексы и PK именованы по ней.
+    """
+    op.execute(DROP_BOOK_ROOM_V2)
+    op.execute("DROP INDEX ix_bookings_room_id_dates, ix_bookings_user_id_date_from")
+    op.execute("ALTER TABLE bookings RENAME TO bookings_old")
+    op.execute(
+        "ALTER TABLE bookings_old RENAME CONSTRAINT bookings_pkey TO bookings_old_pkey"
+    )
+    op.execute("ALTER SEQUENCE bookings_id_seq OWNED BY NONE")
+
+
+def move_old_bookings() -> None:
+    op.execute(f"INSERT INTO bookings ({COLUMNS}) SELECT {COLUMNS} FROM bookings_old")
+    op.execute("ALTER SEQUENCE bookings_id_seq OWNED BY bookings.id")
+    op.execute("DROP TABLE bookings_old")
+    create_bookings_indexes()
+    op.execute(BOOK_ROOM_V2)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    rename_old_bookings()
+    # Ключ секционирования входит в первичный ключ, поэтому PK — (id, date_to)
+    op.execute(
+        """
+        CREATE TABLE bookings (
+            id integer NOT NULL DEFAULT nextval('bookings_id_seq'),
+            room_id integer REFERENCES rooms (id),
+            user_id integer REFERENCES users (id),
+            date_from date NOT NULL,
+            date_to date NOT NULL,
+            price integer NOT NULL,
+            total_cost integer NOT NULL,
+            total_days integer GENERATED ALWAYS AS (date_to - date_from) STORED,
+            CONSTRAINT bookings_pkey PRIMARY KEY (id, date_to)
+        ) PARTITION BY RANGE (date_to)
+        """
+    )
+    op.execute("CREATE TABLE bookings_default PARTITION OF bookings DEFAULT")
+    # Помесячные секции от самой ранней брони до года вперед;
+    # дальше их создает задача maintain_booking_partitions
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            v_month date;
+            v_last date := date_trunc('month', now())::date + interval '12 months';
+        BEGIN
+            SELECT COALESCE(
+                date_trunc('month', MIN(date_to)), date_trunc('month', now())
+            )::date
+            INTO v_month FROM bookings_old;
+            WHILE v_month <= v_last LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF bookings '
+                        || 'FOR VALUES FROM (%L) TO (%L)',
+                    'bookings_y' || to_char(v_month, 'YYYY')
+                        || 'm' || to_char(v_month, 'MM'),
+                    v_month,
+                    (v_month + interval '1 month')::date
+                );
+                v_month := (v_month + interval '1 month')::date;
+            END LOOP;
+        END;
+        $$
+        """
+    )
+    move_old_bookings()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Секции, уже перенесенные в схему archive, остаются там
+    rename_old_bookings()
+    op.execute(
+        """
+        CREATE TABLE bookings (
+            id integer NOT NULL DEFAULT nextval('bookings_id_seq'),
+            room_id integer REFERENCES rooms (id),
+            user_id integer REFERENCES users (id),
+            date_from date NOT NULL,
+            date_to date NOT NULL,
+            price integer NOT NULL,
+            total_cost integer NOT NULL,
+            total_days integer GENERATED ALWAYS AS (date_to - date_from) STORED,
+            CONSTRAINT bookings_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    move_old_bookings()
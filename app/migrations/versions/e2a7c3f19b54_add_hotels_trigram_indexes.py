@@ -0,0 +1,47 @@
+"""Add hotels trigram indexes
+
+Revision ID: e2a7c3f19b54
+Revises: c47a9e05d1f3
+Create Date: 2026-10-18 16:40:13.502871
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c3f19b54"
+down_revision: Union[str, None] = "c47a9e05d1f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_hotels_location_trgm",
+            "hotels",
+            ["location"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"location": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_hotels_name_trgm",
+            "hotels",
+            ["name"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_hotels_name_trgm", table_name="hotels")
+    op.drop_index("ix_hotels_location_trgm", table_name="hotels")
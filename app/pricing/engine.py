@@ -0,0 +1,59 @@
+from datetime import date
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.pricing.models import RateRules
+
+WEEKENDS = 0b1100000  # ночи с субботы и с воскресенья
+
+
+def nightly_rates(
+    room_ids: np.ndarray,
+    hotel_ids: np.ndarray,
+    prices: np.ndarray,
+    date_from: date,
+    nights: int,
+    rules: Sequence[RateRules],
+    occupancy: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Цены всех номеров на все ночи одной матрицей (номера x ночи).
+
+    Каждое правило — одна векторная операция над всей матрицей, без цикла
+    по номерам и ночам. occupancy — загрузка (номера x ночи), нужна только
+    правилам с min_occupancy.
+    """
+    days = date_from.toordinal() + np.arange(nights)
+    weekday_bits = 1 << ((days + 6) % 7)
+    multipliers = np.ones((len(prices), nights))
+    for rule in rules:
+        rooms = np.ones(len(prices), dtype=bool)
+        if rule.hotel_id is not None:
+            rooms &= hotel_ids == rule.hotel_id
+        if rule.room_id is not None:
+            rooms &= room_ids == rule.room_id
+        nights_mask = np.ones(nights, dtype=bool)
+        if rule.date_from is not None:
+            nights_mask &= days >= rule.date_from.toordinal()
+        if rule.date_to is not None:
+            nights_mask &= days < rule.date_to.toordinal()
+        if rule.weekdays is not None:
+            nights_mask &= (weekday_bits & rule.weekdays) != 0
+        mask = rooms[:, None] & nights_mask[None, :]
+        if rule.min_occupancy is not None:
+            if occupancy is None:
+                continue
+            mask &= occupancy >= rule.min_occupancy
+        multipliers[mask] *= rule.multiplier
+    return np.rint(prices[:, None] * multipliers).astype(np.int64)
+
+
+def window_totals(rates: np.ndarray, nights: int) -> np.ndarray:
+    """
+    Стоимость заезда на nights ночей с каждой ночи матрицы:
+    totals[r, s] = rates[r, s] + ... + rates[r, s + nights - 1].
+    """
+    sums = np.zeros((rates.shape[0], rates.shape[1] + 1), dtype=np.int64)
+    np.cumsum(rates, axis=1, out=sums[:, 1:])
+    return sums[:, nights:] - sums[:, :-nights]
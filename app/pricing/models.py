@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
+
+from app.database import Base
+
+
+class RateRules(Base):
+    """
+    Правило цены: множитель к базовой цене номера за ночь.
+
+    Правило действует на ночь, если выполнены все заданные условия: отель,
+    номер, период (ночи с date_from по date_to - 1), день недели ночи
+    (битовая маска weekdays, Пн = 1, Вт = 2, ..., Вс = 64) и загрузка типа
+    номера в эту ночь не ниже min_occupancy (доля от 0 до 1). Пустое условие
+    не ограничивает. Множители всех подошедших правил перемножаются.
+    """
+
+    __tablename__ = "rate_rules"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    hotel_id = Column(ForeignKey("hotels.id", ondelete="CASCADE"))
+    room_id = Column(ForeignKey("rooms.id", ondelete="CASCADE"))
+    date_from = Column(Date)
+    date_to = Column(Date)
+    weekdays = Column(Integer)
+    min_occupancy = Column(Float)
+    multiplier = Column(Float, nullable=False)
+
+    def __str__(self):
+        return f"Тариф: {self.name} x{self.multiplier}"
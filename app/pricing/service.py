@@ -0,0 +1,214 @@
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, Row, bindparam, select
+
+from app.bookings.room_nights.models import RoomNights
+from app.broadcast import broadcaster
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.config import settings
+from app.database import session_scope
+from app.hotels.rooms.models import Rooms
+from app.pricing.engine import nightly_rates
+from app.pricing.models import RateRules
+from app.service.base import BaseService
+
+# Номер для цены брони: запрос строится один раз, room_id — параметр
+ROOM = select(Rooms).where(Rooms.id == bindparam("room_id", type_=Integer))
+
+CHANNEL = "pricing_rules"
+
+
+class PricingService(BaseService):
+    """
+    Цены номеров по правилам rate_rules.
+
+    Правил немного, поэтому воркер держит их в памяти не дольше
+    PRICING_RULES_TTL секунд; изменение правил через админку сбрасывает
+    копии всех воркеров сразу (rules_changed).
+    """
+
+    model = RateRules
+
+    _rules: List[RateRules] = []
+    _rules_param: List[Dict[str, Any]] = []
+    _rules_loaded_at: Optional[float] = None
+
+    @classmethod
+    async def rules(cls) -> List[RateRules]:
+        now = time.monotonic()
+        if (
+            cls._rules_loaded_at is None
+            or now - cls._rules_loaded_at > settings.PRICING_RULES_TTL
+        ):
+            async with session_scope(read_only=True) as session:
+                result = await session.execute(select(RateRules))
+                cls._rules = list(result.scalars().all())
+            cls._rules_param = [cls.rule_param(rule) for rule in cls._rules]
+            cls._rules_loaded_at = now
+        return cls._rules
+
+    @classmethod
+    async def rules_param(cls) -> List[Dict[str, Any]]:
+        """
+        Те же правила и в том же порядке параметром p_rules функции book_room
+        (jsonb).
+        """
+        await cls.rules()
+        return cls._rules_param
+
+    @staticmethod
+    def rule_param(rule: RateRules) -> Dict[str, Any]:
+        return {
+            "hotel_id": rule.hotel_id,
+            "room_id": rule.room_id,
+            "date_from": rule.date_from.isoformat() if rule.date_from else None,
+            "date_to": rule.date_to.isoformat() if rule.date_to else None,
+            "weekdays": rule.weekdays,
+            "min_occupancy": rule.min_occupancy,
+            "multiplier": rule.multiplier,
+        }
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._rules_loaded_at = None
+
+    @classmethod
+    async def rules_changed(cls, rules: Sequence[RateRules]) -> None:
+        """
+        Правила изменены: копии правил сбрасываются во всех воркерах, а
+        закэшированная выдача с ценами — по отелям, которых касаются rules
+        (у измененного правила — и прежние, и новые значения).
+        """
+        cls.reset()
+        await broadcaster.publish(CHANNEL, {})
+        await search_cache.invalidate(*await cls.rule_tags(rules))
+
+    @classmethod
+    async def on_message(cls, message: Dict[str, Any]) -> None:
+        cls.reset()
+
+    @classmethod
+    def subscribe(cls) -> None:
+        broadcaster.subscribe(CHANNEL, cls.on_message)
+
+    @staticmethod
+    async def rule_tags(rules: Sequence[RateRules]) -> Set[str]:
+        """
+        Теги кэша поиска, которые задевают правила: отель правила или отель
+        его номера; правило без отеля и номера меняет цены везде.
+        """
+        if any(rule.hotel_id is None and rule.room_id is None for rule in rules):
+            return {tags.PRICES}
+        hotel_ids = {rule.hotel_id for rule in rules if rule.hotel_id is not None}
+        room_ids = {rule.room_id for rule in rules if rule.hotel_id is None}
+        if room_ids:
+            async with session_scope() as session:
+                result = await session.execute(
+                    select(Rooms.hotel_id).where(Rooms.id.in_(room_ids))
+                )
+                hotel_ids.update(result.scalars().all())
+        return {tags.hotel(hotel_id) for hotel_id in hotel_ids}
+
+    @classmethod
+    async def rates(
+        cls, rooms: Sequence[Rooms], date_from: date, date_to: date
+    ) -> np.ndarray:
+        """
+        Цены за ночь (номера x ночи с date_from по date_to - 1) за одну векторную
+        оценку. Загрузка номеров читается из room_nights, только если среди
+        правил есть правила по загрузке.
+        """
+        nights = (date_to - date_from).days
+        room_ids = np.array([room.id for room in rooms], dtype=np.int64)
+        rules = await cls.rules()
+        occupancy = None
+        if any(rule.min_occupancy is not None for rule in rules) and len(rooms):
+            occupancy = await cls.occupancy(rooms, date_from, date_to)
+        return nightly_rates(
+            room_ids,
+            np.array([room.hotel_id for room in rooms], dtype=np.int64),
+            np.array([room.price for room in rooms], dtype=np.float64),
+            date_from,
+            nights,
+            rules,
+            occupancy,
+        )
+
+    @staticmethod
+    async def occupancy(
+        rooms: Sequence[Rooms], date_from: date, date_to: date
+    ) -> np.ndarray:
+        """
+        SELECT room_id, night, booked_count FROM room_nights
+        WHERE room_id IN (1, 2, 3) AND night >= '2023-05-15' AND night < '2023-06-20'
+        """
+        index = {room.id: i for i, room in enumerate(rooms)}
+        booked = np.zeros((len(rooms), (date_to - date_from).days))
+        query = select(
+            RoomNights.room_id, RoomNights.night, RoomNights.booked_count
+        ).where(
+            RoomNights.room_id.in_(index),
+            RoomNights.night >= date_from,
+            RoomNights.night < date_to,
+        )
+        async with session_scope(read_only=True) as session:
+            result = await session.execute(query)
+            for room_id, night, booked_count in result.all():
+                booked[index[room_id], (night - date_from).days] = booked_count
+        quantities = np.array(
+            [max(room.quantity, 1) for room in rooms], dtype=np.float64
+        )
+        return booked / quantities[:, None]
+
+    @classmethod
+    async def quote(
+        cls, rooms: Sequence[Rooms], date_from: date, date_to: date
+    ) -> Dict[int, int]:
+        """Стоимость проживания с date_from по date_to в каждом из номеров."""
+        totals = (await cls.rates(rooms, date_from, date_to)).sum(axis=1)
+        return {room.id: int(total) for room, total in zip(rooms, totals)}
+
+    @classmethod
+    async def quote_room(
+        cls, room_id: int, date_from: date, date_to: date
+    ) -> Optional[int]:
+        async with session_scope(read_only=True) as session:
+            result = await session.execute(ROOM, {"room_id": room_id})
+            room = result.scalar_one_or_none()
+        if room is None:
+            return None
+        return (await cls.quote([room], date_from, date_to))[room.id]
+
+    @staticmethod
+    def stay_total(
+        room: Row,
+        date_from: date,
+        date_to: date,
+        rules: Sequence[RateRules],
+        booked: Mapping[Tuple[int, date], int],
+    ) -> int:
+        """
+        Стоимость проживания в номере, заблокированном бронью
+        (BookingService._lock_rooms), по загрузке его ночей booked
+        (room_id, night) -> booked_count, прочитанной под той же блокировкой.
+        Тот же nightly_rates, что и у quote.
+        """
+        nights = (date_to - date_from).days
+        booked_counts = [
+            booked.get((room.id, date_from + timedelta(days=i)), 0)
+            for i in range(nights)
+        ]
+        rates = nightly_rates(
+            np.array([room.id], dtype=np.int64),
+            np.array([room.hotel_id], dtype=np.int64),
+            np.array([room.price], dtype=np.float64),
+            date_from,
+            nights,
+            rules,
+            np.array([booked_counts], dtype=np.float64) / max(room.quantity, 1),
+        )
+        return int(rates.sum())
@@ -1,38 +1,162 @@
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic, Type
-from sqlalchemy import insert, select
-from app.database import async_session_maker
+from typing import Any, Dict, List, Sequence, TypeVar, Generic, Type
+from sqlalchemy import Integer, any_, bindparam, insert, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.database import session_scope, stick_to_primary
 
 T = TypeVar("T")
 
 
+class BulkWritesDisabled(TypeError):
+    """Массовая запись вызвана у сервиса с BULK_WRITES = False."""
+
+
 class BaseService(ABC, Generic[T]):
     model: Type[T]
 
+    # False у сервисов, чьи записи ведут журнал room_nights (брони, сам журнал):
+    # массовые операции пишут строки мимо журнала, поэтому для них запрещены
+    BULK_WRITES = True
+
     @classmethod
     async def find_by_id(cls, model_id: int):
-        async with async_session_maker() as session:
+        async with session_scope(read_only=True) as session:
             query = select(cls.model).filter_by(id=model_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
     async def find_one_or_none(cls, **filter_by):
-        async with async_session_maker() as session:
+        async with session_scope(read_only=True) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
     async def find_all(cls, **filter_by):
-        async with async_session_maker() as session:
+        async with session_scope(read_only=True) as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalars().all()
 
     @classmethod
     async def add(cls, **data):
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = insert(cls.model).values(**data)
             await session.execute(query)
             await session.commit()
+        stick_to_primary()
+
+    @classmethod
+    async def find_many_by_ids(cls, ids: Sequence[int]) -> List[T]:
+        """
+        SELECT * FROM hotels WHERE hotels.id = ANY($1::INTEGER[])
+
+        Список передается одним параметром-массивом: в отличие от IN (...)
+        текст запроса, а с ним и подготовленный asyncpg запрос, не зависят
+        от длины списка. Порядок результата не гарантируется.
+        """
+        async with session_scope(read_only=True) as session:
+            query = select(cls.model).where(
+                cls.model.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))
+            )
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    @classmethod
+    async def bulk_add(cls, rows: Sequence[Dict[str, Any]]) -> List[T]:
+        """
+        INSERT INTO hotels (name, location, ...)
+        VALUES ($1, $2, ...), ($6, $7, ...), ...
+        RETURNING hotels.id, hotels.name, ...
+
+        Один INSERT на каждые 1000 строк (insertmanyvalues_page_size);
+        новые объекты возвращаются в порядке rows.
+
+        Дополнительная работа add подклассов здесь не выполняется; кэши
+        подклассы сбрасывают в _bulk_changed.
+        """
+        cls._check_bulk_writes()
+        if not rows:
+            return []
+        async with session_scope() as session:
+            query = insert(cls.model).returning(cls.model, sort_by_parameter_order=True)
+            result = await session.scalars(query, rows)
+            added = result.all()
+            await session.commit()
+        stick_to_primary()
+        await cls._bulk_changed(rows)
+        return added
+
+    @classmethod
+    async def bulk_update(cls, rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        UPDATE hotels SET name=$1, ... WHERE hotels.id = $3
+
+        В каждой строке первичный ключ и новые значения. Строки с одинаковым
+        набором полей уходят одним executemany: запрос готовится один раз,
+        а параметры отправляются в Postgres пачкой, без ожидания ответа на
+        каждую строку.
+        """
+        cls._check_bulk_writes()
+        if not rows:
+            return
+        async with session_scope() as session:
+            await session.execute(update(cls.model), rows)
+            await session.commit()
+        stick_to_primary()
+        await cls._bulk_changed(rows)
+
+    @classmethod
+    async def copy_add(cls, rows: Sequence[Dict[str, Any]]) -> int:
+        """
+        COPY hotels (name, location, ...) FROM STDIN (FORMAT binary)
+
+        Для загрузок в сотни тысяч строк: asyncpg передает строки потоком
+        в двоичном формате, без разбора SQL и параметров на каждую строку.
+        Набор полей берется из первой строки; значения по умолчанию на
+        стороне Python (default=) не подставляются, RETURNING нет.
+        """
+        cls._check_bulk_writes()
+        if not rows:
+            return 0
+        table = cls.model.__table__
+        columns = list(rows[0])
+        async with session_scope() as session:
+            connection = await session.connection()
+            dialect = connection.dialect
+            processors = [
+                table.c[name].type.bind_processor(dialect) for name in columns
+            ]
+            records = [
+                tuple(
+                    process(row[name]) if process else row[name]
+                    for name, process in zip(columns, processors)
+                )
+                for row in rows
+            ]
+            # COPY идет мимо SQLAlchemy: запрос открывает ее транзакцию, чтобы
+            # COPY попал в нее и фиксировался вместе с остальной сессией
+            await session.execute(text("SELECT 1"))
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name, schema_name=table.schema, columns=columns, records=records
+            )
+            await session.commit()
+        stick_to_primary()
+        await cls._bulk_changed(rows)
+        return len(records)
+
+    @classmethod
+    def _check_bulk_writes(cls) -> None:
+        if not cls.BULK_WRITES:
+            raise BulkWritesDisabled(
+                f"{cls.__name__}: массовая запись обошла бы журнал room_nights"
+            )
+
+    @classmethod
+    async def _bulk_changed(cls, rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        Вызывается после фиксации bulk_add, bulk_update и copy_add;
+        rows — переданные строки.
+        """
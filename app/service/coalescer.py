@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+from prometheus_client import Histogram
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+COALESCER_BATCH = Histogram(
+    "coalescer_batch_size",
+    "Размер пачки, выполненной одним вызовом",
+    ["coalescer"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+class Coalescer(Generic[T, R]):
+    """
+    Микропакеты: вызовы submit за max_delay секунд (или до max_batch штук)
+    выполняются одним вызовом handler, и каждый получает свой результат.
+
+    handler получает список запросов и возвращает результаты в том же
+    порядке. Ошибка handler достается всем запросам пачки. Очередь своя
+    у каждого воркера; пачки выполняются параллельно друг другу.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch: int,
+        max_delay: float,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = (
+                self._pending[: self.max_batch],
+                self._pending[self.max_batch :],
+            )
+            # Пачка общая для нескольких запросов, поэтому выполняется в пустом
+            # контексте: иначе handler унаследовал бы контекстные переменные
+            # (сессию БД) одного из них
+            task = asyncio.get_running_loop().create_task(
+                self._run(batch), context=contextvars.Context()
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        COALESCER_BATCH.labels(self.name).observe(len(batch))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import heapq
+import json
+from datetime import date
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement, Select, literal, tuple_
+
+from app.exceptions import InvalidCursorException
+
+T = TypeVar("T")
+
+SortOrder = Literal["asc", "desc"]
+
+
+class SPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(sort: str, order: SortOrder, key: Sequence[Any]) -> str:
+    raw = json.dumps({"sort": sort, "order": order, "key": list(key)}, default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str], sort: str, order: SortOrder, types: Sequence[type]
+) -> Optional[List[Any]]:
+    """
+    Ключ последней строки предыдущей страницы. Курсор действителен только
+    для той же сортировки, с которой был выдан. Значения ключа проверяются
+    по types — типам столбцов сортировки (date приходит строкой ISO): курсор
+    от клиента, и подделанный должен давать 400, а не ошибку БД.
+    """
+    if cursor is None:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["sort"] != sort or data["order"] != order:
+            raise InvalidCursorException
+        key = data["key"]
+        if not isinstance(key, list) or len(key) != len(types):
+            raise InvalidCursorException
+        return [
+            cursor_value(value, value_type) for value, value_type in zip(key, types)
+        ]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursorException
+
+
+def cursor_value(value: Any, value_type: type) -> Any:
+    if value_type is date:
+        return date.fromisoformat(value)
+    # bool — подкласс int; значение должно помещаться в integer Postgres
+    if not isinstance(value, value_type) or isinstance(value, bool):
+        raise InvalidCursorException
+    if value_type is int and not -(2**31) <= value < 2**31:
+        raise InvalidCursorException
+    return value
+
+
+def keyset(
+    query: Select,
+    columns: Sequence[ColumnElement],
+    after: Optional[Sequence[Any]],
+    order: SortOrder,
+    limit: int,
+    having: bool = False,
+) -> Select:
+    """
+    Страница после ключа after без OFFSET:
+
+    WHERE (rooms.price, rooms.id) > (5000, 17) ORDER BY rooms.price, rooms.id LIMIT 21
+
+    Последний столбец должен быть уникальным (id). Берется на одну строку
+    больше limit — по ней видно, есть ли следующая страница. Для сортировки
+    по агрегату условие уходит в HAVING.
+    """
+    if after is not None:
+        row, key = tuple_(*columns), tuple_(*(literal(value) for value in after))
+        condition = row < key if order == "desc" else row > key
+        query = query.having(condition) if having else query.where(condition)
+    return query.order_by(
+        *(column.desc() if order == "desc" else column.asc() for column in columns)
+    ).limit(limit + 1)
+
+
+def keyset_rows(
+    rows: Sequence[T],
+    key: Callable[[T], Tuple],
+    after: Optional[Sequence[Any]],
+    order: SortOrder,
+    limit: int,
+) -> List[T]:
+    """
+    То же, что keyset, для строк, уже загруженных в память: один проход
+    по всем строкам, O(строк * log limit), без сортировки всего списка.
+    """
+    if after is not None:
+        after = tuple(after)
+        rows = [
+            row
+            for row in rows
+            if (key(row) < after if order == "desc" else key(row) > after)
+        ]
+    first = heapq.nlargest if order == "desc" else heapq.nsmallest
+    return first(limit + 1, rows, key=key)
+
+
+def page(
+    rows: List[T],
+    key: Callable[[T], Sequence[Any]],
+    sort: str,
+    order: SortOrder,
+    limit: int,
+) -> Tuple[List[T], Optional[str]]:
+    """Отрезает лишнюю строку и выдает курсор следующей страницы, если она есть."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort, order, key(rows[-1]))
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 
 from app.config import settings
 
@@ -7,3 +8,12 @@ celery = Celery(
     broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
     include=["app.tasks.tasks"],
 )
+
+celery.conf.beat_schedule = {
+    "maintain-booking-partitions": {
+        "task": "app.tasks.tasks.maintain_booking_partitions",
+        # Раз в сутки: секции создаются на год вперед, так что пропуск запуска
+        # не страшен
+        "schedule": crontab(minute=0, hour=3),
+    },
+}
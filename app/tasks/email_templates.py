@@ -23,3 +23,28 @@ def create_booking_confirmation_template(
         subtype="html",
     )
     return email
+
+
+def create_group_booking_confirmation_template(
+    bookings: list,
+    email_to: EmailStr,
+):
+    email = EmailMessage()
+
+    email["Subject"] = "Подтверждение группового бронирования"
+    email["From"] = settings.SMTP_USER
+    email["To"] = email_to
+
+    stays = "<br>".join(
+        f"Номер {booking['room_id']} с {booking['date_from']} по {booking['date_to']}"
+        for booking in bookings
+    )
+    email.set_content(
+        f"""
+            <h1>Подтвердите бронирование</h1>
+            Вы забронировали {len(bookings)} номеров:<br>
+            {stays}
+        """,
+        subtype="html",
+    )
+    return email
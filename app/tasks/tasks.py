@@ -1,3 +1,4 @@
+import asyncio
 import smtplib
 from pathlib import Path
 from time import sleep
@@ -5,9 +6,16 @@ from time import sleep
 from PIL import Image
 from pydantic import EmailStr
 
+from app.bookings.partitions import BookingPartitionsService
 from app.config import settings
+from app.database import engine
+from app.hotels.models import Hotels  # noqa
 from app.tasks.celery import celery
-from app.tasks.email_templates import create_booking_confirmation_template
+from app.tasks.email_templates import (
+    create_booking_confirmation_template,
+    create_group_booking_confirmation_template,
+)
+from app.users.models import Users  # noqa
 
 
 @celery.task
@@ -34,3 +42,28 @@ def send_booking_confirmation_email(
     with smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT) as server:
         server.login(settings.SMTP_USER, settings.SMTP_PASS)
         server.send_message(msg_content)
+
+
+@celery.task
+def send_group_booking_confirmation_email(
+    bookings: list,
+    email_to: EmailStr,
+):
+    email_to_mock = settings.SMTP_USER
+    msg_content = create_group_booking_confirmation_template(bookings, email_to_mock)
+
+    with smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+        server.login(settings.SMTP_USER, settings.SMTP_PASS)
+        server.send_message(msg_content)
+
+
+@celery.task
+def maintain_booking_partitions():
+    async def maintain():
+        try:
+            return await BookingPartitionsService.maintain()
+        finally:
+            # Соединения пула привязаны к циклу событий, который закроет asyncio.run
+            await engine.dispose()
+
+    return asyncio.run(maintain())
@@ -9,11 +9,14 @@ from httpx import AsyncClient
 from sqlalchemy import insert
 
 from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights  # noqa
+from app.bookings.room_nights.service import RoomNightsService
 from app.config import settings
 from app.database import Base, async_session_maker, engine
 from app.hotels.models import Hotels
 from app.hotels.rooms.models import Rooms
 from app.main import app as fastapi_app
+from app.pricing.models import RateRules  # noqa
 from app.users.models import Users
 
 
@@ -38,6 +41,9 @@ async def prepare_database():
     for booking in bookings:
         booking["date_from"] = datetime.strptime(booking["date_from"], "%Y-%m-%d")
         booking["date_to"] = datetime.strptime(booking["date_to"], "%Y-%m-%d")
+        booking["total_cost"] = (
+            booking["date_to"] - booking["date_from"]
+        ).days * booking["price"]
 
     async with async_session_maker() as session:
         add_hotels = insert(Hotels).values(hotels)
@@ -52,6 +58,8 @@ async def prepare_database():
 
         await session.commit()
 
+    await RoomNightsService.rebuild()
+
 
 # Взято из документации к pytest-asyncio
 @pytest_asyncio.fixture(scope="session")
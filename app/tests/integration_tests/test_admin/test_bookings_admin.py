@@ -0,0 +1,66 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admin.views import BookingsAdmin
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+from app.main import app as fastapi_app
+
+
+@pytest.fixture
+def admin_client():
+    with TestClient(app=fastapi_app) as client:
+        client.post(
+            "/admin/login", data={"username": "test@test.com", "password": "test"}
+        )
+        yield client
+
+
+async def test_admin_booking_keeps_ledger_in_sync(admin_client):
+    form = {
+        "user": "3",
+        "room": "7",
+        "date_from": "2036-06-01",
+        "date_to": "2036-06-04",
+    }
+    response = admin_client.post(
+        "/admin/bookings/create", data=form, follow_redirects=False
+    )
+    assert response.status_code == 302
+
+    # Бронь прошла через book_room: стоимость посчитана, ночи в журнале
+    [booking] = await BookingService.find_all(
+        user_id=3, room_id=7, date_from=date(2036, 6, 1)
+    )
+    assert booking.total_cost == 3 * booking.price
+    assert await RoomNightsService.check() == []
+
+    await BookingsAdmin().delete_model(None, f"{booking.id};{booking.date_to}")
+    assert not await BookingService.find_all(
+        user_id=3, room_id=7, date_from=date(2036, 6, 1)
+    )
+    assert await RoomNightsService.check() == []
+
+
+async def test_admin_booking_urls_use_composite_key(admin_client):
+    booking = await BookingService.add(
+        user_id=3, room_id=7, date_from=date(2036, 7, 1), date_to=date(2036, 7, 3)
+    )
+    pk = f"{booking.id};{booking.date_to}"
+
+    assert admin_client.get("/admin/bookings/list").status_code == 200
+    assert admin_client.get(f"/admin/bookings/details/{pk}").status_code == 200
+    assert (
+        admin_client.get(f"/admin/bookings/details/{booking.id};2036-07-04").status_code
+        == 404
+    )
+    assert admin_client.get(f"/admin/bookings/details/{booking.id}").status_code == 404
+
+    assert (
+        admin_client.delete("/admin/bookings/delete", params={"pks": pk}).status_code
+        == 200
+    )
+    assert await BookingService.find_by_id(booking.id) is None
+    assert await RoomNightsService.check() == []
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import date
+
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+from app.config import settings
+from app.hotels.rooms.service import RoomService
+
+DATE_FROM = date(2034, 8, 1)
+DATE_TO = date(2034, 8, 5)
+
+
+async def test_batch_admits_requests_in_order_until_sold_out():
+    room = await RoomService.find_by_id(10)
+    requests = [(user_id, room.id, DATE_FROM, DATE_TO) for user_id in [1, 2, 3] * 3] + [
+        (1, 100500, DATE_FROM, DATE_TO)
+    ]
+
+    bookings = await BookingService.add_batch(requests)
+
+    assert [booking is not None for booking in bookings] == [True] * room.quantity + [
+        False
+    ] * (len(requests) - room.quantity)
+    for (user_id, room_id, _, _), booking in zip(requests, bookings):
+        if booking:
+            assert (booking.user_id, booking.room_id) == (user_id, room_id)
+    assert await RoomNightsService.check() == []
+
+
+async def test_coalesced_adds_share_transactions(monkeypatch):
+    monkeypatch.setattr(settings, "BOOKING_COALESCE", True)
+    batches = []
+    add_batch = BookingService.add_batch.__func__
+
+    async def counting(cls, requests):
+        batches.append(len(requests))
+        return await add_batch(cls, requests)
+
+    monkeypatch.setattr(BookingService, "add_batch", classmethod(counting))
+    monkeypatch.setattr(BookingService, "_coalescer", None)
+
+    bookings = await asyncio.gather(
+        *(
+            BookingService.add(1, 11, date(2034, 9, 1), date(2034, 9, 3))
+            for _ in range(30)
+        )
+    )
+
+    assert all(bookings)
+    assert len({booking.id for booking in bookings}) == 30
+    assert sum(batches) == 30 and len(batches) < 30
+    assert await RoomNightsService.check() == []
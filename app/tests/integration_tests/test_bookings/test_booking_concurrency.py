@@ -0,0 +1,69 @@
+import asyncio
+import time
+from datetime import date
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+from app.bookings.models import Bookings
+from app.hotels.rooms.service import RoomService
+from app.logger import logger
+from app.main import app as fastapi_app
+
+ROOM_ID = 10
+DATE_FROM = date(2032, 1, 1)
+DATE_TO = date(2032, 1, 5)
+REQUESTS = 200
+# В тестах NullPool: каждый запрос открывает свое соединение, держимся
+# ниже max_connections
+MAX_CONNECTIONS = 50
+
+
+async def test_concurrent_bookings_do_not_overbook(session):
+    room = await RoomService.find_by_id(ROOM_ID)
+    semaphore = asyncio.Semaphore(MAX_CONNECTIONS)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=fastapi_app), base_url="http://test"
+    ) as ac:
+        response = await ac.post(
+            "/v1/auth/login", json={"email": "test@test.com", "password": "test"}
+        )
+        assert response.status_code == 200
+
+        async def book():
+            async with semaphore:
+                return await ac.post(
+                    "/v1/bookings",
+                    params={
+                        "room_id": ROOM_ID,
+                        "date_from": str(DATE_FROM),
+                        "date_to": str(DATE_TO),
+                    },
+                )
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[book() for _ in range(REQUESTS)])
+        elapsed = time.perf_counter() - start
+
+    status_codes = [response.status_code for response in responses]
+    logger.info(
+        "Concurrent booking throughput",
+        extra={
+            "requests": REQUESTS,
+            "seconds": round(elapsed, 3),
+            "rps": round(REQUESTS / elapsed, 1),
+        },
+    )
+
+    assert status_codes.count(200) == room.quantity
+    assert status_codes.count(409) == REQUESTS - room.quantity
+
+    booked = await session.execute(
+        select(func.count(Bookings.id)).where(
+            Bookings.room_id == ROOM_ID,
+            Bookings.date_from < DATE_TO,
+            Bookings.date_to > DATE_FROM,
+        )
+    )
+    assert booked.scalar() == room.quantity
@@ -0,0 +1,65 @@
+import base64
+import json
+
+import pytest
+
+from app.bookings.service import BookingService
+from app.database import async_session_maker
+from app.exceptions import InvalidCursorException
+
+
+async def all_user_bookings(user_id: int):
+    async with async_session_maker() as session:
+        result = await session.execute(BookingService.user_bookings_query(user_id))
+        return [BookingService.booking_info(row) for row in result.all()]
+
+
+@pytest.mark.parametrize("user_id", [1, 3])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_history_pages_cover_all_bookings_in_order(user_id, order):
+    bookings, cursor = [], None
+    while True:
+        page, cursor = await BookingService.user_bookings_page(
+            user_id, order, cursor, limit=1
+        )
+        bookings.extend(page)
+        if cursor is None:
+            break
+
+    expected = await all_user_bookings(user_id)
+    assert sorted(booking.id for booking in bookings) == sorted(
+        booking.id for booking in expected
+    )
+    keys = [(booking.date_from, booking.id) for booking in bookings]
+    assert keys == sorted(keys, reverse=order == "desc")
+
+
+@pytest.mark.parametrize("user_id", [1, 3])
+async def test_stream_yields_every_booking(user_id):
+    streamed = [
+        booking async for booking in BookingService.stream_user_bookings(user_id)
+    ]
+
+    expected = await all_user_bookings(user_id)
+    assert sorted(streamed, key=lambda booking: booking.id) == sorted(
+        expected, key=lambda booking: booking.id
+    )
+
+
+@pytest.mark.parametrize(
+    "key",
+    [
+        [2030, 1],
+        ["2030-05-01", "1"],
+        ["not a date", 1],
+        ["2030-05-01", 2**40],
+        ["2030-05-01"],
+        "2030-05-01",
+    ],
+)
+async def test_tampered_cursor_is_rejected(key):
+    # Курсор виден клиенту: подмененный ключ — 400, а не ошибка запроса к БД
+    raw = json.dumps({"sort": "date_from", "order": "desc", "key": key})
+    cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+    with pytest.raises(InvalidCursorException):
+        await BookingService.user_bookings_page(1, "desc", cursor, limit=1)
@@ -0,0 +1,67 @@
+from datetime import date
+
+from sqlalchemy import func, select
+
+from app.bookings.models import Bookings
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+from app.pricing.service import PricingService
+
+DATE_FROM = date(2033, 3, 1)
+DATE_TO = date(2033, 3, 6)
+
+
+async def count_bookings(session) -> int:
+    return (await session.execute(select(func.count()).select_from(Bookings))).scalar()
+
+
+async def test_group_booking_adds_all_stays(session):
+    stays = [
+        (3, DATE_FROM, DATE_TO),
+        (4, DATE_FROM, DATE_TO),
+        (3, date(2033, 3, 4), date(2033, 3, 9)),
+    ]
+
+    bookings = await BookingService.add_group(2, stays)
+
+    assert [
+        (booking.room_id, booking.date_from, booking.date_to) for booking in bookings
+    ] == stays
+    for booking in bookings:
+        assert booking.user_id == 2
+        assert booking.total_cost == await PricingService.quote_room(
+            booking.room_id, booking.date_from, booking.date_to
+        )
+    assert await RoomNightsService.check() == []
+
+
+async def test_group_booking_is_all_or_nothing(session):
+    # Номер 10: 7 штук; в группе 8 броней на пересекающиеся ночи
+    stays = [(9, DATE_FROM, DATE_TO)] + [(10, DATE_FROM, DATE_TO)] * 8
+    before = await count_bookings(session)
+
+    assert await BookingService.add_group(2, stays) is None
+    assert await count_bookings(session) == before
+    assert await RoomNightsService.check() == []
+
+
+async def test_group_booking_rejects_unknown_room(session):
+    assert (
+        await BookingService.add_group(
+            2, [(3, DATE_FROM, DATE_TO), (100500, DATE_FROM, DATE_TO)]
+        )
+        is None
+    )
+
+
+def test_group_booking_api(authenticated_client):
+    response = authenticated_client.post(
+        "/v1/bookings/group",
+        json=[
+            {"room_id": 5, "date_from": "2033-04-01", "date_to": "2033-04-03"},
+            {"room_id": 6, "date_from": "2033-04-01", "date_to": "2033-04-03"},
+        ],
+    )
+
+    assert response.status_code == 200
+    assert [booking["room_id"] for booking in response.json()] == [5, 6]
@@ -0,0 +1,204 @@
+import asyncio
+from datetime import date
+
+import pytest_asyncio
+from redis import asyncio as aioredis
+
+from app.bookings.holds.store import HoldStore
+from app.bookings.service import BookingService
+from app.config import settings
+
+DATE_FROM = date(2034, 2, 1)
+DATE_TO = date(2034, 2, 4)
+
+
+@pytest_asyncio.fixture
+async def store():
+    redis = aioredis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}")
+    store = HoldStore("test_holds", ttl=60)
+    store.init(redis)
+    yield store
+    async for key in redis.scan_iter("test_holds:*"):
+        await redis.delete(key)
+    await redis.close()
+
+
+async def test_holds_stop_at_rooms_left(store):
+    holds = [
+        await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=3) for _ in range(4)
+    ]
+
+    assert all(holds[:3])
+    assert holds[3] is None
+    # Другие ночи того же номера свободны
+    assert await store.hold(1, 10, 5, DATE_TO, date(2034, 2, 6), rooms_left=3)
+
+    assert await store.release(holds[0])
+    assert not await store.release(holds[0])
+    assert await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=3)
+
+
+async def test_concurrent_holds_do_not_oversell(store):
+    holds = await asyncio.gather(
+        *(store.hold(1, 11, 6, DATE_FROM, DATE_TO, rooms_left=5) for _ in range(50))
+    )
+
+    assert len([hold for hold in holds if hold]) == 5
+
+
+async def test_held_counts_take_busiest_night(store):
+    await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=5)
+    await store.hold(1, 10, 5, date(2034, 2, 3), date(2034, 2, 5), rooms_left=5)
+    await store.hold(1, 9, 5, date(2034, 2, 3), date(2034, 2, 4), rooms_left=5)
+
+    assert await store.held_rooms([9, 10, 11], DATE_FROM, DATE_TO) == {
+        9: 1,
+        10: 2,
+        11: 0,
+    }
+    assert await store.held_hotels([5, 6], DATE_FROM, DATE_TO) == {5: 3, 6: 0}
+    assert await store.held_rooms([10], DATE_FROM, date(2034, 2, 3)) == {10: 1}
+
+
+async def test_expired_holds_free_inventory(store):
+    store.ttl = 1
+    assert await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=1)
+    assert await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=1) is None
+
+    await asyncio.sleep(1.1)
+
+    assert await store.held_rooms([10], DATE_FROM, DATE_TO) == {10: 0}
+    assert await store.hold(1, 10, 5, DATE_FROM, DATE_TO, rooms_left=1)
+
+
+def test_hold_confirm_flow(authenticated_client):
+    params = {"date_from": "2034-03-01", "date_to": "2034-03-03"}
+
+    def rooms_left():
+        rooms = authenticated_client.get("/v1/hotels/3/rooms", params=params).json()
+        return {room["id"]: room["rooms_left"] for room in rooms}[6]
+
+    before = rooms_left()
+    response = authenticated_client.post(
+        "/v1/bookings/holds", params={"room_id": 6, **params}
+    )
+    assert response.status_code == 200
+    hold_id = response.json()["id"]
+    assert rooms_left() == before - 1
+
+    response = authenticated_client.post(f"/v1/bookings/holds/{hold_id}/confirm")
+    assert response.status_code == 200
+    assert response.json()["room_id"] == 6
+    # Удержание стало бронью: номер занят ровно один раз
+    assert rooms_left() == before - 1
+    assert (
+        authenticated_client.post(f"/v1/bookings/holds/{hold_id}/confirm").status_code
+        == 404
+    )
+
+
+def room_rooms_left(
+    client, hotel_id: int, room_id: int, params, version: int = 1
+) -> int:
+    rooms = client.get(f"/v{version}/hotels/{hotel_id}/rooms", params=params).json()
+    if version == 2:
+        rooms = rooms["items"]
+    return {room["id"]: room["rooms_left"] for room in rooms}[room_id]
+
+
+def test_booking_does_not_take_held_rooms(authenticated_client):
+    params = {"date_from": "2034-04-01", "date_to": "2034-04-03"}
+    rooms_left = room_rooms_left(authenticated_client, 1, 1, params)
+    holds = [
+        authenticated_client.post(
+            "/v1/bookings/holds", params={"room_id": 1, **params}
+        ).json()["id"]
+        for _ in range(rooms_left)
+    ]
+
+    # Все свободные номера удержаны: бронь без удержания не проходит
+    assert (
+        authenticated_client.post(
+            "/v1/bookings", params={"room_id": 1, **params}
+        ).status_code
+        == 409
+    )
+
+    # Подтверждение не вычитает собственное удержание
+    assert (
+        authenticated_client.post(f"/v1/bookings/holds/{holds[0]}/confirm").status_code
+        == 200
+    )
+    for hold_id in holds[1:]:
+        assert (
+            authenticated_client.delete(f"/v1/bookings/holds/{hold_id}").status_code
+            == 204
+        )
+    assert (
+        authenticated_client.post(
+            "/v1/bookings", params={"room_id": 1, **params}
+        ).status_code
+        == 200
+    )
+
+
+def test_pages_subtract_holds(authenticated_client):
+    params = {"date_from": "2034-05-01", "date_to": "2034-05-03"}
+
+    def hotel_rooms_left():
+        hotels = authenticated_client.get("/v2/hotels/Сыктывкар", params=params).json()[
+            "items"
+        ]
+        return {hotel["id"]: hotel["rooms_left"] for hotel in hotels}[5]
+
+    hotel_before = hotel_rooms_left()
+    room_before = room_rooms_left(authenticated_client, 5, 10, params, version=2)
+    response = authenticated_client.post(
+        "/v1/bookings/holds", params={"room_id": 10, **params}
+    )
+    assert response.status_code == 200
+
+    assert hotel_rooms_left() == hotel_before - 1
+    assert (
+        room_rooms_left(authenticated_client, 5, 10, params, version=2)
+        == room_before - 1
+    )
+
+    assert (
+        authenticated_client.delete(
+            f"/v1/bookings/holds/{response.json()['id']}"
+        ).status_code
+        == 204
+    )
+    assert hotel_rooms_left() == hotel_before
+    assert (
+        room_rooms_left(authenticated_client, 5, 10, params, version=2) == room_before
+    )
+
+
+def test_failed_confirm_keeps_hold(authenticated_client, monkeypatch):
+    params = {"date_from": "2034-06-01", "date_to": "2034-06-03"}
+    before = room_rooms_left(authenticated_client, 3, 6, params)
+    hold_id = authenticated_client.post(
+        "/v1/bookings/holds", params={"room_id": 6, **params}
+    ).json()["id"]
+
+    async def fail(*args, **kwargs):
+        return None
+
+    with monkeypatch.context() as patch:
+        patch.setattr(BookingService, "add", fail)
+        assert (
+            authenticated_client.post(
+                f"/v1/bookings/holds/{hold_id}/confirm"
+            ).status_code
+            == 409
+        )
+
+    # Бронь не записана, а номер по-прежнему удержан и удержание можно подтвердить снова
+    assert room_rooms_left(authenticated_client, 3, 6, params) == before - 1
+    assert (
+        authenticated_client.post(f"/v1/bookings/holds/{hold_id}/confirm").status_code
+        == 200
+    )
+    assert room_rooms_left(authenticated_client, 3, 6, params) == before - 1
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException, Response
+from redis import asyncio as aioredis
+
+from app.config import settings
+from app.database import RequestSessions, request_sessions
+from app.exceptions import IdempotencyKeyReusedException, RoomCannotBeBookedException
+from app.idempotency import Idempotency
+
+PARAMS = {"room_id": 1, "date_from": "2034-05-01", "date_to": "2034-05-03"}
+
+
+@pytest_asyncio.fixture
+async def redis():
+    redis = aioredis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}")
+    yield redis
+    async for key in redis.scan_iter("test_idempotency:*"):
+        await redis.delete(key)
+    await redis.close()
+
+
+def store(redis) -> Idempotency:
+    idempotency = Idempotency("test_idempotency", ttl=60)
+    idempotency.init(redis)
+    return idempotency
+
+
+async def test_repeat_returns_first_result(redis):
+    idempotency = store(redis)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"id": len(calls)}
+
+    assert await idempotency.run("key", PARAMS, compute) == {"id": 1}
+    assert await idempotency.run("key", PARAMS, compute) == {"id": 1}
+    assert await store(redis).run("key", PARAMS, compute) == {"id": 1}
+    assert await idempotency.run("other", PARAMS, compute) == {"id": 2}
+
+
+async def test_concurrent_duplicates_wait_for_first(redis):
+    workers = [store(redis), store(redis)]
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return {"id": 1}
+
+    results = await asyncio.gather(
+        *(workers[i % 2].run("key", PARAMS, compute) for i in range(20))
+    )
+
+    assert len(calls) == 1
+    assert results == [{"id": 1}] * 20
+
+
+async def test_compute_survives_disconnect_outside_request_session(redis):
+    idempotency = store(redis)
+    seen = []
+    finished = asyncio.Event()
+
+    async def compute():
+        seen.append(request_sessions.get())
+        await asyncio.sleep(0.1)
+        finished.set()
+        return {"id": 1}
+
+    sessions = RequestSessions(Response(), read_primary=True)
+    token = request_sessions.set(sessions)
+    try:
+        # Клиент отключился, не дождавшись ответа
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(idempotency.run("key", PARAMS, compute), 0.01)
+    finally:
+        request_sessions.reset(token)
+        await sessions.close()
+
+    await asyncio.wait_for(finished.wait(), 1)
+    assert seen == [None]
+    assert await idempotency.run("key", PARAMS, compute) == {"id": 1}
+
+
+async def test_booking_errors_are_replayed(redis):
+    idempotency = store(redis)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        raise RoomCannotBeBookedException
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            await idempotency.run("key", PARAMS, compute)
+        assert e.value.status_code == 409
+    assert len(calls) == 1
+
+
+async def test_unexpected_errors_are_not_stored(redis):
+    idempotency = store(redis)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError
+        return {"id": 1}
+
+    with pytest.raises(RuntimeError):
+        await idempotency.run("key", PARAMS, compute)
+    assert await idempotency.run("key", PARAMS, compute) == {"id": 1}
+
+
+async def test_key_reuse_with_other_params_is_rejected(redis):
+    idempotency = store(redis)
+
+    async def compute():
+        return {"id": 1}
+
+    await idempotency.run("key", PARAMS, compute)
+    with pytest.raises(IdempotencyKeyReusedException):
+        await idempotency.run("key", {**PARAMS, "room_id": 2}, compute)
+
+
+def test_booking_retry_with_same_key(authenticated_client):
+    params = {"room_id": 7, "date_from": "2034-06-01", "date_to": "2034-06-03"}
+    headers = {"Idempotency-Key": "test-booking-retry"}
+
+    first = authenticated_client.post("/v1/bookings", params=params, headers=headers)
+    second = authenticated_client.post("/v1/bookings", params=params, headers=headers)
+    other = authenticated_client.post(
+        "/v1/bookings", params=params, headers={"Idempotency-Key": "test-other"}
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert other.json()["id"] != first.json()["id"]
@@ -0,0 +1,90 @@
+import json
+from datetime import date
+
+from sqlalchemy import text
+
+from app.bookings.partitions import BookingPartitionsService
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+
+# Месяцы далеко впереди: секции и брони тестов не задевают остальные данные
+
+
+async def partition_of(session, booking_id: int) -> str:
+    result = await session.execute(
+        text("SELECT tableoid::regclass::text FROM bookings WHERE id = :id"),
+        {"id": booking_id},
+    )
+    partition = result.scalar_one()
+    # Не держим блокировку bookings: ATTACH ждал бы конца транзакции теста
+    await session.commit()
+    return partition
+
+
+async def test_new_partition_takes_bookings_from_default(session):
+    booking = await BookingService.add(
+        user_id=1, room_id=4, date_from=date(2040, 3, 10), date_to=date(2040, 3, 12)
+    )
+    assert booking
+    assert await partition_of(session, booking.id) == "bookings_default"
+
+    created = await BookingPartitionsService.ensure_partitions(
+        today=date(2040, 3, 5), months_ahead=1
+    )
+    assert created == ["bookings_y2040m03", "bookings_y2040m04"]
+    assert await partition_of(session, booking.id) == "bookings_y2040m03"
+
+    assert (
+        await BookingPartitionsService.ensure_partitions(
+            today=date(2040, 3, 5), months_ahead=1
+        )
+        == []
+    )
+    assert await BookingService.delete(booking.id)
+
+
+async def test_find_all_prunes_partitions(session):
+    await BookingPartitionsService.ensure_partitions(
+        today=date(2040, 3, 1), months_ahead=1
+    )
+    sql = BookingService.find_all_query(date_from=date(2040, 4, 2)).compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    await session.commit()
+
+    plan_text = json.dumps(plan)
+    assert "bookings_y2040m04" in plan_text
+    assert "bookings_y2040m03" not in plan_text
+
+
+async def test_archive_detaches_old_partitions(session):
+    await session.execute(text("DROP TABLE IF EXISTS archive.bookings_y2040m03"))
+    await session.commit()
+    await BookingPartitionsService.ensure_partitions(
+        today=date(2040, 3, 1), months_ahead=1
+    )
+    booking = await BookingService.add(
+        user_id=1, room_id=4, date_from=date(2040, 2, 27), date_to=date(2040, 3, 2)
+    )
+    assert booking
+
+    assert await BookingPartitionsService.archive(before=date(2040, 4, 1)) == [
+        "bookings_y2040m03"
+    ]
+
+    assert await BookingService.find_one_or_none(id=booking.id) is None
+    result = await session.execute(
+        text("SELECT count(*) FROM archive.bookings_y2040m03 WHERE id = :id"),
+        {"id": booking.id},
+    )
+    assert result.scalar_one() == 1
+    # Ночи архивной брони сняты с журнала
+    assert await RoomNightsService.check() == []
+
+    await session.execute(text("DROP TABLE archive.bookings_y2040m03"))
+    await session.commit()
@@ -0,0 +1,80 @@
+from collections import Counter
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.database import READ_PRIMARY_COOKIE, engine, replica_engine
+from app.main import app as fastapi_app
+
+# В тестах реплика — второй пул к той же тестовой БД (TEST_REPLICA_DB_HOST),
+# поэтому проверяется, в какой пул ушел запрос, а не отставание данных
+pytestmark = pytest.mark.skipif(
+    replica_engine is None, reason="TEST_REPLICA_DB_HOST не задан"
+)
+
+
+@contextmanager
+def count_checkouts_by_db():
+    checkouts = Counter()
+    listeners = []
+    for db, pool_engine in (("primary", engine), ("replica", replica_engine)):
+
+        def on_checkout(*args, db=db):
+            checkouts[db] += 1
+
+        event.listen(pool_engine.sync_engine, "checkout", on_checkout)
+        listeners.append((pool_engine.sync_engine, on_checkout))
+    try:
+        yield checkouts
+    finally:
+        for sync_engine, on_checkout in listeners:
+            event.remove(sync_engine, "checkout", on_checkout)
+
+
+def test_reads_go_to_replica_until_own_write():
+    with TestClient(app=fastapi_app) as client:
+        client.post("/auth/login", json={"email": "test@test.com", "password": "test"})
+
+        with count_checkouts_by_db() as checkouts:
+            assert client.get("/v1/bookings").status_code == 200
+        assert checkouts == {"replica": 1}
+
+        params = {"room_id": 5, "date_from": "2036-04-01", "date_to": "2036-04-03"}
+        with count_checkouts_by_db() as checkouts:
+            response = client.post("/v1/bookings", params=params)
+        assert response.status_code == 200
+        assert checkouts["replica"] == 0
+        assert client.cookies[READ_PRIMARY_COOKIE]
+
+        # Сразу после своей брони клиент читает основную БД
+        with count_checkouts_by_db() as checkouts:
+            bookings = client.get("/v1/bookings").json()
+        assert checkouts == {"primary": 1}
+        assert response.json()["id"] in [booking["id"] for booking in bookings]
+
+        # Окно закрепления истекло
+        client.cookies.delete(READ_PRIMARY_COOKIE)
+        with count_checkouts_by_db() as checkouts:
+            assert client.get("/v1/bookings").status_code == 200
+        assert checkouts == {"replica": 1}
+
+        assert client.delete(f"/v1/bookings/{response.json()['id']}").status_code == 204
+
+
+def test_search_cache_miss_reads_replica():
+    # Выдачу считает вычисление кэша вне запроса, в пустом контексте
+    with TestClient(app=fastapi_app) as client:
+        client.portal.call(search_cache.invalidate, tags.HOTELS)
+        params = {"date_from": "2036-05-11", "date_to": "2036-05-13"}
+        with count_checkouts_by_db() as checkouts:
+            assert client.get("/v1/hotels/Алтай", params=params).status_code == 200
+        assert checkouts == {"replica": 1}
+
+        # Повтор — из кэша, без соединения
+        with count_checkouts_by_db() as checkouts:
+            assert client.get("/v1/hotels/Алтай", params=params).status_code == 200
+        assert not checkouts
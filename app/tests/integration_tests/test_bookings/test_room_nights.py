@@ -0,0 +1,35 @@
+from datetime import date
+
+from sqlalchemy import delete
+
+from app.bookings.room_nights.models import RoomNights
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+
+
+async def test_room_nights_follow_bookings():
+    booking = await BookingService.add(
+        user_id=1,
+        room_id=3,
+        date_from=date(2031, 3, 1),
+        date_to=date(2031, 3, 4),
+    )
+    assert booking
+
+    nights = await RoomNightsService.find_all(room_id=3)
+    assert {night.night for night in nights} >= set(
+        RoomNightsService.nights(date(2031, 3, 1), date(2031, 3, 4))
+    )
+    assert await RoomNightsService.check() == []
+
+    assert await BookingService.delete(booking.id)
+    assert await RoomNightsService.check() == []
+
+
+async def test_room_nights_rebuild(session):
+    await session.execute(delete(RoomNights))
+    await session.commit()
+    assert await RoomNightsService.check()
+
+    await RoomNightsService.rebuild()
+    assert await RoomNightsService.check() == []
@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, text
+
+from app.bookings.models import Bookings
+from app.bookings.service import BookingService
+from app.database import (
+    async_session_maker,
+    engine,
+    replica_engine,
+    session_scope,
+    unit_of_work,
+)
+from app.hotels.rooms.service import RoomService
+
+
+@contextmanager
+def count_checkouts():
+    checkouts = []
+
+    def on_checkout(*args):
+        checkouts.append(1)
+
+    # Чтения GET-запросов могут идти в реплику: считаем соединения обоих пулов
+    engines = [e.sync_engine for e in (engine, replica_engine) if e is not None]
+    for pool_engine in engines:
+        event.listen(pool_engine, "checkout", on_checkout)
+    try:
+        yield checkouts
+    finally:
+        for pool_engine in engines:
+            event.remove(pool_engine, "checkout", on_checkout)
+
+
+@contextmanager
+def count_commits():
+    commits = []
+
+    def on_commit(*args):
+        commits.append(1)
+
+    event.listen(engine.sync_engine, "commit", on_commit)
+    try:
+        yield commits
+    finally:
+        event.remove(engine.sync_engine, "commit", on_commit)
+
+
+async def committed(booking_id: int) -> bool:
+    async with async_session_maker() as other:
+        result = await other.execute(
+            select(Bookings.id).where(Bookings.id == booking_id)
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def test_writes_commit_in_their_service_call():
+    # Отель номера уже в кэше: оповещение после брони не открывает новую транзакцию
+    await RoomService.hotel_id_of(5)
+    work = unit_of_work(
+        Request({"type": "http", "method": "POST", "headers": []}), Response()
+    )
+    await anext(work)
+    booking = None
+    try:
+        booking = await BookingService.add(
+            user_id=1, room_id=5, date_from=date(2036, 3, 1), date_to=date(2036, 3, 3)
+        )
+        # Запрос еще идет, а бронь уже видна другим сессиям
+        assert await committed(booking.id)
+
+        # Откат упавшего блока не задевает записи предыдущих вызовов
+        with pytest.raises(RuntimeError):
+            async with session_scope() as session:
+                await session.execute(text("SELECT 1"))
+                raise RuntimeError
+        assert await committed(booking.id)
+
+        # После обработчика фиксировать нечего
+        with count_commits() as commits, pytest.raises(StopAsyncIteration):
+            await anext(work)
+        assert commits == []
+    finally:
+        await work.aclose()
+        if booking:
+            await BookingService.delete(booking.id)
+
+
+def test_get_bookings_uses_one_connection(authenticated_client: TestClient):
+    # Пользователь из get_current_user и брони читаются в одной сессии запроса
+    with count_checkouts() as checkouts:
+        response = authenticated_client.get("/v1/bookings")
+
+    assert response.status_code == 200
+    assert len(checkouts) == 1
+
+
+def test_delete_booking_uses_one_connection(authenticated_client: TestClient):
+    params = {"room_id": 5, "date_from": "2036-02-01", "date_to": "2036-02-03"}
+    booking = authenticated_client.post("/v1/bookings", params=params).json()
+
+    with count_checkouts() as checkouts:
+        response = authenticated_client.delete(f"/v1/bookings/{booking['id']}")
+
+    assert response.status_code == 204
+    assert len(checkouts) == 1
+
+
+def test_add_booking_uses_one_connection(authenticated_client: TestClient, monkeypatch):
+    # Отеля номера нет в кэше: оповещение после фиксации брони читает его
+    # на том же соединении
+    monkeypatch.setattr(RoomService, "_hotel_ids", {})
+    params = {"room_id": 5, "date_from": "2036-02-05", "date_to": "2036-02-07"}
+
+    with count_checkouts() as checkouts:
+        response = authenticated_client.post("/v1/bookings", params=params)
+
+    assert response.status_code == 200
+    assert len(checkouts) == 1
+    assert RoomService._hotel_ids
+    assert (
+        authenticated_client.delete(f"/v1/bookings/{response.json()['id']}").status_code
+        == 204
+    )
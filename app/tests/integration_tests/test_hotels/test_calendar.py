@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.hotels.rooms.service import RoomService
+
+
+@pytest.mark.parametrize(
+    "hotel_id,date_from,date_to",
+    [
+        (1, date(2023, 6, 10), date(2023, 7, 5)),
+        (1, date(2025, 12, 20), date(2026, 1, 20)),
+    ],
+)
+async def test_calendar_matches_per_night_search(hotel_id, date_from, date_to):
+    calendar = await RoomService.calendar(hotel_id, date_from, date_to)
+
+    assert calendar
+    for offset in range((date_to - date_from).days):
+        night = date_from + timedelta(days=offset)
+        rooms = await RoomService.find_available(
+            hotel_id, night, night + timedelta(days=1)
+        )
+        expected = {room.id: rooms_left for room, rooms_left in rooms}
+        assert {
+            room.id: rooms_left[offset] for room, rooms_left in calendar
+        } == expected
+
+
+def test_calendar_rejects_long_range(client):
+    response = client.get(
+        "/v1/hotels/1/calendar", params={"from": "2030-01-01", "to": "2030-06-01"}
+    )
+    assert response.status_code == 400
+    assert str(RoomService.MAX_RANGE_DAYS) in response.json()["detail"]
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from app.hotels.rooms.service import RoomService
+from app.hotels.service import HotelService
+from app.pricing.service import PricingService
+
+DATE_FROM = date(2025, 12, 25)
+DATE_TO = date(2026, 1, 15)
+NIGHTS = 3
+
+
+async def brute_force(hotel_id: int):
+    """Старый способ: поиск номеров и расчет цены на каждую дату заезда."""
+    stays = []
+    start = DATE_FROM
+    while start + timedelta(days=NIGHTS) <= DATE_TO:
+        end = start + timedelta(days=NIGHTS)
+        rooms = [
+            room
+            for room, rooms_left in await RoomService.find_available(
+                hotel_id, start, end
+            )
+            if rooms_left > 0
+        ]
+        for room_id, total_cost in (
+            await PricingService.quote(rooms, start, end)
+        ).items():
+            stays.append((total_cost, start, room_id))
+        start += timedelta(days=1)
+    return sorted(stays)
+
+
+async def test_flexible_rooms_match_per_date_search():
+    expected = await brute_force(1)
+    stays = await RoomService.find_flexible(1, DATE_FROM, DATE_TO, NIGHTS, limit=5)
+
+    assert stays
+    for room_id in {room_id for _, _, room_id in expected}:
+        room_expected = [
+            (cost, start)
+            for cost, start, expected_id in expected
+            if expected_id == room_id
+        ][:5]
+        assert [
+            (stay.total_cost, stay.date_from)
+            for stay in stays
+            if stay.room_id == room_id
+        ] == room_expected
+    assert all(
+        stay.date_to - stay.date_from == timedelta(days=NIGHTS) for stay in stays
+    )
+
+
+async def test_flexible_hotels_pick_cheapest_stays_per_hotel():
+    stays = await HotelService.find_flexible(
+        "Алтай", DATE_FROM, DATE_TO, NIGHTS, limit=2
+    )
+
+    for hotel_id in {stay.hotel_id for stay in stays}:
+        expected = (await brute_force(hotel_id))[:2]
+        got = [
+            (stay.total_cost, stay.date_from, stay.room_id)
+            for stay in stays
+            if stay.hotel_id == hotel_id
+        ]
+        assert got == expected
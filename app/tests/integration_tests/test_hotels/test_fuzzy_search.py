@@ -0,0 +1,23 @@
+from datetime import date
+
+from app.hotels.service import HotelService
+
+
+async def test_fuzzy_search_finds_location_with_typo():
+    assert (
+        await HotelService.find_available("Алтй", date(2030, 5, 1), date(2030, 5, 15))
+        == []
+    )
+
+    hotels = await HotelService.find_available(
+        "Алтй", date(2030, 5, 1), date(2030, 5, 15), fuzzy=True
+    )
+    assert hotels
+    assert all("Алтай" in hotel.location for hotel, _ in hotels)
+
+
+async def test_fuzzy_find_all_ranks_by_similarity():
+    hotels = await HotelService.find_all(location="Сыктывкр", fuzzy=True)
+    assert hotels
+    assert all("Сыктывкар" in hotel.location for hotel in hotels)
+    assert await HotelService.find_all(location="Сыктывкр") == []
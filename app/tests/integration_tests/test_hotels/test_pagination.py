@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from app.exceptions import InvalidCursorException
+from app.hotels.rooms.service import RoomService
+from app.hotels.service import HotelService
+
+DATE_FROM = date(2030, 5, 1)
+DATE_TO = date(2030, 5, 15)
+
+
+async def collect_pages(find_page, *args, **kwargs):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = await find_page(*args, cursor=cursor, **kwargs)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize("sort", ["name", "price", "rooms_left"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_hotel_pages_cover_search_in_order(sort, order):
+    hotels = await HotelService.find_available("Республика", DATE_FROM, DATE_TO)
+    rows, pages = await collect_pages(
+        HotelService.find_available_page,
+        "Республика",
+        DATE_FROM,
+        DATE_TO,
+        sort=sort,
+        order=order,
+        limit=2,
+    )
+
+    assert sorted(hotel.id for hotel, _, _ in rows) == sorted(
+        hotel.id for hotel, _ in hotels
+    )
+    assert pages == max(1, -(-len(hotels) // 2))
+    keys = [
+        ({"name": hotel.name, "price": price, "rooms_left": left}[sort], hotel.id)
+        for hotel, left, price in rows
+    ]
+    assert keys == sorted(keys, reverse=order == "desc")
+
+
+@pytest.mark.parametrize("sort", ["name", "price", "rooms_left"])
+async def test_room_pages_cover_hotel_rooms_in_order(sort):
+    rooms = await RoomService.find_available(1, DATE_FROM, DATE_TO)
+    rows, _ = await collect_pages(
+        RoomService.find_available_page, 1, DATE_FROM, DATE_TO, sort=sort, limit=1
+    )
+
+    assert sorted(room.id for room, _ in rows) == sorted(room.id for room, _ in rooms)
+    keys = [
+        ({"name": room.name, "price": room.price, "rooms_left": left}[sort], room.id)
+        for room, left in rows
+    ]
+    assert keys == sorted(keys)
+
+
+async def test_cursor_is_bound_to_its_sort():
+    _, cursor = await HotelService.find_available_page(
+        "Республика", DATE_FROM, DATE_TO, sort="price", limit=1
+    )
+    assert cursor
+    with pytest.raises(InvalidCursorException):
+        await HotelService.find_available_page(
+            "Республика", DATE_FROM, DATE_TO, sort="name", cursor=cursor
+        )
@@ -0,0 +1,117 @@
+import json
+import re
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from app.bookings.service import BookingService
+from app.hotels.rooms.service import RoomService
+from app.hotels.service import HotelService
+
+INDEXED_TABLES = {"bookings", "hotels", "rooms", "room_nights"}
+
+# Секции bookings сканируются под своими именами
+BOOKINGS_PARTITION = re.compile(r"^bookings_(default|y\d{4}m\d{2})$")
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for subplan in plan.get("Plans", []):
+        yield from plan_nodes(subplan)
+
+
+# Объем каталога и истории, на котором планировщик сам выбирает между
+# Seq Scan и индексом: моков в несколько строк для этого мало
+SEED = [
+    """
+    INSERT INTO users (email, hashed_password)
+    SELECT 'plans' || i || '@test.com', 'x' FROM generate_series(1, 10000) AS i
+    """,
+    """
+    INSERT INTO hotels (name, location, services, rooms_quantity, image_id)
+    SELECT 'Отель ' || i,
+        'Регион ' || i % 300 || ', город ' || i % 1000 || ', улица ' || i,
+        '[]', 50, 1
+    FROM generate_series(1, 2000) AS i
+    """,
+    """
+    INSERT INTO rooms (hotel_id, name, description, price, services, quantity, image_id)
+    SELECT hotels.id, 'Номер ' || i, '', 1000 + i * 100, '[]', 10, 1
+    FROM hotels CROSS JOIN generate_series(1, 5) AS i
+    WHERE hotels.name LIKE 'Отель %'
+    """,
+    """
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price, total_cost)
+    SELECT rooms.id, users.id,
+        DATE '2029-01-01' + i % 730, DATE '2029-01-04' + i % 730,
+        rooms.price, rooms.price * 3
+    FROM generate_series(1, 50000) AS i
+    JOIN rooms ON rooms.id = 1 + i % 10000
+    JOIN users ON users.id = 1 + i % 10000
+    """,
+    """
+    INSERT INTO room_nights (room_id, night, booked_count)
+    SELECT rooms.id, DATE '2030-04-20' + i, 1
+    FROM rooms CROSS JOIN generate_series(0, 30) AS i
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked_count = room_nights.booked_count + 1
+    """,
+]
+
+
+@pytest_asyncio.fixture
+async def seeded(session):
+    # Строки и статистика живут только в транзакции теста: ANALYZE учитывает
+    # незафиксированные строки своей транзакции, откат убирает все
+    for statement in SEED:
+        await session.execute(text(statement))
+    await session.execute(text("ANALYZE"))
+    yield session
+    await session.rollback()
+
+
+async def explain(session, query) -> dict:
+    sql = query.compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        BookingService.user_bookings_query(3),
+        HotelService.available_query("Алтай", date(2030, 5, 1), date(2030, 5, 15)),
+        HotelService.available_query(
+            "Алтй", date(2030, 5, 1), date(2030, 5, 15), fuzzy=True
+        ),
+        RoomService.available_query(1, date(2030, 5, 1), date(2030, 5, 15)),
+        RoomService.available_batch_query(
+            [1, 2, 3], date(2030, 5, 1), date(2030, 5, 15)
+        ),
+    ],
+    ids=[
+        "get_bookings",
+        "get_hotels",
+        "get_hotels_fuzzy",
+        "get_rooms",
+        "get_rooms_batch",
+    ],
+)
+async def test_hot_queries_use_indexes(query, seeded):
+    plan = await explain(seeded, query)
+
+    seq_scans = [
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+        and BOOKINGS_PARTITION.sub("bookings", node.get("Relation Name", ""))
+        in INDEXED_TABLES
+    ]
+    assert not seq_scans, f"Seq Scan on {seq_scans}"
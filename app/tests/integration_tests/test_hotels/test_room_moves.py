@@ -0,0 +1,24 @@
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.hotels.rooms.service import RoomService
+
+
+async def test_moved_room_invalidates_both_hotels(monkeypatch):
+    invalidated = set()
+
+    async def invalidate(*tags: str) -> None:
+        invalidated.update(tags)
+
+    monkeypatch.setattr(search_cache, "invalidate", invalidate)
+    # Воркер не видел номер: прежний отель берется из БД, а не из кэша
+    monkeypatch.setattr(RoomService, "_hotel_ids", {})
+    try:
+        room = await RoomService.update(7, hotel_id=5)
+        assert room.hotel_id == 5
+        assert invalidated == {tags.hotel(4), tags.hotel(5)}
+
+        invalidated.clear()
+        await RoomService.bulk_update([{"id": 7, "hotel_id": 4}])
+        assert invalidated == {tags.hotel(4), tags.hotel(5)}
+    finally:
+        await RoomService.bulk_update([{"id": 7, "hotel_id": 4}])
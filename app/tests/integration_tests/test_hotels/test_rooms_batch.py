@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+from app.hotels.rooms.service import RoomService
+
+HOTEL_IDS = [3, 1, 2, 999]
+
+
+@pytest.mark.parametrize(
+    "date_from,date_to",
+    [
+        (date(2023, 6, 10), date(2023, 7, 5)),
+        (date(2025, 12, 20), date(2026, 1, 20)),
+    ],
+)
+async def test_batch_matches_per_hotel_search(date_from, date_to):
+    hotels = await RoomService.find_available_batch(HOTEL_IDS, date_from, date_to)
+
+    assert list(hotels) == HOTEL_IDS
+    assert hotels[999] == []
+    for hotel_id in HOTEL_IDS:
+        expected = await RoomService.find_available(hotel_id, date_from, date_to)
+        assert {room.id: rooms_left for room, rooms_left in hotels[hotel_id]} == {
+            room.id: rooms_left for room, rooms_left in expected
+        }
+
+
+def test_batch_endpoint_groups_rooms_by_hotel(client):
+    response = client.get(
+        "/v1/hotels/rooms/batch",
+        params={"hotel_id": [2, 1], "date_from": "2030-05-01", "date_to": "2030-05-04"},
+    )
+
+    assert response.status_code == 200
+    hotels = response.json()
+    assert [hotel["hotel_id"] for hotel in hotels] == [2, 1]
+    for hotel in hotels:
+        assert hotel["rooms"]
+        assert all(room["hotel_id"] == hotel["hotel_id"] for room in hotel["rooms"])
+
+
+def test_batch_endpoint_limits_hotels(client):
+    response = client.get(
+        "/v1/hotels/rooms/batch",
+        params={
+            "hotel_id": list(range(1, 60)),
+            "date_from": "2030-05-01",
+            "date_to": "2030-05-04",
+        },
+    )
+    assert response.status_code == 400
+    assert str(RoomService.MAX_BATCH_HOTELS) in response.json()["detail"]
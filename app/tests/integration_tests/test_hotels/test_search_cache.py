@@ -0,0 +1,162 @@
+import asyncio
+from datetime import date
+
+import pytest_asyncio
+from fastapi import Response
+from redis import asyncio as aioredis
+from sqlalchemy import select
+
+from app.cache import tags
+from app.cache.tagged import TaggedCache, cached, tag
+from app.config import settings
+from app.database import RequestSessions, request_sessions, session_scope
+
+
+@pytest_asyncio.fixture
+async def cache():
+    redis = aioredis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}")
+    cache = TaggedCache("test_search")
+    cache.init(redis)
+    yield cache
+    async for key in redis.scan_iter("test_search:*"):
+        await redis.delete(key)
+    await redis.close()
+
+
+def test_hotel_dates_cover_every_month_of_stay():
+    assert tags.hotel_dates(1, date(2030, 1, 30), date(2030, 3, 1)) == [
+        "hotel:1:2030-01",
+        "hotel:1:2030-02",
+    ]
+    assert tags.hotel_dates(1, date(2030, 1, 30), date(2030, 3, 2)) == [
+        "hotel:1:2030-01",
+        "hotel:1:2030-02",
+        "hotel:1:2030-03",
+    ]
+
+
+async def test_invalidation_hits_only_tagged_entries(cache):
+    calls = []
+
+    @cached(cache, expire=3600)
+    async def search(hotel_id: int):
+        calls.append(hotel_id)
+        tag(tags.hotel(hotel_id))
+        return [hotel_id]
+
+    assert await search(hotel_id=1) == [1]
+    assert await search(hotel_id=2) == [2]
+    assert await search(hotel_id=1) == [1]
+    assert calls == [1, 2]
+
+    await cache.invalidate(tags.hotel(1))
+    await search(hotel_id=1)
+    await search(hotel_id=2)
+    assert calls == [1, 2, 1]
+
+
+async def test_entry_computed_during_write_is_stale(cache):
+    calls = []
+
+    @cached(cache, expire=3600)
+    async def search(hotel_id: int):
+        calls.append(hotel_id)
+        if len(calls) == 1:
+            # Бронь зафиксирована, пока поиск читал старые данные
+            await cache.invalidate(tags.hotel(hotel_id))
+        tag(tags.hotel(hotel_id))
+        return [hotel_id]
+
+    await search(hotel_id=1)
+    await search(hotel_id=1)
+    await search(hotel_id=1)
+    assert calls == [1, 1]
+
+
+async def test_concurrent_misses_are_computed_once(cache):
+    calls = []
+
+    @cached(cache, expire=3600)
+    async def search(hotel_id: int):
+        calls.append(hotel_id)
+        await asyncio.sleep(0.1)
+        return [hotel_id]
+
+    assert await asyncio.gather(*(search(hotel_id=1) for _ in range(50))) == [[1]] * 50
+    assert calls == [1]
+
+
+async def test_concurrent_misses_across_workers_are_computed_once(cache):
+    # Второй экземпляр с тем же именем — кэш соседнего воркера
+    other = TaggedCache(cache.name)
+    other.init(cache._redis)
+    calls = []
+
+    async def search(hotel_id: int):
+        calls.append(hotel_id)
+        await asyncio.sleep(0.2)
+        return [hotel_id]
+
+    results = await asyncio.gather(
+        *(
+            cached(worker, expire=3600)(search)(hotel_id=1)
+            for worker in [cache, other] * 10
+        )
+    )
+    assert results == [[1]] * 20
+    assert calls == [1]
+
+
+async def test_expired_entry_is_served_while_revalidating(cache):
+    calls = []
+
+    @cached(cache, expire=0)
+    async def search(hotel_id: int):
+        calls.append(hotel_id)
+        return [len(calls)]
+
+    assert await search(hotel_id=1) == [1]
+    assert await search(hotel_id=1) == [1]
+    await asyncio.sleep(0.1)
+    assert calls == [1, 1]
+    assert await search(hotel_id=1) == [2]
+
+
+async def test_revalidation_outlives_request_with_own_session(cache):
+    sessions_seen = []
+
+    @cached(cache, expire=0)
+    async def search(hotel_id: int):
+        async with session_scope() as session:
+            await session.execute(select(1))
+            sessions_seen.append(session)
+        return [len(sessions_seen)]
+
+    assert await search(hotel_id=1) == [1]
+
+    # Устаревшая запись отдается из запроса, как в unit_of_work
+    sessions = RequestSessions(Response(), read_primary=True)
+    token = request_sessions.set(sessions)
+    try:
+        assert await search(hotel_id=1) == [1]
+    finally:
+        request_sessions.reset(token)
+        await sessions.close()
+
+    # Обновление завершилось после ответа и не трогало сессию запроса
+    await asyncio.sleep(0.1)
+    assert len(sessions_seen) == 2
+    # Сессия запроса так и не открывалась
+    assert sessions.primary is None
+
+
+async def test_local_tier_is_bounded(cache):
+    cache.max_local = 2
+
+    @cached(cache, expire=3600)
+    async def search(hotel_id: int):
+        return [hotel_id]
+
+    for hotel_id in range(5):
+        await search(hotel_id=hotel_id)
+    assert len(cache._local) == 2
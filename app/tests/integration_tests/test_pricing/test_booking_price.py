@@ -0,0 +1,132 @@
+from datetime import date
+
+from sqlalchemy import delete
+
+from app.bookings.service import BookingService
+from app.hotels.rooms.models import Rooms
+from app.pricing.engine import WEEKENDS
+from app.pricing.models import RateRules
+from app.pricing.service import PricingService
+
+# Шесть ночей с пятницы 3 августа 2035: субботняя и воскресная — выходные
+DATE_FROM = date(2035, 8, 3)
+DATE_TO = date(2035, 8, 9)
+
+
+async def test_booking_locks_in_priced_total(session):
+    room = await session.get(Rooms, 3)
+    await PricingService.add(
+        name="test-weekend", room_id=room.id, weekdays=WEEKENDS, multiplier=1.5
+    )
+    PricingService.reset()
+    try:
+        booking = await BookingService.add(
+            user_id=1, room_id=room.id, date_from=DATE_FROM, date_to=DATE_TO
+        )
+
+        assert booking.total_cost == 4 * room.price + 2 * round(room.price * 1.5)
+        assert (
+            await PricingService.quote_room(room.id, DATE_FROM, DATE_TO)
+            == booking.total_cost
+        )
+    finally:
+        await session.execute(delete(RateRules).where(RateRules.name == "test-weekend"))
+        await session.commit()
+        PricingService.reset()
+
+    # Новая цена не меняет уже оформленную бронь
+    booking = await BookingService.find_by_id(booking.id)
+    assert booking.total_cost == 4 * room.price + 2 * round(room.price * 1.5)
+
+
+async def test_booking_prices_occupancy_under_room_lock(session):
+    """
+    Правило по загрузке book_room считает по room_nights до этой брони,
+    как и PricingService.
+    """
+    room = await session.get(Rooms, 3)
+    date_from, date_to = date(2035, 9, 3), date(2035, 9, 9)
+    first = await BookingService.add(
+        user_id=1, room_id=room.id, date_from=date_from, date_to=date(2035, 9, 5)
+    )
+    assert first.total_cost == 2 * room.price
+
+    await PricingService.add(
+        name="test-occupancy",
+        room_id=room.id,
+        min_occupancy=1 / room.quantity,
+        multiplier=2.0,
+    )
+    PricingService.reset()
+    try:
+        quoted = await PricingService.quote_room(room.id, date_from, date_to)
+        booking = await BookingService.add(
+            user_id=1, room_id=room.id, date_from=date_from, date_to=date_to
+        )
+
+        assert quoted == 2 * round(room.price * 2.0) + 4 * room.price
+        assert booking.total_cost == quoted
+    finally:
+        await session.execute(
+            delete(RateRules).where(RateRules.name == "test-occupancy")
+        )
+        await session.commit()
+        PricingService.reset()
+
+
+# Правила всех видов сразу: book_room считает цену в PL/pgSQL, пачки и
+# quote — через nightly_rates, итоги должны совпадать
+PARITY_RULES = [
+    {"hotel_id": 2, "weekdays": WEEKENDS, "multiplier": 1.5},
+    {
+        "room_id": 3,
+        "date_from": date(2035, 10, 4),
+        "date_to": date(2035, 10, 7),
+        "multiplier": 1.2,
+    },
+    {"min_occupancy": 0.1, "multiplier": 1.25},
+    # 9815 * 0.5 = 4907.5: обе реализации округляют до четного
+    {"room_id": 6, "multiplier": 0.5},
+]
+PARITY_STAYS = [
+    (3, date(2035, 10, 2), date(2035, 10, 9)),
+    (6, date(2035, 10, 3), date(2035, 10, 6)),
+    (3, date(2035, 10, 5), date(2035, 10, 8)),
+    (6, date(2035, 10, 4), date(2035, 10, 10)),
+    (3, date(2035, 10, 1), date(2035, 10, 6)),
+]
+
+
+async def test_every_booking_path_prices_like_pricing_engine(session):
+    for i, rule in enumerate(PARITY_RULES):
+        await PricingService.add(name=f"test-parity-{i}", **rule)
+    PricingService.reset()
+    try:
+        # Одиночные брони: book_room против quote по той же загрузке
+        singles = []
+        for room_id, date_from, date_to in PARITY_STAYS:
+            quoted = await PricingService.quote_room(room_id, date_from, date_to)
+            booking = await BookingService.add(
+                user_id=1, room_id=room_id, date_from=date_from, date_to=date_to
+            )
+            assert booking.total_cost == quoted
+            singles.append(booking)
+        totals = [booking.total_cost for booking in singles]
+        for booking in singles:
+            await BookingService.delete(booking.id)
+
+        group = await BookingService.add_group(1, PARITY_STAYS)
+        assert [booking.total_cost for booking in group] == totals
+        for booking in group:
+            await BookingService.delete(booking.id)
+
+        batch = await BookingService.add_batch([(1, *stay) for stay in PARITY_STAYS])
+        assert [booking.total_cost for booking in batch] == totals
+        for booking in batch:
+            await BookingService.delete(booking.id)
+    finally:
+        await session.execute(
+            delete(RateRules).where(RateRules.name.like("test-parity-%"))
+        )
+        await session.commit()
+        PricingService.reset()
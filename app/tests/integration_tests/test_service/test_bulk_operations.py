@@ -0,0 +1,37 @@
+from sqlalchemy import delete
+
+from app.users.models import Users
+from app.users.service import UsersService
+
+
+async def test_bulk_add_update_and_find(session):
+    rows = [{"email": f"bulk{i}@test.com", "hashed_password": "x"} for i in range(3)]
+    added = await UsersService.bulk_add(rows)
+    try:
+        assert [user.email for user in added] == [row["email"] for row in rows]
+
+        await UsersService.bulk_update(
+            [{"id": user.id, "hashed_password": "y"} for user in added[:2]]
+        )
+
+        found = await UsersService.find_many_by_ids([user.id for user in added] + [0])
+        passwords = {user.email: user.hashed_password for user in found}
+        assert passwords == {
+            "bulk0@test.com": "y",
+            "bulk1@test.com": "y",
+            "bulk2@test.com": "x",
+        }
+    finally:
+        await session.execute(delete(Users).where(Users.email.like("bulk%@test.com")))
+        await session.commit()
+
+
+async def test_copy_add(session):
+    rows = [{"email": f"copy{i}@test.com", "hashed_password": "x"} for i in range(100)]
+    try:
+        assert await UsersService.copy_add(rows) == 100
+        copied = await UsersService.find_all(hashed_password="x")
+        assert {user.email for user in copied} >= {row["email"] for row in rows}
+    finally:
+        await session.execute(delete(Users).where(Users.email.like("copy%@test.com")))
+        await session.commit()
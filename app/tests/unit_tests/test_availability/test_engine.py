@@ -0,0 +1,115 @@
+import random
+from datetime import date
+from types import SimpleNamespace
+
+from app.availability import engine as engine_module
+from app.availability.engine import AvailabilityEngine, NightsTree
+
+DATE_FROM = date(2099, 5, 1)
+DATE_TO = date(2099, 5, 4)
+
+
+def test_nights_tree_matches_brute_force():
+    rnd = random.Random(42)
+    tree = NightsTree()
+    nights = [0] * 400
+    for _ in range(500):
+        left = rnd.randrange(0, 390)
+        right = rnd.randrange(left + 1, 400)
+        value = rnd.choice([1, 1, 2, -1]) if max(nights[left:right]) > 0 else 1
+        if value < 0 and min(nights[left:right]) <= 0:
+            value = 1
+        tree.add(left, right, value)
+        for i in range(left, right):
+            nights[i] += value
+
+        q_left = rnd.randrange(0, 399)
+        q_right = rnd.randrange(q_left + 1, 400)
+        assert tree.max(q_left, q_right) == max(nights[q_left:q_right])
+
+
+def test_engine_counts_overlapping_nights():
+    engine = AvailabilityEngine()
+    engine.apply(1, date(2030, 5, 1), date(2030, 5, 10), 1)
+    engine.apply(1, date(2030, 5, 5), date(2030, 5, 15), 1)
+
+    assert engine.booked(1, date(2030, 5, 1), date(2030, 5, 5)) == 1
+    assert engine.booked(1, date(2030, 5, 4), date(2030, 5, 6)) == 2
+    # Выезд 10-го и заезд 10-го не пересекаются
+    assert engine.booked(1, date(2030, 5, 10), date(2030, 5, 20)) == 1
+    assert engine.booked(1, date(2030, 5, 15), date(2030, 5, 20)) == 0
+    assert engine.booked(2, date(2030, 5, 1), date(2030, 5, 20)) == 0
+
+    engine.apply(1, date(2030, 5, 5), date(2030, 5, 15), -1)
+    assert engine.booked(1, date(2030, 5, 4), date(2030, 5, 6)) == 1
+
+
+def message(booking_id: int, room_id: int, delta: int):
+    return {
+        "booking_id": booking_id,
+        "room_id": room_id,
+        "date_from": DATE_FROM.isoformat(),
+        "date_to": DATE_TO.isoformat(),
+        "delta": delta,
+    }
+
+
+class SnapshotSession:
+    """
+    Снимок bookings для load(); after_row — сообщения, дошедшие, пока снимок
+    читается.
+    """
+
+    def __init__(self, rows, after_row):
+        self.rows = rows
+        self.after_row = after_row
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, query):
+        async def rows():
+            for row in self.rows:
+                yield row
+                await self.after_row()
+
+        return rows()
+
+
+async def test_deltas_already_in_snapshot_are_not_applied_twice(monkeypatch):
+    engine = AvailabilityEngine()
+    # Брони 1 и 2 зафиксированы до снимка, бронь 3 удалена до него,
+    # бронь 4 — после снимка
+    rows = [
+        SimpleNamespace(id=booking_id, room_id=1, date_from=DATE_FROM, date_to=DATE_TO)
+        for booking_id in (1, 2)
+    ]
+
+    async def during_load():
+        if not engine._pending:
+            await engine.on_message(message(1, 1, 1))
+
+    monkeypatch.setattr(
+        engine_module, "async_session_maker", lambda: SnapshotSession(rows, during_load)
+    )
+    await engine.load()
+    assert engine.booked(1, DATE_FROM, DATE_TO) == 2
+
+    # Публикации, дошедшие уже после загрузки
+    await engine.on_message(message(2, 1, 1))
+    await engine.on_message(message(3, 1, -1))
+    assert engine.booked(1, DATE_FROM, DATE_TO) == 2
+
+    await engine.on_message(message(4, 1, 1))
+    assert engine.booked(1, DATE_FROM, DATE_TO) == 3
+    await engine.on_message(message(1, 1, -1))
+    await engine.on_message(message(1, 1, -1))
+    assert engine.booked(1, DATE_FROM, DATE_TO) == 2
+
+    # Вставка, дошедшая позже своего удаления
+    await engine.on_message(message(5, 1, -1))
+    await engine.on_message(message(5, 1, 1))
+    assert engine.booked(1, DATE_FROM, DATE_TO) == 2
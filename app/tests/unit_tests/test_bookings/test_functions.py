@@ -0,0 +1,44 @@
+import re
+from pathlib import Path
+
+from alembic.script import ScriptDirectory
+
+from app.bookings import functions
+
+MIGRATIONS = Path(functions.__file__).parent.parent / "migrations"
+
+
+def book_room_texts():
+    """(ревизия, имя, текст) всех копий book_room, от последней ревизии к первой"""
+    for script in ScriptDirectory(str(MIGRATIONS)).walk_revisions():
+        for name, text in sorted(vars(script.module).items()):
+            if re.fullmatch(r"BOOK_ROOM_V\d+", name):
+                yield script.revision, name, text, getattr(
+                    script.module, f"DROP_{name}"
+                )
+
+
+def drop_matches(text, drop):
+    arguments = re.search(r"book_room\((.*?)\) RETURNS", text, re.S)[1]
+    types = [argument.split()[1] for argument in arguments.split(",")]
+    return drop.endswith(f"book_room({', '.join(types)})")
+
+
+def test_migrations_do_not_import_app_code():
+    # Миграция — снимок своей ревизии: правка приложения не должна ее менять
+    for migration in (MIGRATIONS / "versions").glob("*.py"):
+        assert "from app." not in migration.read_text(encoding="utf-8"), migration.name
+
+
+def test_drop_matches_signature_of_each_version():
+    for revision, name, text, drop in book_room_texts():
+        assert drop_matches(text, drop), (revision, name)
+    assert drop_matches(functions.BOOK_ROOM, functions.DROP_BOOK_ROOM)
+
+
+def test_create_all_uses_latest_version():
+    texts = list(book_room_texts())
+    newest = max(texts, key=lambda item: int(item[1].rsplit("V", 1)[1]))
+    assert texts[0][0] == newest[0]
+    assert functions.BOOK_ROOM == newest[2]
+    assert functions.DROP_BOOK_ROOM == newest[3]
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from app.broadcast import Broadcaster
+
+
+class FakePubSub:
+    def __init__(self, messages, error=None):
+        self.messages = messages
+        self.error = error
+        self.subscribed = False
+        self.channels = ()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.subscribed = False
+
+    async def subscribe(self, *channels):
+        self.channels = channels
+        self.subscribed = True
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+        if self.error:
+            raise self.error
+        await asyncio.Event().wait()
+
+
+class FakeRedis:
+    def __init__(self, *pubsubs):
+        self.pubsubs = list(pubsubs)
+
+    def pubsub(self):
+        return self.pubsubs.pop(0)
+
+
+def message(channel, payload):
+    return {"type": "message", "channel": channel.encode(), "data": json.dumps(payload)}
+
+
+async def test_listener_resubscribes_after_connection_loss(monkeypatch):
+    received = []
+    delivered = asyncio.Event()
+
+    async def handler(payload):
+        received.append(payload)
+        if len(received) == 2:
+            delivered.set()
+
+    # Первое соединение обрывается, на втором слушатель подписывается заново
+    first = FakePubSub(
+        [message("rooms", {"n": 1})],
+        error=ConnectionError("Connection closed by server."),
+    )
+    second = FakePubSub(
+        [
+            {"type": "subscribe", "channel": b"rooms", "data": 1},
+            message("rooms", {"n": 2}),
+        ]
+    )
+    broadcaster = Broadcaster()
+    monkeypatch.setattr(broadcaster, "RECONNECT_DELAY", 0)
+    broadcaster.subscribe("rooms", handler)
+
+    await broadcaster.start(FakeRedis(first, second))
+    await asyncio.wait_for(delivered.wait(), timeout=1)
+    await broadcaster.stop()
+
+    assert received == [{"n": 1}, {"n": 2}]
+    assert second.channels == ("rooms",)
@@ -0,0 +1,33 @@
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.util import greenlet_spawn
+
+from app.database import InstrumentedPool
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name, {"db": "primary"}) or 0
+
+
+async def test_checkout_wait_and_timeouts_are_recorded():
+    pool = InstrumentedPool(MagicMock, pool_size=1, max_overflow=0, timeout=0.05)
+    checkouts, timeouts = sample("db_pool_checkout_seconds_count"), sample(
+        "db_pool_timeouts_total"
+    )
+
+    def exhaust_pool():
+        connection = pool.connect()
+        assert pool.checkedout() == 1
+        # Единственное соединение занято: второй запрос ждет timeout и получает ошибку
+        with pytest.raises(PoolTimeoutError):
+            pool.connect()
+        connection.close()
+
+    await greenlet_spawn(exhaust_pool)
+
+    assert sample("db_pool_checkout_seconds_count") == checkouts + 2
+    assert sample("db_pool_timeouts_total") == timeouts + 1
+    assert sample("db_pool_checkout_seconds_sum") >= 0.05
@@ -0,0 +1,28 @@
+import json
+
+from app.broadcast import broadcaster
+from app.hotels.rooms import service as rooms_module
+from app.hotels.rooms.service import RoomService
+
+
+class PublishedRedis:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, channel, data):
+        self.messages.append((channel, json.loads(data)))
+
+
+async def test_forgotten_hotel_ids_reach_every_worker(monkeypatch):
+    redis = PublishedRedis()
+    monkeypatch.setattr(broadcaster, "_redis", redis)
+    monkeypatch.setattr(RoomService, "_hotel_ids", {1: 10, 2: 10, 3: 20})
+
+    await RoomService.forget_hotel_ids([1, 3])
+    assert RoomService._hotel_ids == {2: 10}
+    assert redis.messages == [(rooms_module.CHANNEL, {"room_ids": [1, 3]})]
+
+    # Другой воркер: номер закэширован, сообщение приходит через broadcaster
+    monkeypatch.setattr(RoomService, "_hotel_ids", {1: 10, 2: 10})
+    await RoomService.on_message(redis.messages[0][1])
+    assert RoomService._hotel_ids == {2: 10}
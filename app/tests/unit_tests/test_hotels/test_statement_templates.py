@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect
+
+from app.hotels.rooms.service import RoomService
+from app.hotels.service import HotelService
+
+
+@pytest.mark.parametrize(
+    "build,params",
+    [
+        (
+            lambda: HotelService.available_template(False, False),
+            {"location", "date_from", "date_to"},
+        ),
+        (
+            lambda: HotelService.available_template(True, True),
+            {"location", "date_from", "date_to"},
+        ),
+        (lambda: HotelService.hotel_rooms_template(False), {"location"}),
+        (
+            lambda: RoomService.available_template(),
+            {"hotel_id", "date_from", "date_to"},
+        ),
+    ],
+)
+def test_templates_are_built_once(build, params):
+    template = build()
+    assert build() is template
+    # Значения запроса — параметры шаблона, а не константы в тексте SQL
+    assert params <= set(template.compile(dialect=dialect()).positiontup)
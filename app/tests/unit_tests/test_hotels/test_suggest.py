@@ -0,0 +1,43 @@
+import pytest
+
+from app.hotels.suggest import LocationIndex, components
+
+LOCATIONS = [
+    "Республика Алтай, Майминский район, село Урлу-Аспак, Лесхозная улица, 20",
+    "Республика Алтай, Турочакский район, село Артыбаш, Телецкая улица, 44А",
+    "Республика Коми, Сыктывкар, Коммунистическая улица, 67",
+    "посёлок городского типа Сириус, Фигурная улица, 45",
+]
+
+
+def test_components_skip_streets_and_houses():
+    assert components(LOCATIONS[0]) == [
+        "Республика Алтай",
+        "Майминский район",
+        "село Урлу-Аспак",
+    ]
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("респ", ["Республика Алтай", "Республика Коми"]),
+        ("алт", ["Республика Алтай"]),
+        ("  СЫКТ", ["Сыктывкар"]),
+        ("сириус", ["посёлок городского типа Сириус"]),
+        ("поселок", ["посёлок городского типа Сириус"]),
+        ("урлу-а", ["село Урлу-Аспак"]),
+        ("лесхозная", []),
+        ("", []),
+    ],
+)
+def test_suggest_by_prefix_of_any_word(query, expected):
+    index = LocationIndex()
+    index.build(LOCATIONS)
+    assert index.suggest(query) == expected
+
+
+def test_suggest_limit():
+    index = LocationIndex()
+    index.build(LOCATIONS)
+    assert len(index.suggest("р", limit=2)) == 2
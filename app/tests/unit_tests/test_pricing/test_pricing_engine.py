@@ -0,0 +1,101 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.pricing.engine import WEEKENDS, nightly_rates, window_totals
+from app.pricing.models import RateRules
+
+DATE_FROM = date(2030, 6, 1)  # суббота
+NIGHTS = 30
+
+
+def brute_force(room_ids, hotel_ids, prices, rules, occupancy):
+    rates = np.zeros((len(prices), NIGHTS), dtype=np.int64)
+    for r in range(len(prices)):
+        for n in range(NIGHTS):
+            night = DATE_FROM + timedelta(days=n)
+            multiplier = 1.0
+            for rule in rules:
+                if rule.hotel_id is not None and rule.hotel_id != hotel_ids[r]:
+                    continue
+                if rule.room_id is not None and rule.room_id != room_ids[r]:
+                    continue
+                if rule.date_from is not None and night < rule.date_from:
+                    continue
+                if rule.date_to is not None and night >= rule.date_to:
+                    continue
+                if rule.weekdays is not None and not rule.weekdays & (
+                    1 << night.weekday()
+                ):
+                    continue
+                if (
+                    rule.min_occupancy is not None
+                    and occupancy[r, n] < rule.min_occupancy
+                ):
+                    continue
+                multiplier *= rule.multiplier
+            rates[r, n] = round(prices[r] * multiplier)
+    return rates
+
+
+def test_weekend_rule_applies_to_saturday_and_sunday_nights():
+    rules = [RateRules(name="выходные", weekdays=WEEKENDS, multiplier=1.5)]
+    rates = nightly_rates(
+        np.array([1]), np.array([1]), np.array([1000.0]), DATE_FROM, 7, rules
+    )
+
+    assert rates.tolist() == [[1500, 1500, 1000, 1000, 1000, 1000, 1000]]
+
+
+def test_rates_match_brute_force():
+    rnd = random.Random(7)
+    room_ids = np.arange(1, 41)
+    hotel_ids = room_ids % 5
+    prices = np.array(
+        [rnd.randrange(1000, 20000, 100) for _ in room_ids], dtype=np.float64
+    )
+    occupancy = np.array([[rnd.random() for _ in range(NIGHTS)] for _ in room_ids])
+    rules = [
+        RateRules(name="выходные", weekdays=WEEKENDS, multiplier=1.2),
+        RateRules(
+            name="сезон",
+            date_from=DATE_FROM + timedelta(days=10),
+            date_to=DATE_FROM + timedelta(days=20),
+            multiplier=1.5,
+        ),
+        RateRules(name="отель", hotel_id=3, multiplier=0.9),
+        RateRules(name="номер", room_id=17, weekdays=0b11, multiplier=0.8),
+        RateRules(name="спрос", min_occupancy=0.7, multiplier=1.3),
+    ]
+
+    rates = nightly_rates(
+        room_ids, hotel_ids, prices, DATE_FROM, NIGHTS, rules, occupancy
+    )
+
+    assert (rates == brute_force(room_ids, hotel_ids, prices, rules, occupancy)).all()
+
+
+def test_occupancy_rule_is_skipped_without_occupancy():
+    rules = [RateRules(name="спрос", min_occupancy=0.5, multiplier=2.0)]
+    rates = nightly_rates(
+        np.array([1]), np.array([1]), np.array([1000.0]), DATE_FROM, 3, rules
+    )
+
+    assert rates.tolist() == [[1000, 1000, 1000]]
+
+
+def test_window_totals_match_brute_force():
+    rnd = random.Random(3)
+    rates = np.array(
+        [[rnd.randrange(1000, 5000) for _ in range(NIGHTS)] for _ in range(10)],
+        dtype=np.int64,
+    )
+
+    for nights in (1, 3, 7, NIGHTS):
+        totals = window_totals(rates, nights)
+        assert totals.shape == (10, NIGHTS - nights + 1)
+        for r in range(10):
+            assert totals[r].tolist() == [
+                int(rates[r, s : s + nights].sum()) for s in range(NIGHTS - nights + 1)
+            ]
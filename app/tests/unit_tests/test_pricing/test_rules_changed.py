@@ -0,0 +1,43 @@
+import json
+
+from app.broadcast import broadcaster
+from app.cache import tags
+from app.pricing import service as pricing_module
+from app.pricing.models import RateRules
+from app.pricing.service import PricingService
+
+
+class PublishedRedis:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, channel, data):
+        self.messages.append((channel, json.loads(data)))
+
+
+async def test_rules_reset_reaches_every_worker(monkeypatch):
+    redis = PublishedRedis()
+    monkeypatch.setattr(broadcaster, "_redis", redis)
+    monkeypatch.setattr(PricingService, "_rules_loaded_at", 1.0)
+
+    await PricingService.rules_changed([RateRules(hotel_id=2)])
+    assert PricingService._rules_loaded_at is None
+    assert redis.messages == [(pricing_module.CHANNEL, {})]
+
+    # Другой воркер: правила загружены, сообщение приходит через broadcaster
+    monkeypatch.setattr(PricingService, "_rules_loaded_at", 1.0)
+    await PricingService.on_message(redis.messages[0][1])
+    assert PricingService._rules_loaded_at is None
+
+
+async def test_rule_tags():
+    assert await PricingService.rule_tags(
+        [RateRules(hotel_id=2), RateRules(hotel_id=3, room_id=5)]
+    ) == {
+        tags.hotel(2),
+        tags.hotel(3),
+    }
+    # Правило без отеля и номера меняет цены всех отелей
+    assert await PricingService.rule_tags(
+        [RateRules(hotel_id=2), RateRules(weekdays=96)]
+    ) == {tags.PRICES}
@@ -0,0 +1,23 @@
+from datetime import date
+
+import pytest
+
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+from app.service.base import BulkWritesDisabled
+
+BOOKING = {
+    "user_id": 1,
+    "room_id": 1,
+    "date_from": date(2035, 1, 1),
+    "date_to": date(2035, 1, 3),
+    "price": 100,
+}
+
+
+@pytest.mark.parametrize("service", [BookingService, RoomNightsService])
+@pytest.mark.parametrize("method", ["bulk_add", "bulk_update", "copy_add"])
+async def test_ledger_services_refuse_bulk_writes(service, method):
+    # Строки брони без записи в room_nights разошлись бы с журналом
+    with pytest.raises(BulkWritesDisabled):
+        await getattr(service, method)([{"id": 1, **BOOKING}])
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.service.coalescer import Coalescer
+
+
+async def test_calls_within_delay_share_one_batch():
+    batches = []
+
+    async def handler(items):
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    coalescer = Coalescer("test", handler, max_batch=100, max_delay=0.01)
+    results = await asyncio.gather(*(coalescer.submit(i) for i in range(30)))
+
+    assert results == [i * 10 for i in range(30)]
+    assert batches == [list(range(30))]
+
+
+async def test_full_batch_is_flushed_without_waiting():
+    batches = []
+
+    async def handler(items):
+        batches.append(items)
+        return items
+
+    coalescer = Coalescer("test", handler, max_batch=4, max_delay=60)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(coalescer.submit(i) for i in range(8))), timeout=1
+    )
+
+    assert results == list(range(8))
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+async def test_handler_error_reaches_every_caller():
+    async def handler(items):
+        raise RuntimeError("batch failed")
+
+    coalescer = Coalescer("test", handler, max_batch=10, max_delay=0.01)
+    results = await asyncio.gather(
+        *(coalescer.submit(i) for i in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        await coalescer.submit(1)
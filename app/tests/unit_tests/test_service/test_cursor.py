@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from app.exceptions import InvalidCursorException
+from app.service.pagination import decode_cursor, encode_cursor, keyset_rows
+
+
+def test_cursor_key_round_trips_with_column_types():
+    cursor = encode_cursor("date_from", "asc", (date(2030, 5, 1), 7))
+
+    assert decode_cursor(cursor, "date_from", "asc", (date, int)) == [
+        date(2030, 5, 1),
+        7,
+    ]
+
+
+@pytest.mark.parametrize(
+    "key, types",
+    [
+        (["Skala", 1], (int, int)),
+        ([1, 1], (str, int)),
+        ([True, 1], (int, int)),
+        ([None, 1], (int, int)),
+        ([100, 1, 1], (int, int)),
+    ],
+)
+def test_cursor_key_must_match_sort_columns(key, types):
+    cursor = encode_cursor("price", "asc", key)
+
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, "price", "asc", types)
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_keyset_rows_pages_cover_all_rows_in_order(order):
+    rows = [
+        (price, row_id)
+        for row_id, price in enumerate([500, 100, 300, 100, 700, 300, 200])
+    ]
+    pages, after = [], None
+    while True:
+        found = keyset_rows(rows, lambda row: row, after, order, 2)
+        pages.extend(found[:2])
+        if len(found) <= 2:
+            break
+        after = found[1]
+
+    assert pages == sorted(rows, reverse=order == "desc")
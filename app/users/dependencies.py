@@ -20,7 +20,8 @@ def get_token(request: Request):
     return token
 
 
-async def get_current_user(token: str = Depends(get_token)):
+def get_current_user_id(token: str = Depends(get_token)) -> int:
+    """Пользователь из токена без обращения к БД."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, settings.ALGORITHM)
     except JWTError:
@@ -31,7 +32,11 @@ async def get_current_user(token: str = Depends(get_token)):
     user_id: str = payload.get("sub")
     if not user_id:
         raise UserIsNotPresentException
-    user = await UsersService.find_by_id(int(user_id))
+    return int(user_id)
+
+
+async def get_current_user(token: str = Depends(get_token)):
+    user = await UsersService.find_by_id(get_current_user_id(token))
     if not user:
         raise UserIsNotPresentException
 
@@ -0,0 +1,79 @@
+"""
+Стоимость запроса занятости в AvailabilityEngine в зависимости от числа броней.
+
+Движок строится из синтетических броней без БД:
+
+    python -m benchmarks.bench_availability_engine \\
+        --rooms 2000 --bookings 1000 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from app.availability.engine import AvailabilityEngine
+
+START = date(2030, 1, 1)
+HORIZON_DAYS = 365
+QUERIES = 100_000
+
+
+def build(rooms: int, bookings: int, rnd: random.Random) -> AvailabilityEngine:
+    engine = AvailabilityEngine()
+    for _ in range(bookings):
+        date_from = START + timedelta(days=rnd.randrange(HORIZON_DAYS))
+        engine.apply(
+            rnd.randrange(rooms),
+            date_from,
+            date_from + timedelta(days=rnd.randint(1, 14)),
+            1,
+        )
+    return engine
+
+
+def main(rooms: int, sizes: list) -> None:
+    rnd = random.Random(0)
+    queries = []
+    for _ in range(QUERIES):
+        date_from = START + timedelta(days=rnd.randrange(HORIZON_DAYS))
+        queries.append(
+            (
+                rnd.randrange(rooms),
+                date_from,
+                date_from + timedelta(days=rnd.randint(1, 14)),
+            )
+        )
+
+    print(f"{'bookings':>10} {'build, s':>10} {'query, us':>10} {'500 rooms, us':>14}")
+    for size in sizes:
+        start = time.perf_counter()
+        engine = build(rooms, size, rnd)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for room_id, date_from, date_to in queries:
+            engine.booked(room_id, date_from, date_to)
+        query_time = (time.perf_counter() - start) / QUERIES * 1e6
+
+        # Поиск отелей: занятость 500 номеров на одни и те же даты
+        room_ids = rnd.sample(range(rooms), min(rooms, 500))
+        date_from, date_to = queries[0][1], queries[0][2]
+        start = time.perf_counter()
+        for _ in range(100):
+            sum(engine.booked(room_id, date_from, date_to) for room_id in room_ids)
+        search_time = (time.perf_counter() - start) / 100 * 1e6
+
+        print(
+            f"{size:>10} {build_time:>10.2f} {query_time:>10.2f} {search_time:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument(
+        "--bookings", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    args = parser.parse_args()
+    main(args.rooms, args.bookings)
@@ -0,0 +1,142 @@
+"""
+Пропускная способность создания броней под нагрузкой: каждая бронь своей
+транзакцией (book_room) против микропакетов BookingService.add_batch.
+
+Нужна локальная Postgres с примененными миграциями (alembic upgrade head):
+
+    python -m benchmarks.bench_booking_coalescer --bookings 5000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import delete, insert, select
+
+from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights
+from app.bookings.service import BookingService
+from app.config import settings
+from app.database import async_session_maker, engine
+from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.users.models import Users
+
+DATE_FROM = date(2035, 2, 10)
+DATE_TO = date(2035, 2, 13)
+
+
+async def measure(
+    name: str, user_id: int, room_ids: list, bookings: int, concurrency: int
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def book(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            booking = await BookingService.add(
+                user_id, room_ids[i % len(room_ids)], DATE_FROM, DATE_TO
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            assert booking is not None
+
+    start = time.perf_counter()
+    await asyncio.gather(*(book(i) for i in range(bookings)))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<10} {bookings / elapsed:>8.0f} bookings/s"
+        f"  p50={p50:>7.2f} ms  p99={p99:>7.2f} ms"
+    )
+
+
+async def main(
+    bookings: int, concurrency: int, rooms: int, batch_size: int, batch_delay_ms: float
+) -> None:
+    async with async_session_maker() as session:
+        hotel_id = (
+            await session.execute(
+                insert(Hotels)
+                .values(
+                    name="bench", location="bench", services=[], rooms_quantity=rooms
+                )
+                .returning(Hotels.id)
+            )
+        ).scalar_one()
+        room_ids = (
+            (
+                await session.execute(
+                    insert(Rooms)
+                    .values(
+                        [
+                            {
+                                "hotel_id": hotel_id,
+                                "name": "bench",
+                                "description": "bench",
+                                "price": 1000,
+                                "services": [],
+                                "quantity": 10 * bookings,
+                            }
+                            for _ in range(rooms)
+                        ]
+                    )
+                    .returning(Rooms.id)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        user_id = (await session.execute(select(Users.id).limit(1))).scalar_one()
+        await session.commit()
+
+    settings.BOOKING_BATCH_SIZE = batch_size
+    settings.BOOKING_BATCH_DELAY_MS = batch_delay_ms
+    try:
+        print(
+            f"bookings={bookings} concurrency={concurrency} rooms={rooms}"
+            f" batch={batch_size}/{batch_delay_ms}ms"
+        )
+        # Прогрев пула соединений и кэша подготовленных запросов asyncpg
+        await measure("warmup", user_id, room_ids, 200, concurrency)
+        settings.BOOKING_COALESCE = False
+        await measure("single", user_id, room_ids, bookings, concurrency)
+        settings.BOOKING_COALESCE = True
+        await measure("coalesced", user_id, room_ids, bookings, concurrency)
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(Bookings).where(Bookings.room_id.in_(room_ids))
+            )
+            await session.execute(
+                delete(RoomNights).where(RoomNights.room_id.in_(room_ids))
+            )
+            await session.execute(delete(Rooms).where(Rooms.id.in_(room_ids)))
+            await session.execute(delete(Hotels).where(Hotels.id == hotel_id))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=settings.BOOKING_BATCH_SIZE)
+    parser.add_argument(
+        "--batch-delay-ms", type=float, default=settings.BOOKING_BATCH_DELAY_MS
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.bookings,
+            args.concurrency,
+            args.rooms,
+            args.batch_size,
+            args.batch_delay_ms,
+        )
+    )
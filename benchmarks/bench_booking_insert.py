@@ -0,0 +1,145 @@
+"""
+Задержка создания брони: старый путь (три запроса) против book_room (один запрос).
+
+Нужна локальная Postgres с примененными миграциями (alembic upgrade head):
+
+    python -m benchmarks.bench_booking_insert --iterations 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+
+from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights
+from app.bookings.service import BookingService
+from app.database import async_session_maker, engine
+from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.users.models import Users
+
+DATE_FROM = date(2035, 1, 10)
+DATE_TO = date(2035, 1, 17)
+
+
+async def legacy_add(user_id: int, room_id: int, date_from: date, date_to: date):
+    """Путь до book_room: остаток, цена и вставка — три отдельных запроса."""
+    async with async_session_maker() as session:
+        booked_rooms = (
+            select(Bookings)
+            .where(
+                and_(
+                    Bookings.room_id == room_id,
+                    or_(
+                        and_(
+                            Bookings.date_from >= date_from,
+                            Bookings.date_from <= date_to,
+                        ),
+                        and_(
+                            Bookings.date_from <= date_from,
+                            Bookings.date_to > date_from,
+                        ),
+                    ),
+                )
+            )
+            .cte("booked_rooms")
+        )
+        get_rooms_left = (
+            select(
+                (Rooms.quantity - func.count(booked_rooms.c.room_id)).label(
+                    "rooms_left"
+                )
+            )
+            .select_from(Rooms)
+            .join(booked_rooms, booked_rooms.c.room_id == Rooms.id, isouter=True)
+            .where(Rooms.id == room_id)
+            .group_by(Rooms.quantity, booked_rooms.c.room_id)
+        )
+        rooms_left = (await session.execute(get_rooms_left)).scalar()
+        if rooms_left <= 0:
+            return None
+        price = (
+            await session.execute(select(Rooms.price).filter_by(id=room_id))
+        ).scalar()
+        add_booking = (
+            insert(Bookings)
+            .values(
+                room_id=room_id,
+                user_id=user_id,
+                date_from=date_from,
+                date_to=date_to,
+                price=price,
+                total_cost=price * (date_to - date_from).days,
+            )
+            .returning(Bookings)
+        )
+        new_booking = (await session.execute(add_booking)).scalar()
+        await session.commit()
+        return new_booking
+
+
+async def measure(name: str, add, user_id: int, room_id: int, iterations: int) -> None:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        booking = await add(user_id, room_id, DATE_FROM, DATE_TO)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert booking is not None
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<12} n={iterations:<6} p50={p50:.3f} ms  p99={p99:.3f} ms")
+
+
+async def main(iterations: int) -> None:
+    async with async_session_maker() as session:
+        hotel_id = (
+            await session.execute(
+                insert(Hotels)
+                .values(name="bench", location="bench", services=[], rooms_quantity=1)
+                .returning(Hotels.id)
+            )
+        ).scalar_one()
+        room_id = (
+            await session.execute(
+                insert(Rooms)
+                .values(
+                    hotel_id=hotel_id,
+                    name="bench",
+                    description="bench",
+                    price=1000,
+                    services=[],
+                    quantity=10 * iterations,
+                )
+                .returning(Rooms.id)
+            )
+        ).scalar_one()
+        user_id = (await session.execute(select(Users.id).limit(1))).scalar_one()
+        await session.commit()
+
+    try:
+        # Прогрев пула соединений и кэша подготовленных запросов asyncpg
+        await measure("warmup", BookingService.add, user_id, room_id, 50)
+        await measure("legacy", legacy_add, user_id, room_id, iterations)
+        await measure("book_room", BookingService.add, user_id, room_id, iterations)
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(Bookings).where(Bookings.room_id == room_id))
+            await session.execute(
+                delete(RoomNights).where(RoomNights.room_id == room_id)
+            )
+            await session.execute(delete(Rooms).where(Rooms.id == room_id))
+            await session.execute(delete(Hotels).where(Hotels.id == hotel_id))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
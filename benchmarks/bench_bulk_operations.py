@@ -0,0 +1,115 @@
+"""
+Строк в секунду у массовых операций BaseService против цикла add:
+bulk_add (многострочный INSERT ... RETURNING), copy_add (COPY),
+bulk_update (executemany) и find_many_by_ids (= ANY).
+
+Строки — отели с отдельным location, после замера они удаляются.
+Нужна локальная Postgres с примененными миграциями (alembic upgrade head):
+
+    python -m benchmarks.bench_bulk_operations --sizes 1000,100000,1000000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+from sqlalchemy import delete, select
+
+from app.database import async_session_maker, engine
+from app.hotels.models import Hotels
+from app.service.base import BaseService
+
+LOCATION = "bench_bulk_operations"
+
+# Цикл add на миллионе строк идет десятки минут, поэтому он ограничен
+ADD_LOOP_LIMIT = 10_000
+
+
+class BenchHotelService(BaseService):
+    """Без сброса кэша поиска HotelService: меряем только базу."""
+
+    model = Hotels
+
+
+def make_rows(size: int, prefix: str) -> List[Dict]:
+    return [
+        {
+            "name": f"{prefix}{i}",
+            "location": LOCATION,
+            "services": ["Wi-Fi"],
+            "rooms_quantity": 1,
+        }
+        for i in range(size)
+    ]
+
+
+async def clear() -> None:
+    async with async_session_maker() as session:
+        await session.execute(delete(Hotels).where(Hotels.location == LOCATION))
+        await session.commit()
+
+
+async def ids() -> List[int]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(Hotels.id).where(Hotels.location == LOCATION)
+        )
+        return list(result.scalars().all())
+
+
+async def timed(size: int, operation) -> float:
+    start = time.perf_counter()
+    await operation
+    return size / (time.perf_counter() - start)
+
+
+async def add_loop(rows: List[Dict]) -> None:
+    for row in rows:
+        await BenchHotelService.add(**row)
+
+
+async def measure(size: int) -> Dict[str, float]:
+    results = {}
+    if size <= ADD_LOOP_LIMIT:
+        results["add в цикле"] = await timed(size, add_loop(make_rows(size, "add")))
+        await clear()
+
+    results["bulk_add"] = await timed(
+        size, BenchHotelService.bulk_add(make_rows(size, "bulk"))
+    )
+    await clear()
+
+    results["copy_add"] = await timed(
+        size, BenchHotelService.copy_add(make_rows(size, "copy"))
+    )
+    hotel_ids = await ids()
+
+    updates = [{"id": hotel_id, "rooms_quantity": 2} for hotel_id in hotel_ids]
+    results["bulk_update"] = await timed(size, BenchHotelService.bulk_update(updates))
+    results["find_many_by_ids"] = await timed(
+        size, BenchHotelService.find_many_by_ids(hotel_ids)
+    )
+    await clear()
+    return results
+
+
+async def main(sizes: List[int]) -> None:
+    await clear()
+    try:
+        # Прогрев: соединение, кэши подготовленных запросов
+        await measure(100)
+        print(f"{'строк':>10}{'операция':>20}{'строк/с':>14}")
+        for size in sizes:
+            for name, rate in (await measure(size)).items():
+                print(f"{size:>10}{name:>20}{rate:>14.0f}")
+    finally:
+        await clear()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    args = parser.parse_args()
+    asyncio.run(main([int(size) for size in args.sizes.split(",")]))
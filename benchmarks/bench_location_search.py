@@ -0,0 +1,197 @@
+"""
+Поиск отелей по адресу на большом каталоге: ILIKE без индекса, ILIKE
+по триграммному GIN-индексу и нечеткий поиск (pg_trgm %> с ранжированием).
+
+Синтетические отели добавляются в каталог и удаляются после замера.
+Нужна локальная Postgres с примененными миграциями (alembic upgrade head):
+
+    python -m benchmarks.bench_location_search --hotels 100000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import delete, insert, select, text
+
+from app.database import async_session_maker, engine
+from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.hotels.service import HotelService
+
+NAME = "bench-location"
+REGIONS = [
+    "Республика Алтай",
+    "Республика Коми",
+    "Республика Карелия",
+    "Краснодарский край",
+    "Алтайский край",
+    "Московская область",
+    "Ленинградская область",
+    "Тверская область",
+    "Калужская область",
+    "Приморский край",
+    "Республика Татарстан",
+    "Свердловская область",
+    "Новосибирская область",
+    "Иркутская область",
+    "Камчатский край",
+    "Мурманская область",
+    "Архангельская область",
+    "Ярославская область",
+]
+SYLLABLES = [
+    "ба",
+    "ран",
+    "гол",
+    "чуй",
+    "ар",
+    "ты",
+    "баш",
+    "тел",
+    "ец",
+    "кой",
+    "май",
+    "мин",
+    "ур",
+    "лу",
+    "ас",
+    "пак",
+]
+STREETS = [
+    "Лесная",
+    "Чуйская",
+    "Телецкая",
+    "Первомайская",
+    "Садовая",
+    "Набережная",
+    "Центральная",
+    "Новая",
+]
+QUERIES = {
+    "ilike": ["Алтай", "Карелия", "Телецкая", "Мурманская"],
+    "typo": ["Алтй", "Карелья", "Телецкя", "Мурманска"],
+}
+DATE_FROM = date(2035, 5, 1)
+DATE_TO = date(2035, 5, 8)
+
+
+def location(rnd: random.Random) -> str:
+    district = "".join(rnd.choices(SYLLABLES, k=3)).capitalize()
+    city = "".join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))).capitalize()
+    street = rnd.choice(STREETS)
+    return (
+        f"{rnd.choice(REGIONS)}, {district}ский район, село {city}, "
+        f"{street} улица, {rnd.randint(1, 200)}"
+    )
+
+
+async def seed(hotels: int) -> None:
+    rnd = random.Random(0)
+    async with async_session_maker() as session:
+        for start in range(0, hotels, 5000):
+            batch = [
+                {
+                    "name": NAME,
+                    "location": location(rnd),
+                    "services": [],
+                    "rooms_quantity": 1,
+                }
+                for _ in range(start, min(hotels, start + 5000))
+            ]
+            await session.execute(insert(Hotels).values(batch))
+        await session.execute(
+            insert(Rooms).from_select(
+                ["hotel_id", "name", "description", "price", "services", "quantity"],
+                select(
+                    Hotels.id, Hotels.name, Hotels.name, 1000, text("'[]'::json"), 5
+                ).where(Hotels.name == NAME),
+            )
+        )
+        await session.commit()
+        await session.execute(text("ANALYZE hotels"))
+        await session.execute(text("ANALYZE rooms"))
+        await session.commit()
+
+
+async def cleanup() -> None:
+    async with async_session_maker() as session:
+        hotel_ids = select(Hotels.id).where(Hotels.name == NAME).scalar_subquery()
+        await session.execute(delete(Rooms).where(Rooms.hotel_id.in_(hotel_ids)))
+        await session.execute(delete(Hotels).where(Hotels.name == NAME))
+        await session.commit()
+
+
+async def measure(
+    name: str, queries: list, fuzzy: bool, use_index: bool, iterations: int
+) -> None:
+    timings = []
+    found = 0
+    for _ in range(iterations):
+        for query in queries:
+            async with async_session_maker() as session:
+                if not use_index:
+                    # Триграммный GIN используется только через bitmap scan
+                    await session.execute(text("SET LOCAL enable_bitmapscan = off"))
+                if fuzzy:
+                    await HotelService.set_similarity_threshold(session)
+                start = time.perf_counter()
+                result = await session.execute(
+                    HotelService.available_query(query, DATE_FROM, DATE_TO, fuzzy=fuzzy)
+                )
+                found += len(result.all())
+                timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<16} p50={p50:>8.2f} ms  p99={p99:>8.2f} ms"
+        f"  hotels/query={found / len(timings):.0f}"
+    )
+
+
+async def main(hotels: int, iterations: int) -> None:
+    await seed(hotels)
+    try:
+        await measure(
+            "ilike seq scan",
+            QUERIES["ilike"],
+            fuzzy=False,
+            use_index=False,
+            iterations=iterations,
+        )
+        await measure(
+            "ilike trigram",
+            QUERIES["ilike"],
+            fuzzy=False,
+            use_index=True,
+            iterations=iterations,
+        )
+        await measure(
+            "ilike typo",
+            QUERIES["typo"],
+            fuzzy=False,
+            use_index=True,
+            iterations=iterations,
+        )
+        await measure(
+            "fuzzy typo",
+            QUERIES["typo"],
+            fuzzy=True,
+            use_index=True,
+            iterations=iterations,
+        )
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.hotels, args.iterations))
@@ -0,0 +1,124 @@
+"""
+Расчет стоимости проживания по правилам цен: цикл по номерам и ночам
+против векторной оценки nightly_rates + window_totals.
+
+База не нужна, номера и правила синтетические:
+
+    python -m benchmarks.bench_pricing --rooms 10000 --nights 14
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.pricing.engine import WEEKENDS, nightly_rates, window_totals
+from app.pricing.models import RateRules
+
+DATE_FROM = date(2035, 7, 1)
+
+
+def make_rules(hotels: int, rnd: random.Random) -> list:
+    rules = [
+        RateRules(name="выходные", weekdays=WEEKENDS, multiplier=1.2),
+        RateRules(
+            name="лето",
+            date_from=date(2035, 6, 1),
+            date_to=date(2035, 9, 1),
+            multiplier=1.3,
+        ),
+        RateRules(name="спрос", min_occupancy=0.8, multiplier=1.15),
+    ]
+    for hotel_id in rnd.sample(range(hotels), k=min(hotels, 50)):
+        rules.append(
+            RateRules(name="акция", hotel_id=hotel_id, weekdays=0b11111, multiplier=0.9)
+        )
+    return rules
+
+
+def loop_totals(room_ids, hotel_ids, prices, nights, stay, rules, occupancy) -> list:
+    """Цена каждой ночи каждого номера по очереди, затем суммы окон заезда."""
+    totals = []
+    for r in range(len(prices)):
+        rates = []
+        for n in range(nights):
+            night = DATE_FROM + timedelta(days=n)
+            multiplier = 1.0
+            for rule in rules:
+                if rule.hotel_id is not None and rule.hotel_id != hotel_ids[r]:
+                    continue
+                if rule.room_id is not None and rule.room_id != room_ids[r]:
+                    continue
+                if rule.date_from is not None and night < rule.date_from:
+                    continue
+                if rule.date_to is not None and night >= rule.date_to:
+                    continue
+                if rule.weekdays is not None and not rule.weekdays & (
+                    1 << night.weekday()
+                ):
+                    continue
+                if (
+                    rule.min_occupancy is not None
+                    and occupancy[r][n] < rule.min_occupancy
+                ):
+                    continue
+                multiplier *= rule.multiplier
+            rates.append(round(prices[r] * multiplier))
+        totals.append([sum(rates[s : s + stay]) for s in range(nights - stay + 1)])
+    return totals
+
+
+def measure(name: str, run, iterations: int) -> None:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<8} p50={statistics.median(timings):>9.2f} ms"
+        f"  min={min(timings):>9.2f} ms"
+    )
+
+
+def main(rooms: int, nights: int, stay: int, iterations: int) -> None:
+    rnd = random.Random(0)
+    hotels = max(1, rooms // 20)
+    room_ids = np.arange(1, rooms + 1)
+    hotel_ids = room_ids % hotels
+    prices = np.array(
+        [rnd.randrange(1000, 30000, 100) for _ in range(rooms)], dtype=np.float64
+    )
+    occupancy = np.array([[rnd.random() for _ in range(nights)] for _ in range(rooms)])
+    rules = make_rules(hotels, rnd)
+
+    def vectorised():
+        return window_totals(
+            nightly_rates(
+                room_ids, hotel_ids, prices, DATE_FROM, nights, rules, occupancy
+            ),
+            stay,
+        )
+
+    lists = room_ids.tolist(), hotel_ids.tolist(), prices.tolist()
+    occupancy_list = occupancy.tolist()
+
+    def loop():
+        return loop_totals(*lists, nights, stay, rules, occupancy_list)
+
+    assert vectorised().tolist() == loop()
+    print(f"rooms={rooms} nights={nights} stay={stay} rules={len(rules)}")
+    measure("loop", loop, max(1, iterations // 10))
+    measure("numpy", vectorised, iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=10_000)
+    parser.add_argument("--nights", type=int, default=14)
+    parser.add_argument("--stay", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    main(args.rooms, args.nights, args.stay, args.iterations)
@@ -0,0 +1,168 @@
+"""
+Сколько соединений из пула берет один HTTP-запрос: сессия на каждый вызов
+сервиса (как раньше) против одной сессии запроса (unit_of_work).
+
+Запросы идут через ASGI-приложение целиком, вместе с зависимостями
+авторизации. Нужны локальные Postgres с примененными миграциями
+(alembic upgrade head) и Redis:
+
+    python -m benchmarks.bench_request_sessions --requests 200
+"""
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Tuple
+
+from fastapi.routing import APIRoute
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, event, insert, select
+from starlette.routing import Mount
+
+from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights
+from app.database import async_session_maker, engine, unit_of_work
+from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.main import app
+from app.users.auth import create_access_token
+from app.users.models import Users
+
+DATE_FROM = date(2035, 3, 10)
+DATE_TO = date(2035, 3, 12)
+
+
+async def session_per_call():
+    """Подмена unit_of_work: сервисы снова открывают сессию на каждый вызов."""
+    yield None
+
+
+def dependency_overrides() -> Dict:
+    # VersionedFastAPI копирует маршруты в подприложения /v1, /v2, но подмены
+    # зависимостей они берут у исходного приложения
+    for mount in app.routes:
+        if isinstance(mount, Mount):
+            for route in mount.routes:
+                if isinstance(route, APIRoute):
+                    return route.dependency_overrides_provider.dependency_overrides
+    raise RuntimeError("Нет версионированных маршрутов")
+
+
+async def measure(
+    client: AsyncClient, hotel_id: int, room_id: int, requests: int
+) -> Dict[str, List[Tuple]]:
+    """Для каждого запроса: (соединений из пула, миллисекунд)."""
+    checkouts = []
+    results = defaultdict(list)
+
+    def on_checkout(*args) -> None:
+        checkouts.append(1)
+
+    async def timed(name: str, method: str, url: str, **kwargs):
+        checkouts.clear()
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        results[name].append((len(checkouts), (time.perf_counter() - start) * 1000))
+        assert response.status_code < 300, (name, response.status_code, response.text)
+        return response
+
+    dates = {"date_from": DATE_FROM.isoformat(), "date_to": DATE_TO.isoformat()}
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    try:
+        for _ in range(requests):
+            await timed("GET /v1/bookings", "GET", "/v1/bookings")
+            await timed(
+                "GET /v1/hotels/{id}/rooms",
+                "GET",
+                f"/v1/hotels/{hotel_id}/rooms",
+                params=dates,
+            )
+            booking = await timed(
+                "POST /v1/bookings",
+                "POST",
+                "/v1/bookings",
+                params={"room_id": room_id, **dates},
+            )
+            await timed(
+                "DELETE /v1/bookings/{id}",
+                "DELETE",
+                f"/v1/bookings/{booking.json()['id']}",
+            )
+    finally:
+        event.remove(engine.sync_engine, "checkout", on_checkout)
+    return results
+
+
+async def main(requests: int) -> None:
+    async with async_session_maker() as session:
+        hotel_id = (
+            await session.execute(
+                insert(Hotels)
+                .values(name="bench", location="bench", services=[], rooms_quantity=1)
+                .returning(Hotels.id)
+            )
+        ).scalar_one()
+        room_id = (
+            await session.execute(
+                insert(Rooms)
+                .values(
+                    hotel_id=hotel_id,
+                    name="bench",
+                    description="bench",
+                    price=1000,
+                    services=[],
+                    quantity=10,
+                )
+                .returning(Rooms.id)
+            )
+        ).scalar_one()
+        user_id = (await session.execute(select(Users.id).limit(1))).scalar_one()
+        await session.commit()
+
+    overrides = dependency_overrides()
+    transport = ASGITransport(app=app)
+    try:
+        async with app.router.lifespan_context(app):
+            async with AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                client.cookies.set(
+                    "booking_access_token", create_access_token({"sub": str(user_id)})
+                )
+                # Прогрев: кэши правил цен и отелей номеров, пул соединений
+                await measure(client, hotel_id, room_id, 5)
+                overrides[unit_of_work] = session_per_call
+                before = await measure(client, hotel_id, room_id, requests)
+                overrides.pop(unit_of_work)
+                after = await measure(client, hotel_id, room_id, requests)
+    finally:
+        overrides.pop(unit_of_work, None)
+        async with async_session_maker() as session:
+            await session.execute(delete(Bookings).where(Bookings.room_id == room_id))
+            await session.execute(
+                delete(RoomNights).where(RoomNights.room_id == room_id)
+            )
+            await session.execute(delete(Rooms).where(Rooms.id == room_id))
+            await session.execute(delete(Hotels).where(Hotels.id == hotel_id))
+            await session.commit()
+        await engine.dispose()
+
+    print(f"requests={requests}")
+    print(f"{'':<28}{'соединений/запрос':>24}{'ms/запрос':>20}")
+    print(f"{'':<28}{'до':>12}{'после':>12}{'до':>10}{'после':>10}")
+    for name in before:
+        row = []
+        for column in (0, 1):
+            for results in (before, after):
+                values = [sample[column] for sample in results[name]]
+                row.append(sum(values) / len(values))
+        print(f"{name:<28}{row[0]:>12.2f}{row[1]:>12.2f}{row[2]:>10.2f}{row[3]:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
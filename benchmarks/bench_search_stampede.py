@@ -0,0 +1,106 @@
+"""
+Сколько запросов к БД уходит при одновременном промахе популярного поиска отелей.
+
+Поиск прогревается, затем его теги сбрасываются (как при новой брони), и
+несколько процессов-воркеров одновременно присылают по N одинаковых запросов.
+Режим uncached вызывает обработчик без кэша — так выглядел промах до
+single-flight: каждый запрос идет в Postgres.
+
+Нужны локальные Postgres и Redis:
+
+    python -m benchmarks.bench_search_stampede --workers 4 --requests 200
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import time
+from datetime import date
+
+from redis import asyncio as aioredis
+from sqlalchemy import event
+
+from app.cache import tags
+from app.cache.tagged import search_cache
+from app.config import settings
+from app.database import engine
+from app.hotels.router import search_hotels
+
+DATE_FROM = date(2035, 5, 1)
+DATE_TO = date(2035, 5, 8)
+
+
+def redis_client() -> aioredis.Redis:
+    return aioredis.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}")
+
+
+async def prepare(location: str) -> None:
+    redis = redis_client()
+    search_cache.init(redis)
+    await search_hotels(
+        location=location, date_from=DATE_FROM, date_to=DATE_TO, fuzzy=False
+    )
+    await search_cache.invalidate(tags.HOTELS)
+    await redis.close()
+    await engine.dispose()
+
+
+async def fire(location: str, requests: int, mode: str, barrier) -> int:
+    queries = 0
+
+    def count(*_):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    redis = redis_client()
+    search_cache.init(redis)
+    handler = search_hotels if mode == "cached" else search_hotels.__wrapped__
+    barrier.wait()
+    await asyncio.gather(
+        *(
+            handler(
+                location=location, date_from=DATE_FROM, date_to=DATE_TO, fuzzy=False
+            )
+            for _ in range(requests)
+        )
+    )
+    await redis.close()
+    await engine.dispose()
+    return queries
+
+
+def worker(location: str, requests: int, mode: str, barrier, results) -> None:
+    results.put(asyncio.run(fire(location, requests, mode, barrier)))
+
+
+def run(location: str, workers: int, requests: int, mode: str) -> None:
+    asyncio.run(prepare(location))
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(location, requests, mode, barrier, results))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    queries = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{mode:<9} requests={workers * requests:<6} db_queries={queries:<6}"
+        f" wall={elapsed:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--location", default="Алтай")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    for mode in ("uncached", "cached"):
+        run(args.location, args.workers, args.requests, mode)
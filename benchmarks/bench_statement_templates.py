@@ -0,0 +1,202 @@
+"""
+Какая доля процессорного времени горячих запросов уходит на построение
+выражения SQLAlchemy, ключ кэша компиляции и компиляцию: запрос, собираемый
+на каждый вызов (как раньше), против шаблона с параметрами, построенного
+один раз.
+
+Запросы: поиск отелей (get_hotels), номера отеля (get_rooms) и бронь
+(BookingService._add: book_room). Время делится по
+cProfile, поэтому абсолютные значения завышены профилировщиком, а доли
+сравнимы. Нужна локальная Postgres с примененными миграциями
+(alembic upgrade head):
+
+    python -m benchmarks.bench_statement_templates --iterations 500
+"""
+
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+from datetime import date
+from types import CodeType
+from typing import Any, Dict, List
+
+from sqlalchemy import Integer, delete, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.sql.cache_key import HasCacheKey
+from sqlalchemy.sql.compiler import Compiled
+
+from app.bookings.holds.store import hold_store
+from app.bookings.models import Bookings
+from app.bookings.room_nights.models import RoomNights
+from app.bookings.room_nights.service import RoomNightsService
+from app.bookings.service import BookingService
+from app.database import async_session_maker, engine
+from app.hotels.models import Hotels
+from app.hotels.rooms.models import Rooms
+from app.hotels.rooms.service import RoomService
+from app.hotels.service import HotelService
+from app.pricing.service import PricingService
+from app.users.models import Users
+
+LOCATION = "bench_statement_templates"
+DATE_FROM = date(2035, 5, 10)
+DATE_TO = date(2035, 5, 14)
+
+
+def build_hotels(location: str, date_from: date, date_to: date):
+    return HotelService.available_query(location, date_from, date_to, with_full=True)
+
+
+def build_rooms(hotel_id: int, date_from: date, date_to: date):
+    return RoomService.available_query(hotel_id, date_from, date_to)
+
+
+def build_book_room(
+    user_id: int,
+    room_id: int,
+    date_from: date,
+    date_to: date,
+    rules: List[Dict[str, Any]],
+    held: List[int],
+):
+    return select(Bookings).from_statement(
+        select(text("*")).select_from(
+            func.book_room(
+                user_id,
+                room_id,
+                date_from,
+                date_to,
+                literal(rules, JSONB),
+                literal(held, ARRAY(Integer)),
+            )
+        )
+    )
+
+
+async def legacy_request(user_id: int, hotel_id: int, room_id: int) -> None:
+    """Путь до шаблонов: выражение каждого запроса строится заново."""
+    async with async_session_maker() as session:
+        await session.execute(build_hotels(LOCATION, DATE_FROM, DATE_TO))
+        await session.execute(build_rooms(hotel_id, DATE_FROM, DATE_TO))
+        rules = await PricingService.rules_param()
+        held = list(
+            (
+                await hold_store.held_nights(
+                    RoomNightsService.demand([(room_id, DATE_FROM, DATE_TO)])
+                )
+            ).values()
+        )
+        book_room = build_book_room(user_id, room_id, DATE_FROM, DATE_TO, rules, held)
+        assert (await session.execute(book_room)).scalar_one_or_none()
+        await session.commit()
+
+
+async def template_request(user_id: int, hotel_id: int, room_id: int) -> None:
+    await HotelService.find_available(LOCATION, DATE_FROM, DATE_TO, with_full=True)
+    await RoomService.find_available(hotel_id, DATE_FROM, DATE_TO)
+    assert await BookingService._add(user_id, room_id, DATE_FROM, DATE_TO)
+
+
+def cumulative(stats: pstats.Stats, codes: List[CodeType]) -> float:
+    keys = {(code.co_filename, code.co_firstlineno, code.co_name) for code in codes}
+    return sum(row[3] for key, row in stats.stats.items() if key in keys)
+
+
+async def measure(
+    request, builders: List[CodeType], iterations: int, *args
+) -> Dict[str, float]:
+    # Таймер профилировщика — процессорное время: ожидание ответа БД в доли не входит
+    profiler = cProfile.Profile(time.process_time)
+    profiler.enable()
+    for _ in range(iterations):
+        await request(*args)
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    total = stats.total_tt
+    return {
+        "cpu_ms": total / iterations * 1000,
+        "построение": cumulative(stats, builders) / total * 100,
+        "ключ кэша": cumulative(stats, [HasCacheKey._generate_cache_key.__code__])
+        / total
+        * 100,
+        "компиляция": cumulative(stats, [Compiled.__init__.__code__]) / total * 100,
+    }
+
+
+async def main(iterations: int) -> None:
+    async with async_session_maker() as session:
+        hotel_id = (
+            await session.execute(
+                insert(Hotels)
+                .values(name="bench", location=LOCATION, services=[], rooms_quantity=1)
+                .returning(Hotels.id)
+            )
+        ).scalar_one()
+        room_id = (
+            await session.execute(
+                insert(Rooms)
+                .values(
+                    hotel_id=hotel_id,
+                    name="bench",
+                    description="bench",
+                    price=1000,
+                    services=[],
+                    quantity=10 * iterations,
+                )
+                .returning(Rooms.id)
+            )
+        ).scalar_one()
+        user_id = (await session.execute(select(Users.id).limit(1))).scalar_one()
+        await session.commit()
+
+    legacy_builders = [
+        build.__code__ for build in (build_hotels, build_rooms, build_book_room)
+    ]
+    template_builders = [
+        HotelService.available_template.__wrapped__.__code__,
+        RoomService.available_template.__wrapped__.__code__,
+    ]
+    args = (user_id, hotel_id, room_id)
+    try:
+        # Прогрев: кэш компиляции SQLAlchemy, подготовленные запросы asyncpg,
+        # правила цен
+        await measure(legacy_request, legacy_builders, 20, *args)
+        await measure(template_request, template_builders, 20, *args)
+        results = {
+            "до": await measure(legacy_request, legacy_builders, iterations, *args),
+            "после": await measure(
+                template_request, template_builders, iterations, *args
+            ),
+        }
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(Bookings).where(Bookings.room_id == room_id))
+            await session.execute(
+                delete(RoomNights).where(RoomNights.room_id == room_id)
+            )
+            await session.execute(delete(Rooms).where(Rooms.id == room_id))
+            await session.execute(delete(Hotels).where(Hotels.id == hotel_id))
+            await session.commit()
+        await engine.dispose()
+
+    print(
+        f"iterations={iterations}, доли — от процессорного времени запроса под cProfile"
+    )
+    print(
+        f"{'':<8}{'CPU мс/запрос':>16}{'построение %':>16}"
+        f"{'ключ кэша %':>14}{'компиляция %':>16}"
+    )
+    for name, row in results.items():
+        print(
+            f"{name:<8}{row['cpu_ms']:>16.2f}{row['построение']:>16.1f}"
+            f"{row['ключ кэша']:>14.1f}{row['компиляция']:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))